@@ -0,0 +1,102 @@
+"""Qt-free G-code parsing, toolpath expansion, statistics and export.
+
+Typical use::
+
+    from gcode_core import Settings, parse_file, expand, toolpath_summary
+
+    settings = Settings(arc_type=2)
+    program = expand(parse_file("PROGRAM.NC", settings), settings)
+    print(toolpath_summary(program))
+"""
+
+from .cache import ParseCache
+from .colors import (
+    COLOR_DEPTH,
+    COLOR_FEED,
+    COLOR_MOVE,
+    COLOR_SINGLE,
+    COLOR_TOOL,
+    point_colors,
+)
+from .export import ExportOptions, export_pgm, float_to_str, program_rows
+from .incremental import DirtyLines, reparse
+from .lod import LodPyramid, decimate
+from .modal import CheckpointIndex, ModalState
+from .motion import cycle_template, expand, reexpand
+from .parser import parse_file, parse_lines, parse_text, state_at
+from .program import (
+    ARC_CCW,
+    ARC_CW,
+    LINEAR,
+    RAPID,
+    BlockTable,
+    LayerIndex,
+    PointIndex,
+    PointTable,
+    Program,
+    Settings,
+)
+from .spatial import SegmentTree
+from .stats import (
+    ToolpathStats,
+    calc_time,
+    has_motion,
+    toolpath_limits,
+    toolpath_summary,
+)
+from .stream import LineIndex, StreamParser
+from .tokenizer import tokenize_line
+from .toolpath import ArcTable, Toolpath, arc_points
+from .vectorized import ScanTable, resolve, scan_buffer
+
+__all__ = [
+    "ARC_CCW",
+    "ARC_CW",
+    "COLOR_DEPTH",
+    "COLOR_FEED",
+    "COLOR_MOVE",
+    "COLOR_SINGLE",
+    "COLOR_TOOL",
+    "LINEAR",
+    "RAPID",
+    "ArcTable",
+    "BlockTable",
+    "CheckpointIndex",
+    "DirtyLines",
+    "LayerIndex",
+    "ExportOptions",
+    "LineIndex",
+    "LodPyramid",
+    "ModalState",
+    "ParseCache",
+    "PointIndex",
+    "PointTable",
+    "Program",
+    "ScanTable",
+    "SegmentTree",
+    "Settings",
+    "StreamParser",
+    "Toolpath",
+    "ToolpathStats",
+    "arc_points",
+    "calc_time",
+    "cycle_template",
+    "decimate",
+    "expand",
+    "export_pgm",
+    "float_to_str",
+    "has_motion",
+    "parse_file",
+    "parse_lines",
+    "parse_text",
+    "point_colors",
+    "program_rows",
+    "reexpand",
+    "reparse",
+    "resolve",
+    "scan_buffer",
+    "state_at",
+    "tokenize_line",
+    "toolpath_limits",
+    "toolpath_summary",
+]
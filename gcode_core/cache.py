@@ -0,0 +1,155 @@
+"""On-disk cache of parsed and expanded programs.
+
+Entries are uncompressed ``.npz`` files named by a hash of the program text
+and the settings that change interpretation. The least recently used
+entries are deleted once the cache grows past its size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+import zipfile
+from dataclasses import asdict
+
+import numpy as np
+
+from .modal import CheckpointIndex
+from .program import BLOCK_COLUMNS, BlockTable, PointTable, Program
+from .toolpath import ARC_COLUMNS, ArcTable, Toolpath
+
+# bump when the stored layout or the interpreter output changes
+CACHE_VERSION = 5
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# settings that do not change the stored arrays
+UNKEYED_SETTINGS = ("checkpoint_interval",)
+
+
+class ParseCache:
+    """Directory of cached programs with a total size cap."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """Use ``directory`` (created on demand) holding at most ``max_bytes``."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, text, settings):
+        """Return the cache key of a program text parsed with ``settings``."""
+        digest = hashlib.sha256()
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        keyed = {
+            name: value
+            for name, value in asdict(settings).items()
+            if name not in UNKEYED_SETTINGS
+        }
+        digest.update(repr((CACHE_VERSION, sorted(keyed.items()))).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        """Return the file path of a cache entry."""
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, text, settings):
+        """Return the cached expanded Program for ``text``, or None."""
+        path = self.path(self.key(text, settings))
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                program = self._program(data, text, settings)
+            # the file time orders entries for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # a truncated or corrupt entry would fail the same way every time
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return program
+
+    def store(self, text, settings, program):
+        """Save an expanded program and evict old entries over the size cap."""
+        os.makedirs(self.directory, exist_ok=True)
+        blocks = program.blocks
+        vertices = program.path.vertices
+        arrays = {name: getattr(blocks, name) for name in BLOCK_COLUMNS}
+        for name, mask in blocks.present.items():
+            arrays["present_" + name] = mask
+        has_comment = np.fromiter(
+            (c is not None for c in blocks.comment), np.bool_, len(blocks)
+        )
+        arrays["comment_mask"] = has_comment
+        arrays["comment_text"] = np.array(
+            "\0".join(c for c in blocks.comment if c is not None)
+        )
+        arrays["point_pos"] = vertices.pos
+        arrays["point_feed"] = vertices.feed
+        arrays["point_block"] = vertices.block
+        arrays["point_move"] = vertices.move
+        for name in ARC_COLUMNS:
+            arrays["arc_" + name] = getattr(program.path.arcs, name)
+        arrays["end_block"] = np.array(program.end_block)
+
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+                # the entry is complete on disk before it takes the key
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path(self.key(text, settings)))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its cap."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".npz"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    @staticmethod
+    def _program(data, text, settings):
+        """Rebuild a Program from loaded cache arrays."""
+        blocks = BlockTable()
+        for name in BLOCK_COLUMNS:
+            setattr(blocks, name, data[name])
+        for name in blocks.present:
+            blocks.present[name] = data["present_" + name]
+        comments = iter(str(data["comment_text"]).split("\0"))
+        blocks.comment = [
+            next(comments) if has else None for has in data["comment_mask"].tolist()
+        ]
+        program = Program(text.upper().splitlines(True), blocks)
+        if len(program.lines) != len(blocks):
+            raise ValueError("cache entry does not match the program text")
+        arcs = ArcTable()
+        for name in ARC_COLUMNS:
+            setattr(arcs, name, data["arc_" + name])
+        vertices = PointTable(
+            data["point_pos"],
+            data["point_feed"],
+            data["point_block"],
+            data["point_move"],
+        )
+        program.path = Toolpath(vertices, arcs, settings)
+        program.end_block = int(data["end_block"])
+        program.checkpoints = CheckpointIndex.from_blocks(blocks, settings)
+        return program
@@ -0,0 +1,119 @@
+"""Per-point RGBA colors for plotting an expanded toolpath.
+
+Every function returns an (n, 4) float32 array with one color per point.
+In a line strip a point's color belongs to the move ending at that point.
+"""
+
+import numpy as np
+
+from .program import ARC_CCW, ARC_CW, LINEAR, RAPID, point_tools
+
+# color modes
+COLOR_SINGLE = 0
+COLOR_MOVE = 1
+COLOR_FEED = 2
+COLOR_TOOL = 3
+COLOR_DEPTH = 4
+
+# rapid, linear and arc colors, the same as the editor highlighting
+MOVE_COLORS = {
+    RAPID: (1.0, 0.0, 0.0, 1.0),
+    LINEAR: (0.18, 0.8, 0.44, 1.0),
+    ARC_CW: (0.0, 0.0, 1.0, 1.0),
+    ARC_CCW: (0.0, 0.0, 1.0, 1.0),
+}
+
+# rapids in the feed colormap
+RAPID_GRAY = (0.6, 0.6, 0.6, 1.0)
+
+# blue - cyan - green - yellow - red
+RAMP = np.array(
+    [
+        (0.0, 0.0, 1.0),
+        (0.0, 1.0, 1.0),
+        (0.0, 0.8, 0.0),
+        (1.0, 0.85, 0.0),
+        (1.0, 0.0, 0.0),
+    ]
+)
+
+# tools take these colors in order of their numbers
+TOOL_COLORS = np.array(
+    [
+        (0.12, 0.47, 0.71, 1.0),
+        (1.0, 0.5, 0.05, 1.0),
+        (0.17, 0.63, 0.17, 1.0),
+        (0.84, 0.15, 0.16, 1.0),
+        (0.58, 0.4, 0.74, 1.0),
+        (0.55, 0.34, 0.29, 1.0),
+        (0.89, 0.47, 0.76, 1.0),
+        (0.5, 0.5, 0.5, 1.0),
+        (0.74, 0.74, 0.13, 1.0),
+        (0.09, 0.75, 0.81, 1.0),
+    ]
+)
+
+
+def ramp_colors(values, lo=None, hi=None):
+    """Map values onto the blue to red ramp, ``lo`` blue and ``hi`` red."""
+    values = np.asarray(values, np.float64)
+    colors = np.ones((len(values), 4), np.float32)
+    if not len(values):
+        return colors
+    lo = values.min() if lo is None else lo
+    hi = values.max() if hi is None else hi
+    t = np.zeros(len(values))
+    if hi > lo:
+        t = np.clip((values - lo) / (hi - lo), 0.0, 1.0)
+    stops = np.linspace(0.0, 1.0, len(RAMP))
+    for channel in range(3):
+        colors[:, channel] = np.interp(t, stops, RAMP[:, channel])
+    return colors
+
+
+def move_colors(points):
+    """Color rapids, linear moves and arcs apart."""
+    table = np.zeros((max(MOVE_COLORS) + 1, 4), np.float32)
+    for move, color in MOVE_COLORS.items():
+        table[move] = color
+    return table[points.move]
+
+
+def feed_colors(points):
+    """Color feed moves by feed rate, rapids gray."""
+    rapid = points.move == RAPID
+    feeds = points.feed[~rapid]
+    if len(feeds):
+        colors = ramp_colors(points.feed, feeds.min(), feeds.max())
+    else:
+        colors = np.empty((len(points), 4), np.float32)
+    colors[rapid] = RAPID_GRAY
+    return colors
+
+
+def tool_colors(program):
+    """Give each tool of the program its own color."""
+    _, rank = np.unique(point_tools(program), return_inverse=True)
+    return TOOL_COLORS[rank % len(TOOL_COLORS)].astype(np.float32)
+
+
+def depth_colors(points):
+    """Color points by Z, the lowest blue and the highest red."""
+    return ramp_colors(points.z)
+
+
+def point_colors(program, mode):
+    """Return the point colors of ``program`` for a color mode.
+
+    COLOR_SINGLE has no per-point colors and returns None.
+    """
+    points = program.points
+    if mode == COLOR_MOVE:
+        return move_colors(points)
+    if mode == COLOR_FEED:
+        return feed_colors(points)
+    if mode == COLOR_TOOL:
+        return tool_colors(program)
+    if mode == COLOR_DEPTH:
+        return depth_colors(points)
+    return None
@@ -1,35 +1,154 @@
-"""Export logic separated from main window."""
-
-import numpy as np
-from math import sqrt, pi, cos, sin
+"""Program export: rebuild G-code text from parsed toolpath data."""
 
+from dataclasses import dataclass
+from math import ceil, sqrt, pi, cos, sin
 
-def export_pgm(self):
-    """Generate the exportable program text based on parsed toolpath data."""
+import numpy as np
 
-    self.lstExport()
+from .toolpath import TURN_POINTS, chord_angle
+from .program import progress_step
+from .stats import toolpath_limits, toolpath_summary
+from .tokenizer import P_CYCLE_CODES, Q_CYCLE_CODES
+
+
+@dataclass
+class ExportOptions:
+    """Output dialect and formatting options used by export_pgm."""
+
+    lang: int = 0
+    forceAdr: bool = False
+    incrMode: bool = False
+    startPgmExp: str = "O0001"
+    endPgmExp: str = "M30"
+    safLine: bool = False
+    seqNum: bool = False
+    seqNumStart: int = 1
+    seqNumIncr: int = 1
+    seqNumSpacing: bool = False
+    delim: bool = False
+    leadingZero: bool = False
+    co: str = "("
+    ci: str = ")"
+    er: str = "%"
+
+
+def float_to_str(val):
+    """Format numeric values to compact strings for G-code output."""
+    if val is None:
+        return ""
+    if val == 0:
+        return "0"
+    return "{:.3f}".format(val).rstrip("0").rstrip(".")
+
+
+# block columns in export row order; center_u/center_v are the arc center in plane axes
+ROW_COLUMNS = (
+    "move",
+    "plane",
+    "pos_mode",
+    "x",
+    "y",
+    "z",
+    "x_incr",
+    "y_incr",
+    "z_incr",
+    "center_u",
+    "center_v",
+    "feed",
+    "wcs",
+    "home",
+    "tool",
+    "tool_change",
+    "speed",
+    "spindle",
+    "coolant",
+    "pgm_stop",
+    "cor_len",
+    "cor_h",
+    "cor_rad",
+    "cor_d",
+    "comment",
+    "cycle",
+    "cycle_z",
+    "r",
+    "p",
+    "q",
+)
+
+
+def program_rows(program):
+    """Build filtered per-block rows used for exporting.
+
+    Only blocks before the program end that contain known words are kept.
+    """
+    blocks = program.blocks
+    end = program.end_block
+    plane = blocks.plane[:end]
+    # arc center in the plane axes: G17 XY, G18 XZ, G19 YZ
+    center_u = np.where(plane == 19, blocks.cy[:end], blocks.cx[:end])
+    center_v = np.where(plane == 17, blocks.cy[:end], blocks.cz[:end])
+    has_center = blocks.present["cx"][:end].tolist()
+
+    columns = []
+    for name in ROW_COLUMNS:
+        if name in ("center_u", "center_v"):
+            values = center_u if name == "center_u" else center_v
+            col = [v if h else None for v, h in zip(values.tolist(), has_center)]
+        elif name == "comment":
+            col = blocks.comment[:end]
+        else:
+            col = blocks.column(name)[:end]
+        columns.append(col)
+
+    unknown = blocks.unknown[:end]
+    moved = (
+        (blocks.move[:end] > 1)
+        | (blocks.x_incr[:end] != 0)
+        | (blocks.y_incr[:end] != 0)
+        | (blocks.z_incr[:end] != 0)
+        | (blocks.cycle[:end] != 80)
+        | blocks.present["wcs"][:end]
+    )
+
+    rows = []
+    for i in np.flatnonzero(~unknown).tolist():
+        row = [col[i] for col in columns]
+        if not moved[i]:
+            # no motion on this block: drop the geometry words
+            row[:11] = [None] * 11
+        rows.append(row)
+    return rows
+
+
+def export_pgm(program, settings, options, progress=None):
+    """Generate the exportable program text based on parsed toolpath data.
+
+    ``progress`` is an optional callable receiving a 0-100 percentage.
+    """
+
+    rows = program_rows(program)
     lst = []
-    st = self.seqNumStart
-    incr = self.seqNumIncr
+    st = options.seqNumStart
+    incr = options.seqNumIncr
 
-    if self.seqNumSpacing == False:
+    if options.seqNumSpacing == False:
         seq_delim = ""
     else:
         seq_delim = " "
 
-    if self.delim == False:
+    if options.delim == False:
         delim = ""
     else:
         delim = " "
 
-    if self.leadingZero:
+    if options.leadingZero:
         g_fmt = "G0"
         m_fmt = "M0"
     else:
         g_fmt = "G"
         m_fmt = "M"
 
-    if self.safLine:
+    if options.safLine:
         saf_line = (
             g_fmt
             + "0"
@@ -46,7 +165,7 @@ def export_pgm(self):
         )
         lst.append(saf_line)
 
-    if self.lang < 4:
+    if options.lang < 4:
         prevMove = 0
         prevArcPlane = 17
         prevMode = 90
@@ -65,38 +184,32 @@ def export_pgm(self):
         prevCorD = 0
         first_move = True
 
-        for i in range(len(self.lstProgram)):
+        every = progress_step(len(rows))
+        for i in range(len(rows)):
             posMode = ""
             toolchange = ""
-            self.progressBar.setValue(int((i * 100) / len(self.lstProgram)))
+            if progress and i % every == 0:
+                progress(int((i * 100) / len(rows)))
             # Move
-            if (
-                self.lstProgram[i][0] != None
-                and self.lstProgram[i][15] == None
-                and self.lstProgram[i][25] == 80
-            ):
-                if self.forceAdr:
-                    move = g_fmt + str(self.lstProgram[i][0]) + delim
+            if rows[i][0] != None and rows[i][15] == None and rows[i][25] == 80:
+                if options.forceAdr:
+                    move = g_fmt + str(rows[i][0]) + delim
                 else:
-                    if prevMove != self.lstProgram[i][0] or first_move:
-                        prevMove = self.lstProgram[i][0]
-                        move = g_fmt + str(self.lstProgram[i][0]) + delim
+                    if prevMove != rows[i][0] or first_move:
+                        prevMove = rows[i][0]
+                        move = g_fmt + str(rows[i][0]) + delim
                     else:
                         move = ""
             else:
                 move = ""
 
             # Arc Plane
-            if (
-                self.lstProgram[i][1] != None
-                and self.lstProgram[i][15] == None
-                and self.lstProgram[i][25] == 80
-            ):
-                if self.forceAdr:
-                    arcPlane = "G" + str(self.lstProgram[i][1]) + delim
+            if rows[i][1] != None and rows[i][15] == None and rows[i][25] == 80:
+                if options.forceAdr:
+                    arcPlane = "G" + str(rows[i][1]) + delim
                 else:
-                    if prevArcPlane != self.lstProgram[i][1] or first_move:
-                        prevArcPlane = self.lstProgram[i][1]
+                    if prevArcPlane != rows[i][1] or first_move:
+                        prevArcPlane = rows[i][1]
                         arcPlane = "G" + str(prevArcPlane) + delim
                     else:
                         arcPlane = ""
@@ -104,10 +217,10 @@ def export_pgm(self):
                 arcPlane = ""
 
             # ABS mode
-            if self.incrMode:
+            if options.incrMode:
                 prevMode = 91
-                if self.lstProgram[i][2] != None and self.lstProgram[i][15] == None:
-                    if self.forceAdr:
+                if rows[i][2] != None and rows[i][15] == None:
+                    if options.forceAdr:
                         posMode = "G" + str(prevMode) + delim
                     else:
                         if first_move:
@@ -115,12 +228,12 @@ def export_pgm(self):
                         else:
                             posMode = ""
             else:
-                if self.lstProgram[i][2] != None and self.lstProgram[i][15] == None:
-                    if self.forceAdr:
-                        posMode = "G" + str(self.lstProgram[i][2]) + delim
+                if rows[i][2] != None and rows[i][15] == None:
+                    if options.forceAdr:
+                        posMode = "G" + str(rows[i][2]) + delim
                     else:
-                        if prevMode != self.lstProgram[i][2] or first_move:
-                            prevMode = self.lstProgram[i][2]
+                        if prevMode != rows[i][2] or first_move:
+                            prevMode = rows[i][2]
                             posMode = "G" + str(prevMode) + delim
                         else:
                             posMode = ""
@@ -128,96 +241,96 @@ def export_pgm(self):
                     posMode = ""
 
             # Cycle Drill
-            if self.lstProgram[i][25] > 80:
-                if self.forceAdr:
-                    prevCycleDrill = self.lstProgram[i][25]
+            if rows[i][25] != 80:
+                if options.forceAdr:
+                    prevCycleDrill = rows[i][25]
                     cycleDrill = "G" + str(prevCycleDrill) + delim
                 else:
-                    if prevCycleDrill != self.lstProgram[i][25]:
-                        prevCycleDrill = self.lstProgram[i][25]
+                    if prevCycleDrill != rows[i][25]:
+                        prevCycleDrill = rows[i][25]
                         cycleDrill = "G" + str(prevCycleDrill) + delim
                     else:
                         cycleDrill = ""
             else:
-                if prevCycleDrill != self.lstProgram[i][25]:
-                    prevCycleDrill = self.lstProgram[i][25]
+                if prevCycleDrill != rows[i][25]:
+                    prevCycleDrill = rows[i][25]
                     cycleDrill = "G" + str(prevCycleDrill) + delim
                 else:
                     cycleDrill = ""
 
             # X coord
-            if self.lstProgram[i][2] == 90 and self.incrMode == False:
-                if self.lstProgram[i][3] != None and self.lstProgram[i][15] == None:
-                    if self.forceAdr:
-                        x = "X" + self.floatToStr(self.lstProgram[i][3]) + delim
+            if rows[i][2] == 90 and options.incrMode == False:
+                if rows[i][3] != None and rows[i][15] == None:
+                    if options.forceAdr:
+                        x = "X" + float_to_str(rows[i][3]) + delim
                     else:
-                        if prevX != self.lstProgram[i][3] or first_move:
-                            prevX = self.lstProgram[i][3]
-                            x = "X" + self.floatToStr(self.lstProgram[i][3]) + delim
+                        if prevX != rows[i][3] or first_move:
+                            prevX = rows[i][3]
+                            x = "X" + float_to_str(rows[i][3]) + delim
                         else:
                             x = ""
                 else:
                     x = ""
             else:
-                if self.lstProgram[i][6] != None and self.lstProgram[i][15] == None:
-                    if self.forceAdr:
-                        x = "X" + self.floatToStr(self.lstProgram[i][6]) + delim
+                if rows[i][6] != None and rows[i][15] == None:
+                    if options.forceAdr:
+                        x = "X" + float_to_str(rows[i][6]) + delim
                     else:
-                        if self.lstProgram[i][6] != 0:
-                            x = "X" + self.floatToStr(self.lstProgram[i][6]) + delim
+                        if rows[i][6] != 0:
+                            x = "X" + float_to_str(rows[i][6]) + delim
                         else:
                             x = ""
                 else:
                     x = ""
 
             # Y coord
-            if self.lstProgram[i][2] == 90 and self.incrMode == False:
-                if self.lstProgram[i][4] != None and self.lstProgram[i][15] == None:
-                    if self.forceAdr:
-                        y = "Y" + self.floatToStr(self.lstProgram[i][4]) + delim
+            if rows[i][2] == 90 and options.incrMode == False:
+                if rows[i][4] != None and rows[i][15] == None:
+                    if options.forceAdr:
+                        y = "Y" + float_to_str(rows[i][4]) + delim
                     else:
-                        if prevY != self.lstProgram[i][4] or first_move:
+                        if prevY != rows[i][4] or first_move:
                             first_move = False
-                            prevY = self.lstProgram[i][4]
-                            y = "Y" + self.floatToStr(self.lstProgram[i][4]) + delim
+                            prevY = rows[i][4]
+                            y = "Y" + float_to_str(rows[i][4]) + delim
                         else:
                             y = ""
                 else:
                     y = ""
             else:
-                if self.lstProgram[i][7] != None and self.lstProgram[i][15] == None:
-                    if self.forceAdr:
-                        y = "Y" + self.floatToStr(self.lstProgram[i][7]) + delim
+                if rows[i][7] != None and rows[i][15] == None:
+                    if options.forceAdr:
+                        y = "Y" + float_to_str(rows[i][7]) + delim
                     else:
                         first_move = False
-                        if self.lstProgram[i][7] != 0:
-                            y = "Y" + self.floatToStr(self.lstProgram[i][7]) + delim
+                        if rows[i][7] != 0:
+                            y = "Y" + float_to_str(rows[i][7]) + delim
                         else:
                             y = ""
                 else:
                     y = ""
 
             # Z coord
-            if self.lstProgram[i][25] == 80:
-                if self.lstProgram[i][2] == 90 and self.incrMode == False:
-                    if self.lstProgram[i][5] != None and self.lstProgram[i][15] == None:
-                        if self.forceAdr:
-                            z = "Z" + self.floatToStr(self.lstProgram[i][5]) + delim
+            if rows[i][25] == 80:
+                if rows[i][2] == 90 and options.incrMode == False:
+                    if rows[i][5] != None and rows[i][15] == None:
+                        if options.forceAdr:
+                            z = "Z" + float_to_str(rows[i][5]) + delim
                         else:
-                            if prevZ != self.lstProgram[i][5]:
-                                prevZ = self.lstProgram[i][5]
-                                z = "Z" + self.floatToStr(self.lstProgram[i][5]) + delim
+                            if prevZ != rows[i][5]:
+                                prevZ = rows[i][5]
+                                z = "Z" + float_to_str(rows[i][5]) + delim
                             else:
                                 z = ""
                     else:
                         z = ""
                 else:
-                    if self.lstProgram[i][8] != None and self.lstProgram[i][15] == None:
-                        if self.forceAdr:
-                            z = "Z" + self.floatToStr(self.lstProgram[i][8]) + delim
+                    if rows[i][8] != None and rows[i][15] == None:
+                        if options.forceAdr:
+                            z = "Z" + float_to_str(rows[i][8]) + delim
                         else:
-                            if self.lstProgram[i][8] != 0:
-                                z = "Z" + self.floatToStr(self.lstProgram[i][8]) + delim
+                            if rows[i][8] != 0:
+                                z = "Z" + float_to_str(rows[i][8]) + delim
                             else:
                                 z = ""
                     else:
@@ -226,65 +339,65 @@ def export_pgm(self):
                 z = ""
 
             # Cycle Z
-            if self.lstProgram[i][25] > 80:
-                if self.forceAdr:
-                    cycleZ = "Z" + self.floatToStr(self.lstProgram[i][26]) + delim
+            if rows[i][25] != 80:
+                if options.forceAdr:
+                    cycleZ = "Z" + float_to_str(rows[i][26]) + delim
                 else:
-                    if prevCycleZ != self.lstProgram[i][26]:
-                        prevCycleZ = self.lstProgram[i][26]
-                        cycleZ = "Z" + self.floatToStr(prevCycleZ) + delim
+                    if prevCycleZ != rows[i][26]:
+                        prevCycleZ = rows[i][26]
+                        cycleZ = "Z" + float_to_str(prevCycleZ) + delim
                     else:
                         cycleZ = ""
             else:
                 cycleZ = ""
 
             # Cycle R
-            if self.lstProgram[i][27] != None and self.lstProgram[i][25] > 80:
-                if self.forceAdr:
-                    cycleR = "R" + self.floatToStr(self.lstProgram[i][27]) + delim
+            if rows[i][27] != None and rows[i][25] != 80:
+                if options.forceAdr:
+                    cycleR = "R" + float_to_str(rows[i][27]) + delim
                 else:
-                    if prevCycleR != self.lstProgram[i][27]:
-                        prevCycleR = self.lstProgram[i][27]
-                        cycleR = "R" + self.floatToStr(prevCycleR) + delim
+                    if prevCycleR != rows[i][27]:
+                        prevCycleR = rows[i][27]
+                        cycleR = "R" + float_to_str(prevCycleR) + delim
                     else:
                         cycleR = ""
             else:
                 cycleR = ""
 
             # Cycle P
-            if self.lstProgram[i][28] != None and self.lstProgram[i][25] > 81:
-                if self.forceAdr:
-                    cycleP = "P" + self.floatToStr(self.lstProgram[i][28]) + delim
+            if rows[i][28] != None and rows[i][25] in P_CYCLE_CODES:
+                if options.forceAdr:
+                    cycleP = "P" + float_to_str(rows[i][28]) + delim
                 else:
-                    if prevCycleP != self.lstProgram[i][28]:
-                        prevCycleP = self.lstProgram[i][28]
-                        cycleP = "P" + self.floatToStr(prevCycleP) + delim
+                    if prevCycleP != rows[i][28]:
+                        prevCycleP = rows[i][28]
+                        cycleP = "P" + float_to_str(prevCycleP) + delim
                     else:
                         cycleP = ""
             else:
                 cycleP = ""
 
             # Cycle Q
-            if self.lstProgram[i][29] != None and self.lstProgram[i][25] == 83:
-                if self.forceAdr:
-                    cycleQ = "Q" + self.floatToStr(self.lstProgram[i][29]) + delim
+            if rows[i][29] != None and rows[i][25] in Q_CYCLE_CODES:
+                if options.forceAdr:
+                    cycleQ = "Q" + float_to_str(rows[i][29]) + delim
                 else:
-                    if prevCycleQ != self.lstProgram[i][29]:
-                        prevCycleQ = self.lstProgram[i][29]
-                        cycleQ = "Q" + self.floatToStr(prevCycleQ) + delim
+                    if prevCycleQ != rows[i][29]:
+                        prevCycleQ = rows[i][29]
+                        cycleQ = "Q" + float_to_str(prevCycleQ) + delim
                     else:
                         cycleQ = ""
             else:
                 cycleQ = ""
 
             # Feed
-            if self.lstProgram[i][11] != 0 and self.lstProgram[i][15] == None:
-                if self.forceAdr:
-                    feed = "F" + self.floatToStr(self.lstProgram[i][11]) + delim
+            if rows[i][11] != 0 and rows[i][15] == None:
+                if options.forceAdr:
+                    feed = "F" + float_to_str(rows[i][11]) + delim
                 else:
-                    if prevFeed != self.lstProgram[i][11]:
-                        prevFeed = self.lstProgram[i][11]
-                        feed = "F" + self.floatToStr(self.lstProgram[i][11]) + delim
+                    if prevFeed != rows[i][11]:
+                        prevFeed = rows[i][11]
+                        feed = "F" + float_to_str(rows[i][11]) + delim
                     else:
                         feed = ""
             else:
@@ -293,88 +406,88 @@ def export_pgm(self):
             feed_cycle = feed
 
             # WCS
-            if self.lstProgram[i][12] != None:
-                posWcs = "G" + str(self.lstProgram[i][12]) + delim
+            if rows[i][12] != None:
+                posWcs = "G" + str(rows[i][12]) + delim
             else:
                 posWcs = ""
 
             # Tool number
-            if self.lstProgram[i][14] != 0 and prevTool != self.lstProgram[i][14]:
-                prevTool = self.lstProgram[i][14]
-                if self.leadingZero:
-                    tool = "T{:02d}".format(self.lstProgram[i][14]) + delim
+            if rows[i][14] != 0 and prevTool != rows[i][14]:
+                prevTool = rows[i][14]
+                if options.leadingZero:
+                    tool = "T{:02d}".format(rows[i][14]) + delim
                 else:
-                    tool = "T{:d}".format(self.lstProgram[i][14]) + delim
+                    tool = "T{:d}".format(rows[i][14]) + delim
             else:
                 tool = ""
 
             # M6
             toolchange = ""
-            if self.lstProgram[i][15] != None:
+            if rows[i][15] != None:
                 if tool != "":
                     first_move = True
-                    toolchange = m_fmt + str(self.lstProgram[i][15]) + delim
+                    toolchange = m_fmt + str(rows[i][15]) + delim
 
             # Speed
-            if self.lstProgram[i][16] != 0:
-                if self.lstProgram[i][17] != None and self.lstProgram[i][17] < 5:
-                    prevSpeed = self.lstProgram[i][16]
-                    speed = "S{:d}".format(self.lstProgram[i][16]) + delim
+            if rows[i][16] != 0:
+                if rows[i][17] != None and rows[i][17] < 5:
+                    prevSpeed = rows[i][16]
+                    speed = "S{:d}".format(rows[i][16]) + delim
                 else:
-                    if prevSpeed != self.lstProgram[i][16]:
-                        prevSpeed = self.lstProgram[i][16]
-                        speed = "S{:d}".format(self.lstProgram[i][16]) + delim
+                    if prevSpeed != rows[i][16]:
+                        prevSpeed = rows[i][16]
+                        speed = "S{:d}".format(rows[i][16]) + delim
                     else:
                         speed = ""
             else:
                 speed = ""
 
             # Speed M code
-            if self.lstProgram[i][17] != None:
-                speed_code = m_fmt + str(self.lstProgram[i][17]) + delim
+            if rows[i][17] != None:
+                speed_code = m_fmt + str(rows[i][17]) + delim
             else:
                 speed_code = ""
 
             # Coolant
-            if self.lstProgram[i][18] != None:
-                coolant = m_fmt + str(self.lstProgram[i][18]) + delim
+            if rows[i][18] != None:
+                coolant = m_fmt + str(rows[i][18]) + delim
             else:
                 coolant = ""
 
             # Stop Program
-            if self.lstProgram[i][19] != None:
-                stopPrgm = m_fmt + str(self.lstProgram[i][19]) + delim
+            if rows[i][19] != None:
+                stopPrgm = m_fmt + str(rows[i][19]) + delim
             else:
                 stopPrgm = ""
 
             # Correction Length
-            if self.lstProgram[i][20] != None:
-                corLen = "G" + str(self.lstProgram[i][20]) + delim
-                if self.lstProgram[i][5] == None:
-                    z = "Z" + self.floatToStr(prevZ) + delim
+            if rows[i][20] != None:
+                corLen = "G" + str(rows[i][20]) + delim
+                if rows[i][5] == None:
+                    z = "Z" + float_to_str(prevZ) + delim
             else:
                 corLen = ""
 
             # CorH
-            if self.lstProgram[i][21] != None:
-                if self.leadingZero:
-                    corH = "H{:02d}".format(self.lstProgram[i][21]) + delim
+            if rows[i][21] != None:
+                if options.leadingZero:
+                    corH = "H{:02d}".format(rows[i][21]) + delim
                 else:
-                    corH = "H{:d}".format(self.lstProgram[i][21]) + delim
+                    corH = "H{:d}".format(rows[i][21]) + delim
             else:
                 corH = ""
 
             # Correction Radius
-            if prevCorRad != self.lstProgram[i][22]:
-                prevCorRad = self.lstProgram[i][22]
+            if prevCorRad != rows[i][22]:
+                prevCorRad = rows[i][22]
                 corRad = "G" + str(prevCorRad) + delim
             else:
                 corRad = ""
 
             # CorD
-            if prevCorD != self.lstProgram[i][23]:
-                prevCorD = self.lstProgram[i][23]
-                if self.leadingZero:
+            if prevCorD != rows[i][23]:
+                prevCorD = rows[i][23]
+                if options.leadingZero:
                     corD = "D{:02d}".format(prevCorD) + delim
                 else:
                     corD = "D{:d}".format(prevCorD) + delim
@@ -382,27 +495,27 @@ def export_pgm(self):
                 corD = ""
 
             # Comment
-            if self.lstProgram[i][24] != None:
-                comment = self.co + self.lstProgram[i][24] + self.ci + delim
+            if rows[i][24] != None:
+                comment = options.co + rows[i][24] + options.ci + delim
             else:
                 comment = ""
 
             # G28
-            if self.lstProgram[i][13] != None:
+            if rows[i][13] != None:
 
-                if self.lstProgram[i][13] == 1:
+                if rows[i][13] == 1:
                     g28line = "G28" + delim + "X0" + delim
-                elif self.lstProgram[i][13] == 2:
+                elif rows[i][13] == 2:
                     g28line = "G28" + delim + "Y0" + delim
-                elif self.lstProgram[i][13] == 3:
+                elif rows[i][13] == 3:
                     g28line = "G28" + delim + "Z0" + delim
-                elif self.lstProgram[i][13] == 4:
+                elif rows[i][13] == 4:
                     g28line = "G28" + delim + "X0" + delim + "Y0" + delim
-                elif self.lstProgram[i][13] == 5:
+                elif rows[i][13] == 5:
                     g28line = "G28" + delim + "X0" + delim + "Z0" + delim
-                elif self.lstProgram[i][13] == 6:
+                elif rows[i][13] == 6:
                     g28line = "G28" + delim + "Y0" + delim + "Z0" + delim
-                elif self.lstProgram[i][13] == 7:
+                elif rows[i][13] == 7:
                     g28line = "G28" + delim + "X0" + delim + "Y0" + delim + "Z0" + delim
                 else:
                     g28line = ""
@@ -416,7 +529,7 @@ def export_pgm(self):
                 continue
 
             # Output line
-            if self.lstProgram[i][0] != None and self.lstProgram[i][0] == 0:
+            if rows[i][0] != None and rows[i][0] == 0:
                 line = (
                     move
                     + arcPlane
@@ -443,7 +556,7 @@ def export_pgm(self):
                     + stopPrgm
                     + comment
                 )
-            elif self.lstProgram[i][0] != None and self.lstProgram[i][0] == 1:
+            elif rows[i][0] != None and rows[i][0] == 1:
                 line = (
                     move
                     + arcPlane
@@ -465,12 +578,12 @@ def export_pgm(self):
                     + stopPrgm
                     + comment
                 )
-            elif self.lstProgram[i][0] != None and self.lstProgram[i][0] > 1:
+            elif rows[i][0] != None and rows[i][0] > 1:
 
                 if i == 0:
                     continue
 
-                if self.lstProgram[i][1] not in (17, 18, 19):
+                if rows[i][1] not in (17, 18, 19):
                     continue
 
                 k = 0
@@ -478,13 +591,13 @@ def export_pgm(self):
                 p0 = p1 = p2 = p3 = None
                 adr_I = adr_J = adr_K = adr_I2 = adr_J2 = adr_K2 = ""
 
-                x1 = self.lstProgram[i - 1][3]
-                y1 = self.lstProgram[i - 1][4]
-                z1 = self.lstProgram[i - 1][5]
+                x1 = rows[i - 1][3]
+                y1 = rows[i - 1][4]
+                z1 = rows[i - 1][5]
 
-                x2 = self.lstProgram[i][3]
-                y2 = self.lstProgram[i][4]
-                z2 = self.lstProgram[i][5]
+                x2 = rows[i][3]
+                y2 = rows[i][4]
+                z2 = rows[i][5]
 
                 if x1 is None:
                     x1 = 0
@@ -499,9 +612,9 @@ def export_pgm(self):
                 if z2 is None:
                     z2 = 0
 
-                if self.lstProgram[i][1] == 17:
-                    xc = self.lstProgram[i][9]
-                    yc = self.lstProgram[i][10]
+                if rows[i][1] == 17:
+                    xc = rows[i][9]
+                    yc = rows[i][10]
 
                     if xc is None:
                         xc = 0
@@ -519,16 +632,16 @@ def export_pgm(self):
                     p2 = [x2, y2]
                     p3 = [xc + radius, yc]
 
-                    adr_I = "I" + self.floatToStr(xc) + delim
-                    adr_J = "J" + self.floatToStr(yc) + delim
+                    adr_I = "I" + float_to_str(xc) + delim
+                    adr_J = "J" + float_to_str(yc) + delim
                     adr_K = ""
-                    adr_I2 = "I" + self.floatToStr(xc1) + delim
-                    adr_J2 = "J" + self.floatToStr(yc1) + delim
+                    adr_I2 = "I" + float_to_str(xc1) + delim
+                    adr_J2 = "J" + float_to_str(yc1) + delim
                     adr_K2 = ""
 
-                elif self.lstProgram[i][1] == 18:
-                    xc = self.lstProgram[i][9]
-                    zc = self.lstProgram[i][10]
+                elif rows[i][1] == 18:
+                    xc = rows[i][9]
+                    zc = rows[i][10]
 
                     if xc is None:
                         xc = 0
@@ -546,16 +659,16 @@ def export_pgm(self):
                     p2 = [x2, z2]
                     p3 = [xc + radius, zc]
 
-                    adr_I = "I" + self.floatToStr(xc) + delim
+                    adr_I = "I" + float_to_str(xc) + delim
                     adr_J = ""
-                    adr_K = "K" + self.floatToStr(zc) + delim
-                    adr_I2 = "I" + self.floatToStr(xc1) + delim
+                    adr_K = "K" + float_to_str(zc) + delim
+                    adr_I2 = "I" + float_to_str(xc1) + delim
                     adr_J2 = ""
-                    adr_K2 = "K" + self.floatToStr(zc1) + delim
+                    adr_K2 = "K" + float_to_str(zc1) + delim
 
-                elif self.lstProgram[i][1] == 19:
-                    yc = self.lstProgram[i][9]
-                    zc = self.lstProgram[i][10]
+                elif rows[i][1] == 19:
+                    yc = rows[i][9]
+                    zc = rows[i][10]
 
                     if yc is None:
                         yc = 0
@@ -574,13 +687,13 @@ def export_pgm(self):
                     p3 = [yc + radius, zc]
 
                     adr_I = ""
-                    adr_J = "J" + self.floatToStr(yc) + delim
-                    adr_K = "K" + self.floatToStr(zc) + delim
+                    adr_J = "J" + float_to_str(yc) + delim
+                    adr_K = "K" + float_to_str(zc) + delim
                     adr_I2 = ""
-                    adr_J2 = "J" + self.floatToStr(yc1) + delim
-                    adr_K2 = "K" + self.floatToStr(zc1) + delim
+                    adr_J2 = "J" + float_to_str(yc1) + delim
+                    adr_K2 = "K" + float_to_str(zc1) + delim
 
-                if self.lang == 0:
+                if options.lang == 0:
 
                     line = (
                         move
@@ -603,7 +716,7 @@ def export_pgm(self):
                         + comment
                     )
 
-                elif self.lang == 1:
+                elif options.lang == 1:
 
                     line = (
                         move
@@ -626,17 +739,17 @@ def export_pgm(self):
                         + comment
                     )
 
-                elif self.lang == 2:
+                elif options.lang == 2:
 
                     v0 = np.array(p1) - np.array(p0)
                     v1 = np.array(p1) - np.array(p2)
-                    if self.lstProgram[i][0] == 2:
-                        if self.lstProgram[i][1] == 18:
+                    if rows[i][0] == 2:
+                        if rows[i][1] == 18:
                             angle = np.arctan2(np.linalg.det([v0, v1]), np.dot(v0, v1))
                         else:
                             angle = np.arctan2(np.linalg.det([v1, v0]), np.dot(v1, v0))
                     else:
-                        if self.lstProgram[i][1] == 18:
+                        if rows[i][1] == 18:
                             angle = np.arctan2(np.linalg.det([v1, v0]), np.dot(v1, v0))
                         else:
                             angle = np.arctan2(np.linalg.det([v0, v1]), np.dot(v0, v1))
@@ -645,7 +758,7 @@ def export_pgm(self):
                         angle = angle + 2 * pi
 
                     if angle >= pi:
-                        if self.arc_type == 2:
+                        if settings.arc_type == 2:
                             line = (
                                 move
                                 + arcPlane
@@ -688,7 +801,7 @@ def export_pgm(self):
                                 + comment
                             )
                     else:
-                        adr_R = "R" + self.floatToStr(radius) + delim
+                        adr_R = "R" + float_to_str(radius) + delim
                         line = (
                             move
                             + arcPlane
@@ -708,8 +821,14 @@ def export_pgm(self):
                             + comment
                         )
 
-                elif self.lang == 3:
-                    points = 314
+                elif options.lang == 3:
+                    if settings.arc_tolerance > 0:
+                        # chords per turn within the tolerance
+                        points = int(
+                            ceil(2 * pi / chord_angle(radius, settings.arc_tolerance))
+                        )
+                    else:
+                        points = TURN_POINTS
 
                     v0 = np.array(p1) - np.array(p0)
                     v1 = np.array(p1) - np.array(p2)
@@ -720,13 +839,13 @@ def export_pgm(self):
                     if startAngle < 0:
                         startAngle = startAngle + 2 * pi
 
-                    if self.lstProgram[i][0] == 2:
-                        if self.lstProgram[i][1] == 18:
+                    if rows[i][0] == 2:
+                        if rows[i][1] == 18:
                             angle = np.arctan2(np.linalg.det([v0, v1]), np.dot(v0, v1))
                         else:
                             angle = np.arctan2(np.linalg.det([v1, v0]), np.dot(v1, v0))
                     else:
-                        if self.lstProgram[i][1] == 18:
+                        if rows[i][1] == 18:
                             angle = np.arctan2(np.linalg.det([v1, v0]), np.dot(v1, v0))
                         else:
                             angle = np.arctan2(np.linalg.det([v0, v1]), np.dot(v0, v1))
@@ -736,9 +855,9 @@ def export_pgm(self):
 
                     step = k / ((angle * points) / (2 * pi))
 
-                    if self.lstProgram[i][0] == 2 and self.lstProgram[i][1] != 18:
+                    if rows[i][0] == 2 and rows[i][1] != 18:
                         angle = -1 * abs(angle)
-                    elif self.lstProgram[i][0] == 3 and self.lstProgram[i][1] == 18:
+                    elif rows[i][0] == 3 and rows[i][1] == 18:
                         angle = -1 * abs(angle)
 
                     prev_x = x1
@@ -754,8 +873,8 @@ def export_pgm(self):
 
                     for point in range(1, points):
 
-                        if self.lstProgram[i][0] == 2:
-                            if self.lstProgram[i][1] == 18:
+                        if rows[i][0] == 2:
+                            if rows[i][1] == 18:
                                 delta = (point * 2 * pi) / points
                                 if delta >= angle:
                                     break
@@ -764,7 +883,7 @@ def export_pgm(self):
                                 if delta <= angle:
                                     break
                         else:
-                            if self.lstProgram[i][1] == 18:
+                            if rows[i][1] == 18:
                                 delta = -1 * (point * 2 * pi) / points
                                 if delta <= angle:
                                     break
@@ -773,25 +892,25 @@ def export_pgm(self):
                                 if delta >= angle:
                                     break
 
-                        if self.lstProgram[i][1] == 17:
+                        if rows[i][1] == 17:
                             x3 = xc + radius * cos(startAngle + delta)
                             y3 = yc + radius * sin(startAngle + delta)
                             z3 = z1 + step * point
 
-                        elif self.lstProgram[i][1] == 18:
+                        elif rows[i][1] == 18:
                             x3 = xc + radius * cos(startAngle + delta)
                             y3 = y1 + step * point
                             z3 = zc + radius * sin(startAngle + delta)
 
-                        elif self.lstProgram[i][1] == 19:
+                        elif rows[i][1] == 19:
                             x3 = x1 + step * point
                             y3 = yc + radius * cos(startAngle + delta)
                             z3 = zc + radius * sin(startAngle + delta)
 
-                        if self.lstProgram[i][2] == 90:
-                            x = "X" + self.floatToStr(x3) + delim
-                            y = "Y" + self.floatToStr(y3) + delim
-                            z = "Z" + self.floatToStr(z3) + delim
+                        if rows[i][2] == 90:
+                            x = "X" + float_to_str(x3) + delim
+                            y = "Y" + float_to_str(y3) + delim
+                            z = "Z" + float_to_str(z3) + delim
                         else:
                             x4 = x3 - prev_x
                             y4 = y3 - prev_y
@@ -801,9 +920,9 @@ def export_pgm(self):
                             prev_y = y3
                             prev_z = z3
 
-                            x = "X" + self.floatToStr(x4) + delim
-                            y = "Y" + self.floatToStr(y4) + delim
-                            z = "Z" + self.floatToStr(z4) + delim
+                            x = "X" + float_to_str(x4) + delim
+                            y = "Y" + float_to_str(y4) + delim
+                            z = "Z" + float_to_str(z4) + delim
 
                         if point == 1:
                             line = (
@@ -811,7 +930,7 @@ def export_pgm(self):
                                 + "1"
                                 + delim
                                 + "G"
-                                + str(self.lstProgram[i][2])
+                                + str(rows[i][2])
                                 + delim
                                 + x
                                 + y
@@ -826,16 +945,16 @@ def export_pgm(self):
 
                         lst.append(line.rstrip())
 
-                    if self.lstProgram[i][2] == 90:
+                    if rows[i][2] == 90:
                         line = (
                             "X"
-                            + self.floatToStr(x2)
+                            + float_to_str(x2)
                             + delim
                             + "Y"
-                            + self.floatToStr(y2)
+                            + float_to_str(y2)
                             + delim
                             + "Z"
-                            + self.floatToStr(z2)
+                            + float_to_str(z2)
                         )
                     else:
                         x2_val = x2 or 0
@@ -847,13 +966,13 @@ def export_pgm(self):
 
                         line = (
                             "X"
-                            + self.floatToStr(x2_val - prev_x_val)
+                            + float_to_str(x2_val - prev_x_val)
                             + delim
                             + "Y"
-                            + self.floatToStr(y2_val - prev_y_val)
+                            + float_to_str(y2_val - prev_y_val)
                             + delim
                             + "Z"
-                            + self.floatToStr(z2_val - prev_z_val)
+                            + float_to_str(z2_val - prev_z_val)
                         )
 
             else:
@@ -878,15 +997,19 @@ def export_pgm(self):
                 lst.append(line.rstrip())
 
     else:
-        for i in range(len(self.lst_points)):
-            self.progressBar.setValue(int((i * 100) / len(self.lst_points)))
-
-            x = "X" + self.floatToStr(self.lst_points[i][0]) + delim
-            y = "Y" + self.floatToStr(self.lst_points[i][1]) + delim
-            z = "Z" + self.floatToStr(self.lst_points[i][2]) + delim
-            feed = "F" + self.floatToStr(self.lst_feed[i]) + delim
-
-            if self.lst_feed[i] == self.rapidFeed:
+        points = program.points.pos.tolist()
+        point_feed = program.points.feed.tolist()
+        every = progress_step(len(points))
+        for i in range(len(points)):
+            if progress and i % every == 0:
+                progress(int((i * 100) / len(points)))
+
+            x = "X" + float_to_str(points[i][0]) + delim
+            y = "Y" + float_to_str(points[i][1]) + delim
+            z = "Z" + float_to_str(points[i][2]) + delim
+            feed = "F" + float_to_str(point_feed[i]) + delim
+
+            if point_feed[i] == settings.rapid_feed:
                 line = g_fmt + "0" + delim + x + y + z
             else:
                 line = g_fmt + "1" + delim + x + y + z + feed
@@ -897,15 +1020,15 @@ def export_pgm(self):
                 if line.rstrip() != lst[-1]:
                     lst.append(line.rstrip())
 
-    if self.endPgmExp != "":
-        lst.append(self.endPgmExp.upper())
+    if options.endPgmExp != "":
+        lst.append(options.endPgmExp.upper())
     txt = ""
     lst1 = []
-    lst1.append(self.er)
-    if self.startPgmExp != "":
-        lst1.append(self.startPgmExp.upper())
+    lst1.append(options.er)
+    if options.startPgmExp != "":
+        lst1.append(options.startPgmExp.upper())
 
-    if self.seqNum:
+    if options.seqNum:
         for i in range(len(lst)):
             line = "N" + str(st) + seq_delim + str(lst[i])
             st = st + incr
@@ -913,13 +1036,13 @@ def export_pgm(self):
     else:
         lst1.extend(lst)
 
-    toolpath = self.toolPath()
+    toolpath = toolpath_summary(program, options.co, options.ci)
     if toolpath != "":
         lst1.append(toolpath)
-    limits = self.toolPathLimits()
+    limits = toolpath_limits(program, settings.lathe_mode, options.co, options.ci)
     if limits != "":
         lst1.append(limits)
-    lst1.append(self.er)
+    lst1.append(options.er)
     txt = "\n".join(lst1)
 
     return txt
@@ -0,0 +1,135 @@
+"""Reparse only the edited lines of an already parsed program."""
+
+from .modal import ModalState
+from .motion import PointBuffer, expand_blocks, finish_blocks
+from .parser import interpret, new_columns
+from .program import BlockTable, PointTable, Program
+from .toolpath import Toolpath
+
+
+class DirtyLines:
+    """Line range edited since the last parse, in current document lines.
+
+    ``first``/``last`` bound the changed lines of the current text and
+    ``delta`` is the line count change, so the same range of the parsed
+    text is ``[first, last - delta)``.
+    """
+
+    def __init__(self):
+        """Start with nothing edited."""
+        self.clear()
+
+    def clear(self):
+        """Forget all edits, e.g. after a parse."""
+        self.first = None
+        self.last = None
+        self.delta = 0
+
+    def __bool__(self):
+        """Return True if any line was edited."""
+        return self.first is not None
+
+    def mark(self, line, lines_added):
+        """Record an edit starting at ``line`` that added ``lines_added`` lines.
+
+        A negative ``lines_added`` means lines were removed.
+        """
+        touched = line + max(lines_added, 0) + 1
+        if self.first is None:
+            self.first = line
+            self.last = touched
+        else:
+            last = self.last
+            if last > line:
+                # lines below the edit move with it
+                last = max(last + lines_added, line + 1)
+            self.first = min(self.first, line)
+            self.last = max(last, touched)
+        self.delta += lines_added
+
+    @property
+    def old_last(self):
+        """End of the edited range in the parsed text."""
+        return self.last - self.delta
+
+
+def reparse(program, settings, first, old_last, new_lines):
+    """Return a program with lines [first, old_last) replaced by ``new_lines``.
+
+    ``new_lines`` must be uppercased like parse_text() input. Blocks are
+    interpreted from the modal state before ``first`` until the state
+    matches the old program again; the remaining rows and their points are
+    reused with shifted block indices.
+    """
+    old = program.blocks
+    n_old = len(old)
+    old_last = min(old_last, n_old)
+
+    def state_before(i):
+        if i > 0:
+            return ModalState.after_block(old, i - 1)
+        return ModalState.initial(settings)
+
+    state = state_before(first)
+    columns, comment = new_columns()
+    interpret(new_lines, state, settings, columns, comment)
+    # continue into unchanged lines until the modal state converges
+    j = old_last
+    while j < n_old and state != state_before(j):
+        interpret(program.lines[j : j + 1], state, settings, columns, comment)
+        j += 1
+
+    mid = BlockTable.from_lists(columns, comment)
+    stop = first + len(mid)
+    shift = stop - j
+    result = Program(
+        program.lines[:first] + list(new_lines) + program.lines[old_last:],
+        old.splice(first, j, mid),
+    )
+
+    if program.end_block < first:
+        # the changed blocks lie after the program end
+        result.path = program.path
+        result.points = program._points
+        result.end_block = program.end_block
+    else:
+        buf = PointBuffer()
+        end = expand_blocks(result, settings, first, stop, buf)
+        parts = [program.path.select(0, first), buf.toolpath(settings)]
+        # the parts that are expanded anew; the old suffix keeps its points
+        fresh = [parts[1]]
+        suffix = None
+        if end < stop:
+            result.end_block = end
+        elif program.end_block >= j:
+            parts.append(program.path.select(j, n_old).shifted(shift))
+            result.end_block = program.end_block + shift
+            if program._points is not None:
+                suffix = program._points.select(j, n_old)
+        else:
+            # the old program end was edited away, expand up to the new one
+            buf = PointBuffer()
+            result.end_block = expand_blocks(
+                result, settings, stop, len(result.blocks), buf
+            )
+            parts.append(buf.toolpath(settings))
+            fresh.append(parts[-1])
+        result.path = Toolpath.concat(parts, settings)
+        if program._points is not None:
+            # reuse the tessellated points outside the edit
+            points = [program._points.select(0, first)]
+            points += [part.tessellate() for part in fresh]
+            if suffix is not None:
+                points.append(
+                    PointTable(
+                        suffix.pos, suffix.feed, suffix.block + shift, suffix.move
+                    )
+                )
+            result.points = PointTable.concat(points)
+
+    result.checkpoints = program.checkpoints.copy()
+    # the state before ``first`` is unchanged, if that block still exists
+    result.checkpoints.truncate(min(first, len(result.blocks) - 1))
+    result.checkpoints.extend_from(result.blocks)
+    finish_blocks(result, settings)
+    return result
@@ -0,0 +1,73 @@
+"""Decimated levels of detail of a toolpath for drawing it zoomed out.
+
+Each level snaps the points to a grid and keeps only the first point of
+every run that stays in one cell, so a dropped point is never farther than
+a cell diagonal from a kept one. Cells grow by LEVEL_FACTOR per level.
+"""
+
+import numpy as np
+
+# first level's cell size as a fraction of the toolpath's extent
+FIRST_CELL = 1e-4
+# cell growth from one level to the next
+LEVEL_FACTOR = 4
+# paths with fewer points are always drawn in full
+MIN_POINTS = 50000
+# a level has to drop at least this share of the previous level's points
+MIN_SAVING = 0.2
+
+
+def decimate(pos, move, cell):
+    """Return the indices of the points kept on a grid of ``cell`` size.
+
+    The first and last points and every change of move type are kept.
+    """
+    n = len(pos)
+    if n < 3:
+        return np.arange(n)
+    cells = np.floor(pos / cell).astype(np.int64)
+    keep = np.empty(n, np.bool_)
+    keep[0] = keep[-1] = True
+    keep[1:-1] = (cells[1:-1] != cells[:-2]).any(axis=1)
+    keep[1:] |= move[1:] != move[:-1]
+    return np.flatnonzero(keep)
+
+
+class LodPyramid:
+    """Point indices of the coarser levels with their largest error.
+
+    ``levels[i]`` are the points kept by level i + 1 (level 0 is the full
+    path) and ``tolerances[i]`` the farthest a dropped point can be from
+    the drawn line, both growing with i.
+    """
+
+    def __init__(self, levels=None, tolerances=None):
+        """Wrap already built levels; use build() to decimate a path."""
+        self.levels = levels if levels is not None else []
+        self.tolerances = tolerances if tolerances is not None else []
+
+    def __len__(self):
+        """Return the number of coarser levels."""
+        return len(self.levels)
+
+    @classmethod
+    def build(cls, pos, move):
+        """Decimate the path ``pos`` with point ``move`` types level by level."""
+        pyramid = cls()
+        if len(pos) <= MIN_POINTS:
+            return pyramid
+        extent = float(np.sqrt(((pos.max(axis=0) - pos.min(axis=0)) ** 2).sum()))
+        cell = extent * FIRST_CELL
+        kept = len(pos)
+        while kept > MIN_POINTS and 0 < cell < extent:
+            index = decimate(pos, move, cell)
+            if len(index) <= kept * (1 - MIN_SAVING):
+                pyramid.levels.append(index)
+                pyramid.tolerances.append(float(cell * np.sqrt(3)))
+                kept = len(index)
+            cell *= LEVEL_FACTOR
+        return pyramid
+
+    def level_for(self, error):
+        """Return the coarsest level whose tolerance is within ``error``."""
+        return int(np.searchsorted(self.tolerances, error, side="right"))
@@ -0,0 +1,133 @@
+"""Modal interpreter state carried from one block to the next."""
+
+from bisect import bisect_right
+from dataclasses import astuple, dataclass
+
+from .tokenizer import STATE_GROUPS
+
+
+@dataclass
+class ModalState:
+    """Sticky words and absolute position after a block has been read.
+
+    Every tokenizer.STATE_GROUPS group has a field of its name.
+
+    Two equal states produce identical block rows for identical lines,
+    which is what lets a reparse stop as soon as it converges.
+    """
+
+    move: int = 0
+    plane: int = 17
+    pos_mode: int = 90
+    cycle: int = 80
+    x: float = 0.0
+    y: float = 0.0
+    z: float = 0.0
+    cycle_z: float = 0.0
+    r: float = None
+    p: float = 0
+    q: float = 0
+    tool: int = 0
+    speed: int = 0
+    feed: float = 0
+    cor_rad: int = 40
+    cor_d: int = 0
+
+    @classmethod
+    def initial(cls, settings):
+        """Return the state before the first block of a program."""
+        return cls(
+            plane=18 if settings.lathe_mode else 17,
+            x=settings.x_pos_mach,
+            y=settings.y_pos_mach,
+            z=settings.z_pos_mach,
+        )
+
+    @classmethod
+    def after_block(cls, blocks, i):
+        """Restore the state left by block i of a BlockTable."""
+
+        def optional(name):
+            if blocks.present[name][i]:
+                return getattr(blocks, name)[i].item()
+            return None
+
+        return cls(
+            **{name: getattr(blocks, name)[i].item() for name in STATE_GROUPS},
+            x=blocks.x[i].item(),
+            y=blocks.y[i].item(),
+            z=blocks.z[i].item(),
+            cycle_z=blocks.cycle_z[i].item(),
+            r=optional("r"),
+            p=optional("p"),
+            q=optional("q"),
+            tool=blocks.tool[i].item(),
+            speed=blocks.speed[i].item(),
+            feed=blocks.feed[i].item(),
+            cor_d=blocks.cor_d[i].item(),
+        )
+
+    def copy(self):
+        """Return an independent copy of this state."""
+        return ModalState(*astuple(self))
+
+
+class CheckpointIndex:
+    """Modal states snapshotted every ``interval`` blocks.
+
+    A checkpoint at block b holds the state before block b, so work on any
+    block can start from the nearest checkpoint instead of line 0. Block 0
+    always has one.
+    """
+
+    def __init__(self, interval, initial):
+        """Create an index holding only the ``initial`` state before block 0."""
+        self.interval = max(int(interval), 1)
+        self.blocks = [0]
+        self.states = [initial.copy()]
+
+    def __len__(self):
+        """Return the number of checkpoints."""
+        return len(self.blocks)
+
+    def copy(self):
+        """Return an index sharing no lists with this one."""
+        index = CheckpointIndex(self.interval, self.states[0])
+        index.blocks = list(self.blocks)
+        index.states = list(self.states)
+        return index
+
+    def due(self, block):
+        """Return True if a snapshot belongs before ``block``."""
+        return block > 0 and block % self.interval == 0
+
+    def add(self, block, state):
+        """Store a copy of the state before ``block``."""
+        self.blocks.append(block)
+        self.states.append(state.copy())
+
+    def nearest(self, block):
+        """Return (block, state) of the last checkpoint at or before ``block``.
+
+        The state is a copy that the caller may advance.
+        """
+        k = max(bisect_right(self.blocks, block) - 1, 0)
+        return self.blocks[k], self.states[k].copy()
+
+    def truncate(self, block):
+        """Drop the checkpoints after ``block``."""
+        del self.blocks[max(bisect_right(self.blocks, block), 1) :]
+        del self.states[len(self.blocks) :]
+
+    def extend_from(self, blocks):
+        """Add the checkpoints after the last one from a BlockTable's rows."""
+        first = (self.blocks[-1] // self.interval + 1) * self.interval
+        for block in range(first, len(blocks), self.interval):
+            self.add(block, ModalState.after_block(blocks, block - 1))
+
+    @classmethod
+    def from_blocks(cls, blocks, settings):
+        """Build an index from a parsed BlockTable."""
+        index = cls(settings.checkpoint_interval, ModalState.initial(settings))
+        index.extend_from(blocks)
+        return index
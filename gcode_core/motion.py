@@ -0,0 +1,436 @@
+"""Expansion of parsed blocks into toolpath points, arcs and drill cycles."""
+
+import numpy as np
+
+from .program import LINEAR, RAPID, PointTable, Program, progress_step
+from .toolpath import PLANE_AXES, ArcTable, Toolpath
+
+
+class PointBuffer:
+    """Append-only point lists, turned into a Toolpath when expansion ends.
+
+    Arcs are collected as ArcTables that remember the list position their
+    points go before, and are not tessellated here. Batches of points
+    computed with arrays are inserted at list positions the same way.
+    """
+
+    def __init__(self):
+        """Start with no points."""
+        self.x = []
+        self.y = []
+        self.z = []
+        self.feed = []
+        self.block = []
+        self.move = []
+        self.arcs = []
+        self.inserts = []
+
+    def __len__(self):
+        """Return the number of points added one by one."""
+        return len(self.x)
+
+    def add(self, x, y, z, f, num, move):
+        """Add a single motion point."""
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.feed.append(f)
+        self.block.append(num)
+        self.move.append(move)
+
+    def insert(self, arcs):
+        """Add an ArcTable whose positions index the points added so far.
+
+        Positions must not decrease, also across calls.
+        """
+        self.arcs.append(arcs)
+
+    def insert_points(self, positions, counts, table):
+        """Place ``counts[g]`` rows of ``table`` before list point ``positions[g]``.
+
+        Groups are taken from ``table`` in order and ``positions`` must not
+        decrease, also across calls. They go after arcs at the same position.
+        """
+        self.inserts.append((positions, counts, table))
+
+    def toolpath(self, settings):
+        """Return the collected primitives as a Toolpath."""
+        vertices = PointTable.from_lists(
+            self.x, self.y, self.z, self.feed, self.block, self.move
+        )
+        arcs = ArcTable.concat([ArcTable()] + self.arcs)
+        if self.inserts:
+            positions = np.concatenate([p for p, _, _ in self.inserts])
+            counts = np.concatenate([c for _, c, _ in self.inserts])
+            batch = PointTable.concat([t for _, _, t in self.inserts])
+            before = np.zeros(len(counts) + 1, np.int64)
+            np.cumsum(counts, out=before[1:])
+            listed = np.arange(len(vertices))
+            listed += before[np.searchsorted(positions, listed, "right")]
+            inserted = np.repeat(positions, counts) + np.arange(len(batch))
+            n = len(vertices) + len(batch)
+            merged = PointTable(
+                np.empty((n, 3)),
+                np.empty(n),
+                np.empty(n, np.int32),
+                np.empty(n, np.int8),
+            )
+            for index, part in ((listed, vertices), (inserted, batch)):
+                merged.pos[index] = part.pos
+                merged.feed[index] = part.feed
+                merged.block[index] = part.block
+                merged.move[index] = part.move
+            vertices = merged
+            arcs.position = (
+                arcs.position
+                + before[np.searchsorted(positions, arcs.position, "left")]
+            )
+        return Toolpath(vertices, arcs, settings)
+
+
+# how far G73 backs off between pecks to break the chip
+CHIP_BREAK_RETRACT = 0.1
+
+
+def peck_depths(z_ref, z_end, q):
+    """Return the peck bottoms of a G73/G83 cycle above its final depth."""
+    ost = abs(z_end - z_ref) % q
+    if ost > 0:
+        numbers = int(abs(z_end - z_ref) // q)
+    else:
+        numbers = int(abs(z_end - z_ref) / q) - 1
+    depths = []
+    z_cycle = z_ref
+    for _ in range(numbers):
+        z_cycle = z_cycle - q
+        depths.append(z_cycle)
+    return depths
+
+
+def cycle_template(cycle, posMode, z, r, z_cycle, q):
+    """Return the motion of one canned cycle hole relative to its XY.
+
+    The result is three lists with one entry per point: the X shift (Q of
+    G76/G87), the Z level and the move type. The return to the initial
+    level is not included; expansion adds it as the block's own point.
+    """
+    if posMode == 90:
+        z_ref = r
+        z_end = z_cycle
+    else:
+        z_ref = z + r
+        z_end = z + z_cycle
+
+    # (X shift, Z, move) rows
+    if cycle == 83 and q != 0:
+        rows = [(0, z, RAPID)]
+        z_cycle = z_ref
+        for num, z_cycle in enumerate(peck_depths(z_ref, z_end, q)):
+            rows.append((0, z_ref, RAPID))
+            if num > 0:
+                rows.append((0, z_cycle + q, RAPID))
+            rows.append((0, z_cycle, LINEAR))
+            rows.append((0, z_ref, RAPID))
+        rows.append((0, z_cycle, RAPID))
+        rows.append((0, z_end, LINEAR))
+    elif cycle == 73 and q != 0:
+        # chip break: short back-off instead of a retract to R
+        rows = [(0, z, RAPID), (0, z_ref, RAPID)]
+        back = CHIP_BREAK_RETRACT if z_end < z_ref else -CHIP_BREAK_RETRACT
+        for z_cycle in peck_depths(z_ref, z_end, q):
+            rows.append((0, z_cycle, LINEAR))
+            rows.append((0, z_cycle + back, RAPID))
+        rows.append((0, z_end, LINEAR))
+    elif cycle == 87:
+        # back boring: in below the part shifted by Q, bore up to Z
+        rows = [
+            (0, z, RAPID),
+            (q, z, RAPID),
+            (q, z_ref, RAPID),
+            (0, z_ref, RAPID),
+            (0, z_end, LINEAR),
+            (q, z_end, RAPID),
+            (q, z, RAPID),
+        ]
+    else:
+        rows = [(0, z, RAPID), (0, z_ref, RAPID), (0, z_end, LINEAR)]
+        if cycle in (84, 85, 89):
+            # tapping and boring feed back out to R
+            rows.append((0, z_ref, LINEAR))
+        elif cycle == 76:
+            # fine boring: shift off the wall by Q before leaving
+            rows += [(q, z_end, RAPID), (q, z_ref, RAPID), (0, z_ref, RAPID)]
+    shift, level, move = zip(*rows)
+    return list(shift), list(level), list(move)
+
+
+def expand(program, settings, progress=None):
+    """Expand the block table of a parsed program into its toolpath.
+
+    Arcs are kept as primitives; ``program.points`` tessellates them the
+    first time it is read. Also fills the per-block incremental distances
+    and arc centers used by export. ``progress`` is an optional callable
+    receiving a 0-100 percentage.
+    """
+    buf = PointBuffer()
+    program.end_block = expand_blocks(
+        program, settings, 0, len(program.blocks), buf, progress
+    )
+    program.path = buf.toolpath(settings)
+    program.points = None
+    finish_blocks(program, settings)
+    return program
+
+
+def reexpand(program, settings, progress=None):
+    """Return a new expansion of an already parsed program.
+
+    Only expansion settings such as ``block_delete`` may differ from the
+    ones the program was parsed with; the block table is shared, apart from
+    the columns expansion fills.
+    """
+    blocks = program.blocks.rows(0, len(program.blocks))
+    for name in ("cx", "cy", "cz"):
+        setattr(blocks, name, getattr(blocks, name).copy())
+    result = Program(program.lines, blocks)
+    result.checkpoints = program.checkpoints
+    return expand(result, settings, progress)
+
+
+def expand_blocks(program, settings, start, stop, buf, progress=None):
+    """Expand blocks [start, stop) into ``buf``.
+
+    Arc centers of the expanded blocks are written to the block table.
+    Blocks whose delete level is in ``settings.block_delete`` are skipped.
+    Returns the index of the program end block (M30/M2), or ``stop``.
+    """
+    blocks = program.blocks
+    deleted = np.isin(blocks.block_delete[start:stop], settings.block_delete)
+    ends = np.flatnonzero(blocks.program_end[start:stop] & ~deleted)
+    end = start + int(ends[0]) if len(ends) else stop
+    skip = deleted.tolist()
+    # one block before start supplies the arc/incremental start point
+    lo = max(start - 1, 0)
+    move = blocks.move[lo:stop].tolist()
+    plane = blocks.plane[lo:stop].tolist()
+    pos_mode = blocks.pos_mode[lo:stop].tolist()
+    cycle = blocks.cycle[lo:stop].tolist()
+    cycle_z = blocks.cycle_z[lo:stop].tolist()
+    coord_x = blocks.x[lo:stop].tolist()
+    coord_y = blocks.y[lo:stop].tolist()
+    coord_z = blocks.z[lo:stop].tolist()
+    coord_i = blocks.i[lo:stop].tolist()
+    coord_j = blocks.j[lo:stop].tolist()
+    coord_k = blocks.k[lo:stop].tolist()
+    coord_r = blocks.r[lo:stop].tolist()
+    cycle_q = blocks.q[lo:stop].tolist()
+    block_feed = blocks.feed[lo:stop].tolist()
+    speed = blocks.speed[lo:stop].tolist()
+    rapid = settings.rapid_feed
+
+    if settings.lathe_mode:
+        scale = 0.5
+    else:
+        scale = 1
+
+    arcs = []
+    holes = []
+    every = progress_step(stop - start)
+    for i in range(start, end):
+        k = i - lo
+
+        if progress and (i - start) % every == 0:
+            progress(int(((i - start) * 100) / (stop - start)))
+
+        if skip[i - start]:
+            continue
+
+        if settings.lathe_mode:
+            feed = block_feed[k] * speed[k]
+        else:
+            feed = block_feed[k]
+
+        if i > 0:
+            prev_x = coord_x[k - 1] * scale
+            prev_y = coord_y[k - 1]
+            prev_z = coord_z[k - 1]
+        else:
+            prev_x = 0
+            prev_y = 0
+            prev_z = 0
+
+        x = coord_x[k] * scale
+        y = coord_y[k]
+        z = coord_z[k]
+
+        # absent I/J/K/R/Q words are stored as 0
+        cx = coord_i[k]
+        cy = coord_j[k]
+        cz = coord_k[k]
+        adr_R = coord_r[k]
+        q = cycle_q[k]
+
+        if move[k] == 0:
+            if cycle[k] != 80:
+                holes.append(
+                    (
+                        i,
+                        len(buf),
+                        cycle[k],
+                        pos_mode[k],
+                        x,
+                        y,
+                        z,
+                        adr_R,
+                        cycle_z[k],
+                        q,
+                        feed,
+                    )
+                )
+
+            buf.add(x, y, z, rapid, i, RAPID)
+
+        elif move[k] == 1:
+            buf.add(x, y, z, feed, i, LINEAR)
+
+        elif move[k] > 1:
+            # G18 arcs are viewed from -Y, so the direction flips
+            direction = move[k]
+            if plane[k] == 18:
+                direction = 5 - direction
+            # the point list position the arc's points go before
+            arcs.append(
+                (
+                    i,
+                    len(buf),
+                    direction,
+                    plane[k],
+                    prev_x,
+                    prev_y,
+                    prev_z,
+                    cx,
+                    cy,
+                    cz,
+                    x,
+                    y,
+                    z,
+                    adr_R,
+                    feed,
+                    move[k],
+                )
+            )
+
+    if holes:
+        add_holes(settings, holes, buf)
+    if arcs:
+        add_arcs(blocks, settings, arcs, buf)
+    return end
+
+
+def add_holes(settings, holes, buf):
+    """Expand the canned cycle holes collected by expand_blocks().
+
+    Each row of ``holes`` is (block, buffer position, cycle, G90/G91, XYZ,
+    R, cycle Z, Q, feed). Holes with the same cycle parameters share one
+    cycle_template(), which is broadcast over their XY positions.
+    """
+    columns = [np.array(c) for c in zip(*holes)]
+    block, position = columns[:2]
+    x, y = columns[4:6]
+    params = np.stack([columns[k] for k in (2, 3, 6, 7, 8, 9, 10)], axis=1)
+    # cycle words are modal, so equal parameters come in runs of holes
+    change = np.ones(len(holes), np.bool_)
+    change[1:] = (params[1:] != params[:-1]).any(axis=1)
+    keys = {}
+    run_group = [
+        keys.setdefault(tuple(key), len(keys)) for key in params[change].tolist()
+    ]
+    group = np.array(run_group)[np.cumsum(change) - 1]
+    shift, level, move, feed = [], [], [], []
+    sizes = np.zeros(len(keys), np.int64)
+    for g, (cycle, posMode, z, r, z_cycle, q, f) in enumerate(keys):
+        dx, dz, moves = cycle_template(int(cycle), int(posMode), z, r, z_cycle, q)
+        shift += dx
+        level += dz
+        move += moves
+        feed += [f if m == LINEAR else settings.rapid_feed for m in moves]
+        sizes[g] = len(moves)
+    starts = np.cumsum(sizes) - sizes
+
+    counts = sizes[group]
+    hole = np.repeat(np.arange(len(holes)), counts)
+    step = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    row = starts[group[hole]] + step
+    pos = np.empty((len(row), 3))
+    pos[:, 0] = x[hole] + np.array(shift, np.float64)[row]
+    pos[:, 1] = y[hole]
+    pos[:, 2] = np.array(level, np.float64)[row]
+    buf.insert_points(
+        position,
+        counts,
+        PointTable(
+            pos,
+            np.array(feed, np.float64)[row],
+            block[hole].astype(np.int32),
+            np.array(move, np.int8)[row],
+        ),
+    )
+
+
+def add_arcs(blocks, settings, arcs, buf):
+    """Fit the arc blocks collected by expand_blocks() in one batch.
+
+    Each row of ``arcs`` is (block, buffer position, direction, plane, start
+    XYZ, I, J, K, end XYZ, R, feed, move). Arc centers go to the block table
+    and the arcs into ``buf`` at their positions.
+    """
+    columns = [np.array(c) for c in zip(*arcs)]
+    block, position, direction, plane = columns[:4]
+    start = np.stack(columns[4:7], axis=1)
+    offset = np.stack(columns[7:10], axis=1)
+    end = np.stack(columns[10:13], axis=1)
+    r, feed, move = columns[13:]
+    # pick each arc's plane axes (u, v, w) out of XYZ
+    axes = np.zeros((len(arcs), 3), np.int64)
+    for code, plane_axes in PLANE_AXES.items():
+        axes[plane == code] = plane_axes
+    rows = np.arange(len(arcs))[:, None]
+    u1, v1, w1 = start[rows, axes].T
+    u2, v2, w2 = end[rows, axes].T
+    i, j = offset[rows, axes[:, :2]].T
+    table, centers, valid = ArcTable.from_geometry(
+        settings.arc_type,
+        direction,
+        plane,
+        u1,
+        v1,
+        w1,
+        i,
+        j,
+        u2,
+        v2,
+        w2,
+        r,
+        position=position,
+        block=block,
+        move=move,
+        feed=feed,
+    )
+    blocks.cx[block[valid]] = centers[valid, 0]
+    blocks.cy[block[valid]] = centers[valid, 1]
+    blocks.cz[block[valid]] = centers[valid, 2]
+    buf.insert(table)
+
+
+def finish_blocks(program, settings):
+    """Fill per-block incremental distances and arc center masks."""
+    blocks = program.blocks
+    scale = 0.5 if settings.lathe_mode else 1
+    # incremental distances between consecutive blocks, lathe X as radius
+    blocks.x_incr = np.diff(blocks.x * scale, prepend=0.0)
+    blocks.y_incr = np.diff(blocks.y, prepend=0.0)
+    blocks.z_incr = np.diff(blocks.z, prepend=0.0)
+    has_center = np.zeros(len(blocks), np.bool_)
+    has_center[program.path.arcs.block] = True
+    for name in ("cx", "cy", "cz"):
+        blocks.present[name] = has_center
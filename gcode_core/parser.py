@@ -0,0 +1,457 @@
+"""Modal interpretation of G-code text into per-block program data."""
+
+from .modal import CheckpointIndex, ModalState
+from .program import BlockTable, Program, Settings, int_word, progress_step
+from .tokenizer import (
+    ADDRESS_ORDER,
+    CODE_LETTERS,
+    FLAG,
+    GROUP_OF_CODE,
+    KNOWN_ADDRESSES,
+    MODAL,
+    MODAL_GROUPS,
+    MOTION_GROUPS,
+    ONCE,
+    P_CYCLE_CODES,
+    Q_CYCLE_CODES,
+    block_delete_level,
+    code_number,
+    tokenize_line,
+)
+from .vectorized import resolve, scan_buffer
+
+# scan record fields: comment, known, block delete level, one code per
+# modal group, G28 home code, then the ADDRESS_ORDER words
+GROUP_FIELD = {name: 3 + k for k, name in enumerate(MODAL_GROUPS)}
+MOVE_FIELD = GROUP_FIELD["move"]
+CYCLE_FIELD = GROUP_FIELD["cycle"]
+HOME_FIELD = 3 + len(MODAL_GROUPS)
+# (group, kind, record field) of the groups interpreted from their kind
+GENERIC_GROUPS = tuple(
+    (name, kind, GROUP_FIELD[name])
+    for name, (_, _, kind) in MODAL_GROUPS.items()
+    if name not in MOTION_GROUPS
+)
+GENERIC_STATE_GROUPS = tuple(name for name, kind, _ in GENERIC_GROUPS if kind == MODAL)
+
+# block columns written by the interpreter; the rest are filled by expansion
+PARSED_COLUMNS = (
+    "move",
+    "plane",
+    "pos_mode",
+    "cycle",
+    "x",
+    "y",
+    "z",
+    "cycle_z",
+    "i",
+    "j",
+    "k",
+    "r",
+    "p",
+    "q",
+    "tool",
+    "speed",
+    "feed",
+    "wcs",
+    "home",
+    "cor_len",
+    "cor_h",
+    "cor_rad",
+    "cor_d",
+    "pgm_stop",
+    "spindle",
+    "tool_change",
+    "coolant",
+    "unknown",
+    "program_end",
+    "block_delete",
+)
+PARSED_COLUMNS += tuple(name for name in MODAL_GROUPS if name not in PARSED_COLUMNS)
+
+
+def parse_text(text, settings=None, progress=None, vectorized=False):
+    """Parse G-code text into a Program holding its block table."""
+    return parse_lines(text.upper().splitlines(True), settings, progress, vectorized)
+
+
+def parse_file(path, settings=None, progress=None, vectorized=False):
+    """Read and parse a G-code file from disk."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return parse_text(f.read(), settings, progress, vectorized)
+
+
+def new_columns():
+    """Return empty per-column lists and comment list for interpret()."""
+    return {name: [] for name in PARSED_COLUMNS}, []
+
+
+def parse_lines(lines, settings=None, progress=None, vectorized=False):
+    """Interpret uppercased source lines block by block.
+
+    ``progress`` is an optional callable receiving a 0-100 percentage.
+    With ``vectorized`` the lines are scanned as one buffer and resolved
+    with array operations (see gcode_core.vectorized) and ``progress`` is
+    not used.
+    """
+    if settings is None:
+        settings = Settings()
+    columns, comment = new_columns()
+    state = ModalState.initial(settings)
+    checkpoints = CheckpointIndex(settings.checkpoint_interval, state)
+    scanned = scan_buffer(lines) if vectorized else None
+    if scanned is not None:
+        program = Program(lines, resolve(scanned, state, settings))
+        checkpoints.extend_from(program.blocks)
+        program.checkpoints = checkpoints
+        return program
+    interpret(lines, state, settings, columns, comment, progress, checkpoints)
+    program = Program(lines, BlockTable.from_lists(columns, comment))
+    program.checkpoints = checkpoints
+    return program
+
+
+def state_at(program, settings, block):
+    """Return the modal state before ``block``.
+
+    Only the lines after the nearest checkpoint are replayed.
+    """
+    start, state = program.checkpoints.nearest(block)
+    columns, comment = new_columns()
+    interpret(program.lines[start:block], state, settings, columns, comment)
+    return state
+
+
+def scan_line(line):
+    """Classify the words of one uppercased line without any modal state.
+
+    Returns a tuple (comment, known, block delete level, <one code per
+    tokenizer.MODAL_GROUPS entry>, home, <one value per ADDRESS_ORDER
+    letter>) where absent codes and words are None and ``home`` is the G28
+    axis code (None without G28).
+    """
+    words = {}
+    groups = {}
+    comments = []
+    homeCol = None
+    known = False
+
+    tokens = tokenize_line(line)
+    for letter, value, col in tokens:
+        if letter == "(":
+            comments.append(value)
+            known = True
+        elif letter in CODE_LETTERS:
+            code = code_number(value)
+            if code == 28 and letter == "G":
+                homeCol = col
+            group = GROUP_OF_CODE.get((letter, code))
+            if group is None:
+                continue
+            known = True
+            groups[group] = code
+        elif letter in KNOWN_ADDRESSES:
+            words[letter] = value
+            known = True
+
+    homePos = None
+    if homeCol is not None:
+        # G28 only takes the axis words written after it on the line
+        cols = {letter: col for letter, _, col in tokens}
+        xHomeCoord = "X" in cols and cols["X"] > homeCol
+        yHomeCoord = "Y" in cols and cols["Y"] > homeCol
+        zHomeCoord = "Z" in cols and cols["Z"] > homeCol
+
+        if xHomeCoord:
+            # G28X0 - 1
+            homePos = 1
+            if yHomeCoord:
+                # G28X0Y0 - 4
+                homePos = 4
+                if zHomeCoord:
+                    # G28X0Y0Z0 - 7
+                    homePos = 7
+            elif zHomeCoord:
+                # G28X0Z0 - 5
+                homePos = 5
+        elif yHomeCoord:
+            # G28Y0 - 2
+            homePos = 2
+            if zHomeCoord:
+                # G28Y0Z0 - 6
+                homePos = 6
+        elif zHomeCoord:
+            # G28Z0 - 3
+            homePos = 3
+        else:
+            homePos = 0
+
+    return (
+        "".join(comments) if comments else None,
+        known,
+        block_delete_level(line),
+        *map(groups.get, MODAL_GROUPS),
+        homePos,
+        *map(words.get, ADDRESS_ORDER),
+    )
+
+
+def interpret(
+    lines, state, settings, columns, comment, progress=None, checkpoints=None, start=0
+):
+    """Append the block rows of ``lines`` to ``columns``/``comment``.
+
+    ``state`` is the modal state before the first line and is updated in
+    place to the state after the last one. ``start`` is the block index of
+    the first line; snapshots due are added to ``checkpoints`` if given.
+    """
+    return interpret_scanned(
+        map(scan_line, lines),
+        len(lines),
+        state,
+        settings,
+        columns,
+        comment,
+        progress,
+        checkpoints,
+        start,
+    )
+
+
+def interpret_scanned(
+    records,
+    count,
+    state,
+    settings,
+    columns,
+    comment,
+    progress=None,
+    checkpoints=None,
+    start=0,
+):
+    """Resolve modal state over ``count`` scan_line() records in order.
+
+    This is the sequential pass of interpret(); it carries G90/G91
+    positions, plane, canned cycle and the other sticky words from block to
+    block.
+    """
+    prevMove = state.move
+    prev_g81 = state.cycle
+    modal = {name: getattr(state, name) for name in GENERIC_STATE_GROUPS}
+    prevTool = state.tool
+    prevSpeed = state.speed
+    prevFeed = state.feed
+    prevCorD = state.cor_d
+    Z_cycle = state.cycle_z
+    prevQ = state.q
+    prevP = state.p
+    CoordX_abs = state.x
+    CoordY_abs = state.y
+    CoordZ_abs = state.z
+    prevCoordR = state.r
+
+    # the column list each generically interpreted group appends to
+    modalGroups = [
+        (name, field, columns[name])
+        for name, kind, field in GENERIC_GROUPS
+        if kind == MODAL
+    ]
+    onceGroups = [
+        (field, columns[name]) for name, kind, field in GENERIC_GROUPS if kind == ONCE
+    ]
+    flagGroups = [
+        (field, columns[name]) for name, kind, field in GENERIC_GROUPS if kind == FLAG
+    ]
+
+    every = progress_step(count)
+    for i, record in enumerate(records):
+
+        if progress and i % every == 0:
+            progress(int((i * 100) / count))
+
+        if checkpoints is not None and checkpoints.due(start + i):
+            checkpoints.add(
+                start + i,
+                ModalState(
+                    move=prevMove,
+                    cycle=prev_g81,
+                    x=CoordX_abs,
+                    y=CoordY_abs,
+                    z=CoordZ_abs,
+                    cycle_z=Z_cycle,
+                    r=prevCoordR,
+                    p=prevP,
+                    q=prevQ,
+                    tool=prevTool,
+                    speed=prevSpeed,
+                    feed=prevFeed,
+                    cor_d=prevCorD,
+                    **modal,
+                ),
+            )
+
+        text = record[0]
+        move = record[MOVE_FIELD]
+        g81 = record[CYCLE_FIELD]
+        homePos = record[HOME_FIELD]
+        (
+            coordX,
+            coordY,
+            coordZ,
+            coordI,
+            coordJ,
+            coordK,
+            coordR,
+            tool,
+            speed,
+            feed,
+            P_cycle,
+            Q_cycle,
+            corH,
+            corD,
+        ) = record[HOME_FIELD + 1 :]
+
+        comment.append(text)
+
+        if homePos:
+            columns["home"].append(homePos)
+        else:
+            homePos = 0
+            columns["home"].append(None)
+
+        columns["unknown"].append(not record[1])
+        columns["block_delete"].append(record[2])
+
+        for name, field, values in modalGroups:
+            code = record[field]
+            if code is not None:
+                modal[name] = code
+            values.append(modal[name])
+        for field, values in onceGroups:
+            values.append(record[field])
+        for field, values in flagGroups:
+            values.append(record[field] is not None)
+
+        if g81 is not None:
+            prev_g81 = g81
+            prevMove = 0
+        columns["cycle"].append(prev_g81)
+
+        if move is not None and prev_g81 == 80:
+            prevMove = move
+        columns["move"].append(prevMove)
+
+        absolute = modal["pos_mode"] == 90
+
+        if coordX is not None:
+            if absolute:
+                CoordX_abs = coordX
+            else:
+                if homePos == 0:
+                    CoordX_abs = CoordX_abs + coordX
+                elif homePos == 1 or homePos == 4 or homePos == 5 or homePos == 7:
+                    CoordX_abs = settings.x_pos_mach
+            columns["x"].append(CoordX_abs)
+        else:
+            columns["x"].append(CoordX_abs)
+
+        if coordY is not None:
+            if absolute:
+                CoordY_abs = coordY
+            else:
+                if homePos == 0:
+                    CoordY_abs = CoordY_abs + coordY
+                elif homePos == 2 or homePos == 4 or homePos > 5:
+                    CoordY_abs = settings.y_pos_mach
+            columns["y"].append(CoordY_abs)
+        else:
+            columns["y"].append(CoordY_abs)
+
+        if coordZ is not None:
+            if absolute:
+                if prev_g81 == 80:
+                    CoordZ_abs = coordZ
+                    Z_cycle = 0
+                else:
+                    Z_cycle = coordZ
+            else:
+                if prev_g81 == 80:
+                    CoordZ_abs = CoordZ_abs + coordZ
+                    Z_cycle = 0
+                else:
+                    Z_cycle = Z_cycle + coordZ
+
+                if homePos == 3 or homePos > 4:
+                    CoordZ_abs = settings.z_pos_mach
+
+            columns["z"].append(CoordZ_abs)
+            columns["cycle_z"].append(Z_cycle)
+        else:
+            if prev_g81 == 80:
+                Z_cycle = 0
+            columns["z"].append(CoordZ_abs)
+            columns["cycle_z"].append(Z_cycle)
+
+        columns["i"].append(coordI)
+
+        columns["j"].append(coordJ)
+
+        columns["k"].append(coordK)
+
+        if coordR is not None:
+            prevCoordR = coordR
+        else:
+            if prev_g81 == 80:
+                prevCoordR = None
+        columns["r"].append(prevCoordR)
+
+        if P_cycle is not None:
+            prevP = P_cycle
+        else:
+            if prev_g81 not in P_CYCLE_CODES:
+                prevP = None
+        columns["p"].append(prevP)
+
+        if Q_cycle is not None:
+            prevQ = Q_cycle
+        else:
+            if prev_g81 not in Q_CYCLE_CODES:
+                prevQ = None
+        columns["q"].append(prevQ)
+
+        if tool is not None:
+            prevTool = int_word("tool", tool)
+        columns["tool"].append(prevTool)
+
+        if speed is not None:
+            prevSpeed = int_word("speed", speed)
+        columns["speed"].append(prevSpeed)
+
+        if feed is not None:
+            prevFeed = feed
+        columns["feed"].append(prevFeed)
+
+        if corH is not None:
+            columns["cor_h"].append(int_word("cor_h", corH))
+        else:
+            columns["cor_h"].append(None)
+
+        if corD is not None:
+            prevCorD = int_word("cor_d", corD)
+        columns["cor_d"].append(prevCorD)
+
+    vars(state).update(modal)
+    state.move = prevMove
+    state.cycle = prev_g81
+    state.tool = prevTool
+    state.speed = prevSpeed
+    state.feed = prevFeed
+    state.cor_d = prevCorD
+    state.cycle_z = Z_cycle
+    state.q = prevQ
+    state.p = prevP
+    state.x = CoordX_abs
+    state.y = CoordY_abs
+    state.z = CoordZ_abs
+    state.r = prevCoordR
+    return state
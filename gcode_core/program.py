@@ -0,0 +1,412 @@
+"""Containers for interpreter settings and parsed program data.
+
+Blocks and points are stored column-wise in typed NumPy arrays. Words that
+may be missing from a block (I/J/K, WCS, M codes ...) keep a zero in their
+value array and a False entry in ``BlockTable.present`` instead of None.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .lod import LodPyramid
+from .spatial import SegmentTree
+from .tokenizer import FLAG, MODAL_GROUPS, ONCE
+
+
+@dataclass
+class Settings:
+    """Options that change how a program is interpreted and expanded."""
+
+    arc_type: int = 1
+    lathe_mode: bool = False
+    x_pos_mach: float = 0.0
+    y_pos_mach: float = 0.0
+    z_pos_mach: float = 0.0
+    rapid_feed: float = 10000
+    # largest chord deviation from an arc, 0 for a fixed 314 points per turn
+    arc_tolerance: float = 0.0
+    arc_min_segments: int = 2
+    arc_max_segments: int = 10000
+    # "/n" levels whose blocks are skipped by expansion, () for none
+    block_delete: tuple = tuple(range(1, 10))
+    # blocks between modal state checkpoints
+    checkpoint_interval: int = 1000
+
+
+# name -> dtype, one entry per source line
+BLOCK_COLUMNS = {
+    "move": np.int8,
+    "plane": np.int8,
+    "pos_mode": np.int8,
+    "cycle": np.int8,
+    "x": np.float64,
+    "y": np.float64,
+    "z": np.float64,
+    "cycle_z": np.float64,
+    "i": np.float64,
+    "j": np.float64,
+    "k": np.float64,
+    "r": np.float64,
+    "p": np.float64,
+    "q": np.float64,
+    "tool": np.int32,
+    "speed": np.int32,
+    "feed": np.float64,
+    "wcs": np.int8,
+    "home": np.int8,
+    "cor_len": np.int8,
+    "cor_h": np.int32,
+    "cor_rad": np.int8,
+    "cor_d": np.int32,
+    "pgm_stop": np.int8,
+    "spindle": np.int8,
+    "tool_change": np.int8,
+    "coolant": np.int8,
+    "unknown": np.bool_,
+    # M30/M2 in the block; expansion stops at the first one
+    "program_end": np.bool_,
+    # "/n" block delete level, 0 for blocks without "/"
+    "block_delete": np.int8,
+    # filled by motion.expand
+    "x_incr": np.float64,
+    "y_incr": np.float64,
+    "z_incr": np.float64,
+    "cx": np.float64,
+    "cy": np.float64,
+    "cz": np.float64,
+}
+# a modal group listed only in tokenizer.MODAL_GROUPS gets a column too
+BLOCK_COLUMNS.update(
+    {
+        name: np.bool_ if kind == FLAG else np.int16
+        for name, (_, _, kind) in MODAL_GROUPS.items()
+        if name not in BLOCK_COLUMNS
+    }
+)
+
+
+def int_word(name, value):
+    """Truncate a word value to an integer clamped to the range of the
+    integer column ``name``; ``value`` may be a float or a float array."""
+    info = np.iinfo(BLOCK_COLUMNS[name])
+    if isinstance(value, np.ndarray):
+        return np.clip(np.trunc(value), info.min, info.max)
+    return int(min(max(value, info.min), info.max))
+
+
+# columns whose word may be absent from a block
+OPTIONAL_COLUMNS = (
+    "i",
+    "j",
+    "k",
+    "r",
+    "p",
+    "q",
+    "wcs",
+    "home",
+    "cor_len",
+    "cor_h",
+    "pgm_stop",
+    "spindle",
+    "tool_change",
+    "coolant",
+    "cx",
+    "cy",
+    "cz",
+)
+OPTIONAL_COLUMNS += tuple(
+    name
+    for name, (_, _, kind) in MODAL_GROUPS.items()
+    if kind == ONCE and name not in OPTIONAL_COLUMNS
+)
+
+# progress callbacks fire about this many times per pass
+PROGRESS_STEPS = 100
+
+
+def progress_step(count):
+    """Return the loop stride between progress callbacks for ``count`` items."""
+    return max(count // PROGRESS_STEPS, 1)
+
+
+# point move types
+RAPID = 0
+LINEAR = 1
+ARC_CW = 2
+ARC_CCW = 3
+
+
+class BlockTable:
+    """Per-block modal state and words stored as typed column arrays."""
+
+    def __init__(self, n=0):
+        """Allocate zeroed columns and empty presence masks for n blocks."""
+        for name, dtype in BLOCK_COLUMNS.items():
+            setattr(self, name, np.zeros(n, dtype))
+        self.present = {name: np.zeros(n, np.bool_) for name in OPTIONAL_COLUMNS}
+        self.comment = [None] * n
+
+    def __len__(self):
+        """Return the number of blocks."""
+        return len(self.move)
+
+    @classmethod
+    def from_lists(cls, columns, comment):
+        """Build a table from per-column lists where None marks an absent word."""
+        table = cls(len(comment))
+        for name, values in columns.items():
+            if name in table.present:
+                mask = np.fromiter((v is not None for v in values), np.bool_)
+                values = [0 if v is None else v for v in values]
+                table.present[name] = mask
+            setattr(table, name, np.asarray(values, BLOCK_COLUMNS[name]))
+        table.comment = comment
+        return table
+
+    def column(self, name):
+        """Return a column as a Python list with None for absent words."""
+        values = getattr(self, name).tolist()
+        if name not in self.present:
+            return values
+        return [v if p else None for v, p in zip(values, self.present[name].tolist())]
+
+    def rows(self, start, stop):
+        """Return rows [start, stop) as a table of column views."""
+        table = BlockTable()
+        for name in BLOCK_COLUMNS:
+            setattr(table, name, getattr(self, name)[start:stop])
+        for name, mask in self.present.items():
+            table.present[name] = mask[start:stop]
+        table.comment = self.comment[start:stop]
+        return table
+
+    def splice(self, start, stop, other):
+        """Return a copy with rows [start, stop) replaced by ``other``'s rows."""
+        table = BlockTable()
+        for name in BLOCK_COLUMNS:
+            old = getattr(self, name)
+            setattr(
+                table,
+                name,
+                np.concatenate((old[:start], getattr(other, name), old[stop:])),
+            )
+        for name, mask in self.present.items():
+            table.present[name] = np.concatenate(
+                (mask[:start], other.present[name], mask[stop:])
+            )
+        table.comment = self.comment[:start] + other.comment + self.comment[stop:]
+        return table
+
+
+class PointTable:
+    """Expanded toolpath points: xyz position, feed, block index and move type."""
+
+    def __init__(self, pos=None, feed=None, block=None, move=None):
+        """Wrap point columns; ``pos`` is an (n, 3) float64 array."""
+        self.pos = np.zeros((0, 3)) if pos is None else pos
+        self.feed = np.zeros(0) if feed is None else feed
+        self.block = np.zeros(0, np.int32) if block is None else block
+        self.move = np.zeros(0, np.int8) if move is None else move
+
+    def __len__(self):
+        """Return the number of points."""
+        return len(self.pos)
+
+    @property
+    def x(self):
+        """X column as a view into pos."""
+        return self.pos[:, 0]
+
+    @property
+    def y(self):
+        """Y column as a view into pos."""
+        return self.pos[:, 1]
+
+    @property
+    def z(self):
+        """Z column as a view into pos."""
+        return self.pos[:, 2]
+
+    def take(self, index):
+        """Return the points picked by an index array or slice."""
+        return PointTable(
+            self.pos[index], self.feed[index], self.block[index], self.move[index]
+        )
+
+    def select(self, start, stop):
+        """Return the points of blocks [start, stop) as views."""
+        lo, hi = np.searchsorted(self.block, (start, stop))
+        return PointTable(
+            self.pos[lo:hi], self.feed[lo:hi], self.block[lo:hi], self.move[lo:hi]
+        )
+
+    @classmethod
+    def concat(cls, tables):
+        """Join point tables end to end."""
+        return cls(
+            np.concatenate([t.pos for t in tables]),
+            np.concatenate([t.feed for t in tables]),
+            np.concatenate([t.block for t in tables]),
+            np.concatenate([t.move for t in tables]),
+        )
+
+    @classmethod
+    def from_lists(cls, x, y, z, feed, block, move):
+        """Build a table from plain Python lists."""
+        pos = np.empty((len(x), 3))
+        pos[:, 0] = x
+        pos[:, 1] = y
+        pos[:, 2] = z
+        return cls(
+            pos,
+            np.asarray(feed, np.float64),
+            np.asarray(block, np.int32),
+            np.asarray(move, np.int8),
+        )
+
+
+class PointIndex:
+    """Prefix offsets between block numbers and the points they expand to.
+
+    Point blocks never decrease, so the points of block b are the range
+    ``offsets[b]:offsets[b + 1]``; lookups are O(1) after one searchsorted.
+    """
+
+    def __init__(self, block, n_blocks=0):
+        """Index the point block column ``block`` of a program with
+        ``n_blocks`` blocks (more if the points name later blocks)."""
+        self.block = block
+        if len(block):
+            n_blocks = max(n_blocks, int(block[-1]) + 1)
+        self.offsets = np.searchsorted(block, np.arange(n_blocks + 1))
+
+    def points_of(self, num):
+        """Return the point range [first, last) of block ``num``."""
+        if not 0 <= num < len(self.offsets) - 1:
+            return 0, 0
+        return int(self.offsets[num]), int(self.offsets[num + 1])
+
+    def last_point(self, num):
+        """Return the index of the last point of block ``num``, or None."""
+        first, last = self.points_of(num)
+        return last - 1 if last > first else None
+
+    def block_of(self, point):
+        """Return the block number point ``point`` belongs to."""
+        return int(self.block[point])
+
+
+class LayerIndex:
+    """Toolpath segments grouped by tool and move type.
+
+    Segment i runs from point i - 1 to point i and belongs to the end point's
+    tool and move; both arc directions are one ARC_CW layer. The grouping is
+    a single stable argsort, so each layer lists its segments in path order.
+    """
+
+    def __init__(self, move, tool):
+        """Group the segments of points with ``move`` types and ``tool`` numbers."""
+        kind = np.minimum(move[1:], ARC_CW).astype(np.int64)
+        key = tool[1:].astype(np.int64) * (ARC_CW + 1) + kind
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        starts = np.flatnonzero(np.diff(key)) + 1
+        # point index each segment ends at, per layer
+        self.ends = np.split(order + 1, starts)
+        if not len(key):
+            self.ends = []
+        first = key[np.r_[0, starts]] if len(key) else key
+        self.keys = [divmod(int(k), ARC_CW + 1) for k in first]
+
+    def __len__(self):
+        """Return the number of layers."""
+        return len(self.keys)
+
+    def tools(self):
+        """Return the tool numbers that have segments, ascending."""
+        return sorted({tool for tool, _ in self.keys})
+
+    def drawn(self, layer, count):
+        """Return how many segments of ``layer`` end before point ``count``."""
+        return int(np.searchsorted(self.ends[layer], count))
+
+
+def point_tools(program):
+    """Return the active tool number of every point."""
+    points = program.points
+    tools = program.blocks.tool
+    if not len(tools):
+        return np.zeros(len(points), np.int32)
+    return tools[np.minimum(points.block, len(tools) - 1)]
+
+
+class Program:
+    """Parsed blocks and expanded toolpath points of one G-code program."""
+
+    def __init__(self, lines=None, blocks=None):
+        """Hold the source lines with their block table and (empty) points."""
+        self.lines = lines if lines is not None else []
+        self.blocks = blocks if blocks is not None else BlockTable()
+        # toolpath.Toolpath, set by motion.expand
+        self.path = None
+        self._points = None
+        self._index = None
+        self._layers = None
+        self._lod = None
+        self._tree = None
+        # modal.CheckpointIndex, set by the parser
+        self.checkpoints = None
+        # first block not expanded (program end), set by motion.expand
+        self.end_block = len(self.blocks)
+
+    @property
+    def points(self):
+        """Toolpath points, tessellated from ``path`` on first access."""
+        if self._points is None:
+            self._points = self.path.tessellate() if self.path else PointTable()
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self._index = None
+        self._layers = None
+        self._lod = None
+        self._tree = None
+
+    @property
+    def point_index(self):
+        """PointIndex of ``points``, built on first access."""
+        if self._index is None:
+            self._index = PointIndex(self.points.block, len(self.blocks))
+        return self._index
+
+    @property
+    def layers(self):
+        """LayerIndex of ``points`` by tool and move type, built on first access."""
+        if self._layers is None:
+            self._layers = LayerIndex(self.points.move, point_tools(self))
+        return self._layers
+
+    @property
+    def lod(self):
+        """LodPyramid of ``points``, built on first access."""
+        if self._lod is None:
+            self._lod = LodPyramid.build(self.points.pos, self.points.move)
+        return self._lod
+
+    @lod.setter
+    def lod(self, lod):
+        self._lod = lod
+
+    @property
+    def segment_tree(self):
+        """SegmentTree over ``points``, built on first access."""
+        if self._tree is None:
+            self._tree = SegmentTree(self.points.pos)
+        return self._tree
+
+    @segment_tree.setter
+    def segment_tree(self, tree):
+        self._tree = tree
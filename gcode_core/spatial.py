@@ -0,0 +1,211 @@
+"""Bounding volume hierarchy over the segments of a toolpath point strip.
+
+Segment i runs from point i - 1 to point i. The segments are sorted along a
+Morton curve of their centers and grouped BRANCH at a time into boxes, level
+by level, so the tree is built with NumPy only. Queries walk the tree and
+test the up to BRANCH children of a box at once.
+"""
+
+import heapq
+
+import numpy as np
+
+# children per box, segments per leaf box
+BRANCH = 8
+# bits per axis of the Morton codes
+MORTON_BITS = 21
+
+
+def spread_bits(values):
+    """Spread the low 21 bits of ``values`` to every third bit."""
+    v = values.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in (
+        (32, 0x1F00000000FFFF),
+        (16, 0x1F0000FF0000FF),
+        (8, 0x100F00F00F00F00F),
+        (4, 0x10C30C30C30C30C3),
+        (2, 0x1249249249249249),
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton_codes(points):
+    """Return Morton codes of (n, 3) points scaled into their bounding box."""
+    lo = points.min(axis=0)
+    size = points.max(axis=0) - lo
+    size[size == 0] = 1.0
+    scale = (1 << MORTON_BITS) - 1
+    cells = ((points - lo) / size * scale).astype(np.int64)
+    return (
+        spread_bits(cells[:, 0])
+        | (spread_bits(cells[:, 1]) << np.uint64(1))
+        | (spread_bits(cells[:, 2]) << np.uint64(2))
+    )
+
+
+def ray_boxes(origin, direction, lo, hi):
+    """Return where the ray enters each box, inf for boxes it misses."""
+    direction = np.where(direction == 0, 1e-300, direction)
+    t1 = (lo - origin) / direction
+    t2 = (hi - origin) / direction
+    near = np.maximum(np.minimum(t1, t2).max(axis=1), 0.0)
+    far = np.maximum(t1, t2).min(axis=1)
+    return np.where(near <= far, near, np.inf)
+
+
+def point_boxes(point, lo, hi):
+    """Return the distance from ``point`` to each box."""
+    gap = np.maximum(np.maximum(lo - point, point - hi), 0.0)
+    return np.sqrt((gap**2).sum(axis=1))
+
+
+def ray_segments(origin, direction, a, b):
+    """Return (distance, ray parameter, segment parameter) of the closest
+    points between a ray with unit ``direction`` and segments a-b."""
+    u = b - a
+    w = a - origin
+    uu = (u * u).sum(axis=1)
+    ud = u @ direction
+    uw = (u * w).sum(axis=1)
+    dw = w @ direction
+    denom = uu - ud * ud
+    s = np.zeros(len(a))
+    ok = denom > 1e-12 * np.maximum(uu, 1e-300)
+    s[ok] = (ud[ok] * dw[ok] - uw[ok]) / denom[ok]
+    s = np.clip(s, 0.0, 1.0)
+    t = np.maximum(ud * s + dw, 0.0)
+    moving = uu > 0
+    s[moving] = np.clip((t[moving] * ud[moving] - uw[moving]) / uu[moving], 0.0, 1.0)
+    t = np.maximum(ud * s + dw, 0.0)
+    gap = a + u * s[:, None] - (origin + direction * t[:, None])
+    return np.sqrt((gap**2).sum(axis=1)), t, s
+
+
+def point_segments(point, a, b):
+    """Return (distance, segment parameter) from ``point`` to segments a-b."""
+    u = b - a
+    uu = (u * u).sum(axis=1)
+    s = np.zeros(len(a))
+    moving = uu > 0
+    s[moving] = ((point - a[moving]) * u[moving]).sum(axis=1) / uu[moving]
+    s = np.clip(s, 0.0, 1.0)
+    gap = a + u * s[:, None] - point
+    return np.sqrt((gap**2).sum(axis=1)), s
+
+
+class SegmentTree:
+    """Box hierarchy over the segments of the point strip ``pos``.
+
+    ``boxes[0]`` are the leaf boxes of BRANCH consecutive segments of
+    ``order``; box k of level l holds boxes k * BRANCH ... of level l - 1.
+    """
+
+    def __init__(self, pos):
+        """Sort the segments of ``pos`` and box them level by level."""
+        self.pos = np.asarray(pos, np.float64)
+        a = self.pos[:-1]
+        b = self.pos[1:]
+        lo = np.minimum(a, b)
+        hi = np.maximum(a, b)
+        self.boxes = []
+        if not len(lo):
+            self.order = np.zeros(0, np.int64)
+            return
+        # segment numbers are their end points
+        self.order = np.argsort(morton_codes((lo + hi) / 2), kind="stable") + 1
+        lo = lo[self.order - 1]
+        hi = hi[self.order - 1]
+        while True:
+            starts = np.arange(0, len(lo), BRANCH)
+            lo = np.minimum.reduceat(lo, starts)
+            hi = np.maximum.reduceat(hi, starts)
+            self.boxes.append((lo, hi))
+            if len(lo) == 1:
+                break
+
+    def __len__(self):
+        """Return the number of segments."""
+        return len(self.order)
+
+    def children(self, level, box):
+        """Return the child range [first, stop) of a box."""
+        first = box * BRANCH
+        size = len(self.order) if level == 0 else len(self.boxes[level - 1][0])
+        return first, min(first + BRANCH, size)
+
+    def ray(self, origin, direction, radius, accept=None):
+        """Return (segment, ray parameter, segment parameter) of the first
+        segment along a ray that passes within ``radius`` of it, or None.
+
+        ``accept`` maps an array of segment numbers to a mask of those that
+        may be picked.
+        """
+        if not self.boxes:
+            return None
+        origin = np.asarray(origin, np.float64)
+        direction = np.asarray(direction, np.float64)
+        direction = direction / np.sqrt((direction**2).sum())
+        best = None
+        top = len(self.boxes) - 1
+        stack = [(0.0, top, 0)]
+        while stack:
+            near, level, box = stack.pop()
+            if best is not None and near > best[1] + radius:
+                continue
+            first, stop = self.children(level, box)
+            if level == 0:
+                segments = self.order[first:stop]
+                if accept is not None:
+                    segments = segments[accept(segments)]
+                if not len(segments):
+                    continue
+                dist, t, s = ray_segments(
+                    origin, direction, self.pos[segments - 1], self.pos[segments]
+                )
+                hit = dist <= radius
+                if hit.any():
+                    k = np.flatnonzero(hit)[np.argmin(t[hit])]
+                    if best is None or t[k] < best[1]:
+                        best = (int(segments[k]), float(t[k]), float(s[k]))
+                continue
+            lo, hi = self.boxes[level - 1]
+            enter = ray_boxes(
+                origin, direction, lo[first:stop] - radius, hi[first:stop] + radius
+            )
+            # push the farthest first so the nearest box is walked first
+            for k in np.argsort(-enter):
+                if np.isfinite(enter[k]):
+                    stack.append((float(enter[k]), level - 1, first + int(k)))
+        return best
+
+    def nearest(self, point, accept=None):
+        """Return (segment, distance, segment parameter) of the segment
+        closest to ``point``, or None."""
+        if not self.boxes:
+            return None
+        point = np.asarray(point, np.float64)
+        best = None
+        top = len(self.boxes) - 1
+        lo, hi = self.boxes[top]
+        heap = [(float(point_boxes(point, lo, hi)[0]), top, 0)]
+        while heap:
+            dist, level, box = heapq.heappop(heap)
+            if best is not None and dist >= best[1]:
+                break
+            first, stop = self.children(level, box)
+            if level == 0:
+                segments = self.order[first:stop]
+                if accept is not None:
+                    segments = segments[accept(segments)]
+                if not len(segments):
+                    continue
+                d, s = point_segments(point, self.pos[segments - 1], self.pos[segments])
+                k = int(np.argmin(d))
+                if best is None or d[k] < best[1]:
+                    best = (int(segments[k]), float(d[k]), float(s[k]))
+                continue
+            lo, hi = self.boxes[level - 1]
+            for k, d in enumerate(point_boxes(point, lo[first:stop], hi[first:stop])):
+                heapq.heappush(heap, (float(d), level - 1, first + k))
+        return best
@@ -0,0 +1,180 @@
+"""Toolpath length, machining time and extents of an expanded program."""
+
+from math import floor
+
+import numpy as np
+
+
+def has_motion(program):
+    """Return True if the parsed blocks move the tool at all."""
+    blocks = program.blocks
+    if len(blocks) < 2:
+        return False
+    return bool(
+        np.any(np.diff(blocks.x) != 0)
+        or np.any(np.diff(blocks.y) != 0)
+        or np.any(np.diff(blocks.z) != 0)
+    )
+
+
+def path_moves(path, start=None):
+    """Return (lengths, feeds, blocks) of every move of a toolpath.
+
+    Straight moves are measured from the previous move's end and arcs by
+    their helical length sqrt((r sweep)^2 + rise^2), plus any gap to their
+    programmed start and end points, so nothing is tessellated. ``start`` is
+    the XYZ point before the first move; without it the first move starts
+    where the first vertex is.
+    """
+    vertices = path.vertices
+    arcs = path.arcs
+    n = len(vertices) + len(arcs)
+    if n == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0, np.int64)
+    # arcs go before the vertex at their position
+    arc_index = arcs.position + np.arange(len(arcs))
+    is_arc = np.zeros(n, np.bool_)
+    is_arc[arc_index] = True
+    ends = np.empty((n, 3))
+    ends[~is_arc] = vertices.pos
+    ends[arc_index] = arcs.end_points()
+    prev = np.empty((n, 3))
+    prev[1:] = ends[:-1]
+    if start is not None:
+        prev[:1] = start
+    elif len(vertices):
+        prev[:1] = vertices.pos[0]
+    else:
+        prev[:1] = arcs.points_at(0.0)[0]
+
+    lengths = np.sqrt(((ends - prev) ** 2).sum(axis=1))
+    lengths[arc_index] = (
+        np.sqrt(((arcs.points_at(0.0) - prev[arc_index]) ** 2).sum(axis=1))
+        + arcs.lengths()
+        + np.sqrt(((ends[arc_index] - arcs.points_at(1.0)) ** 2).sum(axis=1))
+    )
+    feeds = np.empty(n)
+    feeds[~is_arc] = vertices.feed
+    feeds[arc_index] = arcs.feed
+    blocks = np.empty(n, np.int64)
+    blocks[~is_arc] = vertices.block
+    blocks[arc_index] = arcs.block
+    return lengths, feeds, blocks
+
+
+def move_times(lengths, feeds):
+    """Return move times in minutes; moves without a feed take none."""
+    times = np.zeros_like(lengths)
+    np.divide(lengths, feeds, out=times, where=feeds > 0)
+    return times
+
+
+def calc_time(program):
+    """Return per-block path lengths and times, computed from the toolpath
+    primitives without tessellating arcs."""
+    lengths, feeds, blocks = path_moves(program.path)
+    n = len(program.blocks)
+    return (
+        np.bincount(blocks, lengths, n),
+        np.bincount(blocks, move_times(lengths, feeds), n),
+    )
+
+
+def toolpath_summary(program, co="(", ci=")"):
+    """Return formatted toolpath length and estimated machining time."""
+    if program.path is None or not len(program.path):
+        return ""
+    lst_toolpath, lst_toolpathTime = calc_time(program)
+    return format_summary(
+        float(lst_toolpath.sum()), float(lst_toolpathTime.sum()), co, ci
+    )
+
+
+def format_summary(length, time_min, co="(", ci=")"):
+    """Format a toolpath length and a machining time in minutes."""
+    time_min = round(time_min, 2)
+    time_hours = time_min / 60
+    time_sec = time_min * 60
+    hours_part = floor(time_hours)
+    minutes_part = floor(time_min % 60)
+    seconds_part = floor(time_sec % 60)
+    res = (
+        co
+        + "Toolpath Length: {:.3f}".format(length)
+        + ci
+        + "\n"
+        + co
+        + "Machining Time: {h:02}:{m:02}:{s:02}".format(
+            h=hours_part, m=minutes_part, s=seconds_part
+        )
+        + ci
+        + "\n"
+    )
+    return res
+
+
+def toolpath_limits(program, lathe_mode=False, co="(", ci=")"):
+    """Return formatted min/max extents of the generated toolpath."""
+    if not len(program.points):
+        return ""
+
+    lo = program.points.pos.min(axis=0).tolist()
+    hi = program.points.pos.max(axis=0).tolist()
+    return format_limits(lo, hi, lathe_mode, co, ci)
+
+
+def format_limits(lo, hi, lathe_mode=False, co="(", ci=")"):
+    """Format min/max XYZ extents given as two sequences."""
+    # lathe X is stored as a radius, report it as a diameter
+    x_scale = 2 if lathe_mode else 1
+    xmin = co + "X MIN: {}".format(round(lo[0] * x_scale, 3)) + ci + "\n"
+    xmax = co + "X MAX: {}".format(round(hi[0] * x_scale, 3)) + ci + "\n"
+    ymin = co + "Y MIN: {}".format(round(lo[1], 3)) + ci + "\n"
+    zmin = co + "Z MIN: {}".format(round(lo[2], 3)) + ci + "\n"
+    ymax = co + "Y MAX: {}".format(round(hi[1], 3)) + ci + "\n"
+    zmax = co + "Z MAX: {}".format(round(hi[2], 3)) + ci
+    res = xmin + ymin + zmin + xmax + ymax + zmax
+    return res
+
+
+class ToolpathStats:
+    """Length, time and extents accumulated over consecutive toolpath batches."""
+
+    def __init__(self):
+        """Start with no points."""
+        self.length = 0.0
+        self.time = 0.0
+        self.lo = None
+        self.hi = None
+        self.last = None
+
+    def add(self, path, points=None):
+        """Add the next batch's toolpath; moves join up with the last batch.
+
+        Lengths and times come from the primitives, the extents from
+        ``points``, which default to the tessellated path.
+        """
+        if not len(path):
+            return
+        if points is None:
+            points = path.tessellate()
+        lengths, feeds, _ = path_moves(path, self.last)
+        self.length += float(lengths.sum())
+        self.time += float(move_times(lengths, feeds).sum())
+        lo = points.pos.min(axis=0)
+        hi = points.pos.max(axis=0)
+        self.lo = lo if self.lo is None else np.minimum(self.lo, lo)
+        self.hi = hi if self.hi is None else np.maximum(self.hi, hi)
+        self.last = path.last_point().copy()
+
+    def summary(self, co="(", ci=")"):
+        """Return formatted toolpath length and estimated machining time."""
+        if self.last is None:
+            return ""
+        return format_summary(self.length, self.time, co, ci)
+
+    def limits(self, lathe_mode=False, co="(", ci=")"):
+        """Return formatted min/max extents of the toolpath."""
+        if self.last is None:
+            return ""
+        return format_limits(self.lo.tolist(), self.hi.tolist(), lathe_mode, co, ci)
@@ -0,0 +1,199 @@
+"""Bounded-memory parsing of G-code files too large to load as text.
+
+The file is memory-mapped and never decoded as a whole. A LineIndex of line
+start offsets fetches single lines on demand, and StreamParser interprets
+and expands fixed-size batches of lines, carrying the modal state from one
+batch to the next.
+"""
+
+import mmap
+import os
+
+import numpy as np
+
+from .modal import CheckpointIndex, ModalState
+from .motion import PointBuffer, expand_blocks, finish_blocks
+from .parser import interpret, new_columns
+from .program import BlockTable, Program, Settings
+
+DEFAULT_BATCH_LINES = 50000
+# bytes searched for line ends per step while indexing
+INDEX_CHUNK = 1 << 24
+# the line ends of str.splitlines(): "\n", "\v", "\f", "\r", "\x1c"-"\x1e"
+# and, UTF-8 encoded, U+0085, U+2028 and U+2029; "\r\n" is one line end
+LINE_END_BYTES = (10, 11, 12, 13, 28, 29, 30)
+
+
+def line_ends(window):
+    """Return a mask of the bytes that end a line in ``window[2:-1]``.
+
+    The two bytes before and the byte after only give context.
+    """
+    b2, b1, byte, after = window[:-3], window[1:-2], window[2:-1], window[3:]
+    ends = np.isin(byte, LINE_END_BYTES)
+    ends &= ~((byte == 13) & (after == 10))
+    ends |= (b1 == 0xC2) & (byte == 0x85)
+    ends |= (b2 == 0xE2) & (b1 == 0x80) & ((byte == 0xA8) | (byte == 0xA9))
+    return ends
+
+
+def split_lines(text):
+    """Split text keeping line ends, on the same ends as parse_text()."""
+    return text.splitlines(True)
+
+
+class LineIndex:
+    """Byte offsets of the line starts in a bytes-like buffer."""
+
+    def __init__(self, buffer, starts):
+        """Wrap a buffer and its line starts plus the end offset."""
+        self.buffer = buffer
+        self.starts = starts
+
+    @classmethod
+    def from_buffer(cls, buffer, chunk=INDEX_CHUNK):
+        """Find every line end of the buffer, ``chunk`` bytes at a time."""
+        size = len(buffer)
+        parts = [np.zeros(1, np.int64)]
+        for pos in range(0, size, chunk):
+            lead = min(pos, 2)
+            view = np.frombuffer(
+                buffer,
+                np.uint8,
+                count=min(chunk + 1, size - pos) + lead,
+                offset=pos - lead,
+            )
+            window = np.zeros(min(chunk, size - pos) + 3, np.uint8)
+            window[2 - lead : 2 - lead + len(view)] = view
+            del view
+            ends = np.flatnonzero(line_ends(window))
+            parts.append(ends.astype(np.int64) + (pos + 1))
+        starts = np.concatenate(parts)
+        if starts[-1] != size:
+            # last line without a line end
+            starts = np.append(starts, size)
+        return cls(buffer, starts)
+
+    def __len__(self):
+        """Return the number of lines."""
+        return len(self.starts) - 1
+
+    def text(self, start, stop):
+        """Return lines [start, stop) decoded as one string."""
+        data = self.buffer[self.starts[start] : self.starts[stop]]
+        return bytes(data).decode("utf-8", "replace")
+
+    def line(self, n):
+        """Return line n with its line end."""
+        return self.text(n, n + 1)
+
+    def offset(self, n):
+        """Return the byte offset where line n starts."""
+        return int(self.starts[n])
+
+
+class StreamBatch:
+    """Blocks of one batch of lines with their expanded toolpath.
+
+    Block indices of the path and points count from the start of the file.
+    """
+
+    def __init__(self, start, blocks, path, end):
+        """Hold a batch starting at block ``start``; ``end`` marks M30/M2."""
+        self.start = start
+        self.blocks = blocks
+        self.path = path
+        self.end = end
+        self._points = None
+
+    @property
+    def points(self):
+        """The batch's toolpath points, tessellated on first access."""
+        if self._points is None:
+            self._points = self.path.tessellate()
+        return self._points
+
+
+class StreamParser:
+    """Parse and expand a memory-mapped G-code file batch by batch.
+
+    Only one batch of blocks and points is alive at a time, so memory stays
+    bounded by ``batch_lines`` plus the line index.
+    """
+
+    def __init__(self, path, settings=None, batch_lines=DEFAULT_BATCH_LINES):
+        """Map ``path`` read-only and index its lines."""
+        self.settings = settings if settings is not None else Settings()
+        self.batch_lines = max(int(batch_lines), 1)
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buffer = b""
+        self.index = LineIndex.from_buffer(self.buffer)
+        self.checkpoints = None
+        # first block not expanded, known once batches() is exhausted
+        self.end_block = None
+
+    def __len__(self):
+        """Return the number of lines in the file."""
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Unmap and close the file."""
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._file.close()
+
+    def line(self, n):
+        """Return source line n as written in the file."""
+        return self.index.line(n)
+
+    def batches(self, progress=None):
+        """Yield StreamBatch objects until the file or the program ends."""
+        settings = self.settings
+        state = ModalState.initial(settings)
+        self.checkpoints = CheckpointIndex(settings.checkpoint_interval, state)
+        n = len(self)
+        prev_line = prev_row = None
+        for start in range(0, n, self.batch_lines):
+            stop = min(start + self.batch_lines, n)
+            if progress:
+                progress(int((start * 100) / n))
+            lines = split_lines(self.index.text(start, stop).upper())
+            columns, comment = new_columns()
+            interpret(
+                lines, state, settings, columns, comment, None, self.checkpoints, start
+            )
+            blocks = BlockTable.from_lists(columns, comment)
+            # the last block of the previous batch starts the first move
+            first = 0
+            if prev_row is not None:
+                lines = [prev_line] + lines
+                blocks = prev_row.splice(1, 1, blocks)
+                first = 1
+            program = Program(lines, blocks)
+            buf = PointBuffer()
+            end = expand_blocks(program, settings, first, len(blocks), buf)
+            program.path = buf.toolpath(settings)
+            finish_blocks(program, settings)
+
+            ended = end < len(blocks)
+            yield StreamBatch(
+                start,
+                blocks.rows(first, len(blocks)),
+                program.path.shifted(start - first),
+                ended,
+            )
+            if ended:
+                self.end_block = start + end - first
+                return
+            prev_line = lines[-1]
+            prev_row = blocks.rows(len(blocks) - 1, len(blocks))
+        self.end_block = n
@@ -0,0 +1,113 @@
+"""Single-pass word tokenizer for G-code lines."""
+
+import re
+
+# One pass per line: a parenthesised comment or an address letter followed by a number.
+WORD_RE = re.compile(
+    r"\((?P<comment>[^)]*)\)|(?P<letter>[A-Z])(?P<value>[-+]?(?:\d+\.?\d*|\.\d+))"
+)
+
+MOVE_CODES = (0, 1, 2, 3)
+POS_MODE_CODES = (90, 91)
+ARC_PLANE_CODES = (17, 18, 19)
+WCS_CODES = (54, 55, 56, 57, 58, 59)
+# canned cycles; G80 cancels them
+DRILL_CYCLE_CODES = (73, 76, 81, 82, 83, 84, 85, 86, 87, 88, 89)
+CYCLE_CODES = (80,) + DRILL_CYCLE_CODES
+# cycles that keep P (dwell) and Q (peck depth or shift) from hole to hole
+P_CYCLE_CODES = (76, 82, 83, 84, 88, 89)
+Q_CYCLE_CODES = (73, 76, 83, 87)
+COR_RAD_CODES = (40, 41, 42)
+COR_LEN_CODES = (43,)
+TOOL_CHANGE_CODES = (6,)
+STOP_CODES = (0, 1)
+SPINDLE_CODES = (3, 4, 5)
+COOLANT_CODES = (7, 8, 9)
+PROGRAM_END_CODES = (2, 30)
+
+# How a group's code reaches its block column:
+# MODAL codes stay in effect, held in the ModalState field of the group's
+# name, until another code of the group; ONCE codes are set in their own
+# block only and absent elsewhere; a FLAG column is True where the group
+# has a code.
+MODAL = "modal"
+ONCE = "once"
+FLAG = "flag"
+
+# RS274 modal groups the interpreter reads: block column -> (letter, codes,
+# kind). A line keeps the last code of each group; the order is the order
+# of the group fields in a scan record. Both interpreters apply the kinds
+# generically, so a new code or group is one change to this table.
+MODAL_GROUPS = {
+    "move": ("G", MOVE_CODES, MODAL),
+    "pos_mode": ("G", POS_MODE_CODES, MODAL),
+    "plane": ("G", ARC_PLANE_CODES, MODAL),
+    "wcs": ("G", WCS_CODES, ONCE),
+    "cycle": ("G", CYCLE_CODES, MODAL),
+    "cor_len": ("G", COR_LEN_CODES, ONCE),
+    "cor_rad": ("G", COR_RAD_CODES, MODAL),
+    "tool_change": ("M", TOOL_CHANGE_CODES, ONCE),
+    "pgm_stop": ("M", STOP_CODES, ONCE),
+    "spindle": ("M", SPINDLE_CODES, ONCE),
+    "coolant": ("M", COOLANT_CODES, ONCE),
+    "program_end": ("M", PROGRAM_END_CODES, FLAG),
+}
+# the motion and cycle groups interact (a cycle code cancels the motion
+# mode, motion codes are ignored inside a cycle) and are resolved together
+MOTION_GROUPS = ("move", "cycle")
+# groups held in the modal state
+STATE_GROUPS = tuple(
+    name for name, (_, _, kind) in MODAL_GROUPS.items() if kind == MODAL
+)
+# (letter, code) -> modal group
+GROUP_OF_CODE = {
+    (letter, code): name
+    for name, (letter, codes, _) in MODAL_GROUPS.items()
+    for code in codes
+}
+
+# letters whose words are codes rather than values
+CODE_LETTERS = "".join(sorted({letter for letter, _, _ in MODAL_GROUPS.values()}))
+KNOWN_G_CODES = frozenset(c for letter, c in GROUP_OF_CODE if letter == "G")
+KNOWN_M_CODES = frozenset(c for letter, c in GROUP_OF_CODE if letter == "M")
+
+# "/n" block delete levels; a bare "/" is level 1
+BLOCK_DELETE_LEVELS = tuple(range(1, 10))
+
+# word letters in the order of their scan record fields
+ADDRESS_ORDER = "XYZIJKRTSFPQHD"
+KNOWN_ADDRESSES = frozenset(ADDRESS_ORDER)
+
+
+def tokenize_line(line):
+    """Split an uppercased line into (letter, value, column) tokens.
+
+    Comments are returned with the letter "(" and their inner text as value;
+    every other word carries its numeric value as a float.
+    """
+    tokens = []
+    for match in WORD_RE.finditer(line):
+        letter = match.group("letter")
+        if letter is None:
+            tokens.append(("(", match.group("comment"), match.start()))
+        else:
+            tokens.append((letter, float(match.group("value")), match.start()))
+    return tokens
+
+
+def block_delete_level(line):
+    """Return the block delete level of a line starting with "/" or "/n",
+    0 for lines that cannot be deleted."""
+    if not line.startswith("/"):
+        return 0
+    level = line[1:2]
+    if level.isascii() and level.isdigit() and int(level) in BLOCK_DELETE_LEVELS:
+        return int(level)
+    return 1
+
+
+def code_number(value):
+    """Return a G/M code value as int, or None for non-integral codes."""
+    if value.is_integer():
+        return int(value)
+    return None
@@ -0,0 +1,344 @@
+"""Motion primitives of an expanded program and their tessellation.
+
+Straight moves are kept as their end vertices and arcs as center, radius,
+start angle, sweep and helix rise. Points along the arcs are only computed
+when a consumer asks for them, at the resolution it passes in.
+"""
+
+from math import atan2, pi
+
+import numpy as np
+
+from .program import PointTable
+
+# XYZ positions of the plane axes (u, v, w) for G17, G18 and G19
+PLANE_AXES = {17: (0, 1, 2), 18: (0, 2, 1), 19: (1, 2, 0)}
+
+# points per full turn without an arc tolerance
+TURN_POINTS = 314
+
+# name -> dtype, one entry per arc; u/v/w are plane axes, w the helix axis
+ARC_COLUMNS = {
+    # index of the vertex the arc's points go before
+    "position": np.int64,
+    "block": np.int32,
+    "move": np.int8,
+    "feed": np.float64,
+    "plane": np.int8,
+    "center_u": np.float64,
+    "center_v": np.float64,
+    "radius": np.float64,
+    "start": np.float64,
+    # signed, negative clockwise in the plane
+    "sweep": np.float64,
+    "start_w": np.float64,
+    "rise": np.float64,
+    "end_u": np.float64,
+    "end_v": np.float64,
+    "end_w": np.float64,
+}
+
+
+def atan2_each(y, x):
+    """Element-wise math.atan2 of two arrays.
+
+    np.arctan2 can round differently in its vector loop and in the leftover
+    elements, so the same arc would depend on the batch it came in.
+    """
+    return np.fromiter(map(atan2, y.tolist(), x.tolist()), np.float64, len(y))
+
+
+def chord_angle(radius, tolerance):
+    """Return the largest sweep whose chord stays within ``tolerance`` of
+    an arc of ``radius``; 2 pi where any chord does."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 2 * np.arccos(np.clip(1 - tolerance / radius, -1, 1))
+
+
+class ArcTable:
+    """Un-tessellated arcs stored as typed column arrays."""
+
+    def __init__(self, n=0):
+        """Allocate zeroed columns for n arcs."""
+        for name, dtype in ARC_COLUMNS.items():
+            setattr(self, name, np.zeros(n, dtype))
+
+    def __len__(self):
+        """Return the number of arcs."""
+        return len(self.block)
+
+    def take(self, index):
+        """Return the arcs picked by an index array or slice."""
+        table = ArcTable()
+        for name in ARC_COLUMNS:
+            setattr(table, name, getattr(self, name)[index])
+        return table
+
+    @classmethod
+    def concat(cls, tables):
+        """Join arc tables end to end; positions are left as they are."""
+        table = cls()
+        for name in ARC_COLUMNS:
+            setattr(table, name, np.concatenate([getattr(t, name) for t in tables]))
+        return table
+
+    def to_xyz(self, u, v, w):
+        """Return per-arc plane coordinates as an (n, 3) XYZ array."""
+        pos = np.empty((len(self), 3))
+        for code, axes in PLANE_AXES.items():
+            rows = self.plane == code
+            for axis, values in zip(axes, (u, v, w)):
+                pos[rows, axis] = values[rows]
+        return pos
+
+    def end_points(self):
+        """Return the programmed XYZ end points of the arcs."""
+        return self.to_xyz(self.end_u, self.end_v, self.end_w)
+
+    def points_at(self, t):
+        """Return the XYZ points a fraction ``t`` (scalar or per arc) along
+        each arc's sweep and rise."""
+        angle = self.start + t * self.sweep
+        return self.to_xyz(
+            self.center_u + self.radius * np.cos(angle),
+            self.center_v + self.radius * np.sin(angle),
+            self.start_w + t * self.rise,
+        )
+
+    def lengths(self):
+        """Return the helical length of each arc, sqrt((r sweep)^2 + rise^2)."""
+        return np.hypot(self.radius * self.sweep, self.rise)
+
+    @classmethod
+    def from_geometry(
+        cls, arc_type, direction, plane, x1, y1, z1, i, j, x2, y2, z2, r, **columns
+    ):
+        """Fit arcs to their end points and center words.
+
+        The geometry arguments are arrays in plane order: (x1, y1, z1) the
+        start, (x2, y2, z2) the end, i, j the center words of ``arc_type`` 1
+        (incremental) or 2 (absolute) and ``r`` the radius of type 3, with
+        ``direction`` 2 for G2 and 3 for G3.
+        Returns (table, centers, valid): the table holds the valid arcs with
+        the extra ``columns`` (position, block, move, feed) taken along,
+        ``centers`` the XYZ center of every input arc and ``valid`` the
+        accepted ones.
+        """
+        n = len(direction)
+        valid = np.isin(plane, tuple(PLANE_AXES)) & np.isin(arc_type, (1, 2, 3))
+        with np.errstate(all="ignore"):
+            if arc_type == 1:
+                xc = x1 + i
+                yc = y1 + j
+                radius = np.sqrt((x1 - xc) ** 2 + (y1 - yc) ** 2)
+            elif arc_type == 2:
+                xc = i
+                yc = j
+                radius = np.sqrt((x1 - xc) ** 2 + (y1 - yc) ** 2)
+            else:
+                d = np.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+                h = np.sqrt(r**2 - (d / 2) ** 2)
+                radius = np.abs(r)
+                # the center is left of the chord for G2 R > 0 and G3 R < 0
+                left = (r > 0) == (direction == 2)
+                du = h * (y2 - y1) / d
+                dv = h * (x2 - x1) / d
+                xc = np.where(left, x1 + (x2 - x1) / 2 + du, x1 + (x2 - x1) / 2 - du)
+                yc = np.where(left, y1 + (y2 - y1) / 2 - dv, y1 + (y2 - y1) / 2 + dv)
+                valid &= r != 0
+                if np.any(valid & ~(h >= 0) | valid & (d == 0)):
+                    raise ValueError("arc radius R does not fit its end points")
+
+            start0 = atan2_each(yc - y1, xc - x1)
+            end0 = atan2_each(yc - y2, xc - x2)
+            startAngle = start0 - atan2_each(np.zeros(n), 0 - radius)
+            startAngle = np.where(startAngle < 0, startAngle + 2 * pi, startAngle)
+            angle = np.where(direction == 2, start0 - end0, end0 - start0)
+            angle = np.where(angle <= 0, angle + 2 * pi, angle)
+        angle = np.where(direction == 2, -np.abs(angle), angle)
+
+        centers = np.zeros((n, 3))
+        for code, axes in PLANE_AXES.items():
+            rows = plane == code
+            for axis, values in zip(axes, (xc, yc, z1)):
+                centers[rows, axis] = values[rows]
+
+        table = cls(n)
+        table.plane = plane
+        table.center_u = xc
+        table.center_v = yc
+        table.radius = radius
+        table.start = startAngle
+        table.sweep = angle
+        table.start_w = z1
+        # -0.0 + 0.0 is 0.0, so a flat arc never rises by -0.0
+        table.rise = (z2 + 0.0) - (z1 + 0.0)
+        table.end_u = x2
+        table.end_v = y2
+        table.end_w = z2
+        for name, values in columns.items():
+            setattr(table, name, values)
+        for name, dtype in ARC_COLUMNS.items():
+            setattr(table, name, getattr(table, name)[valid].astype(dtype))
+        return table, centers, valid
+
+    def tessellate(self, settings):
+        """Return (pos, counts): the XYZ points of all arcs end to end and
+        the number of points of each arc.
+
+        With ``settings.arc_tolerance`` each arc gets as many chords as keep
+        it within the tolerance, clamped to ``arc_min_segments`` ..
+        ``arc_max_segments``; otherwise 314 per turn. The last point is the
+        programmed end point.
+        """
+        sweep = np.abs(self.sweep)
+        with np.errstate(all="ignore"):
+            if settings.arc_tolerance > 0:
+                points = np.clip(
+                    np.ceil(sweep / chord_angle(self.radius, settings.arc_tolerance)),
+                    settings.arc_min_segments,
+                    settings.arc_max_segments,
+                )
+            else:
+                # tolerance = 2 * pi/points
+                points = (sweep * TURN_POINTS) / (2 * pi)
+            step = self.rise / points
+        points = points.astype(np.int64)
+        steps = np.maximum(points, 1)
+
+        counts = np.maximum(points - 1, 0) + 1
+        total = int(counts.sum())
+        arc = np.repeat(np.arange(len(self)), counts)
+        point = np.arange(1, total + 1) - np.repeat(np.cumsum(counts) - counts, counts)
+        last = point == counts[arc]
+        delta = point * self.sweep[arc] / steps[arc]
+        u = self.center_u[arc] + self.radius[arc] * np.cos(self.start[arc] + delta)
+        v = self.center_v[arc] + self.radius[arc] * np.sin(self.start[arc] + delta)
+        w = self.start_w[arc] + step[arc] * point
+        u[last] = self.end_u[arc[last]]
+        v[last] = self.end_v[arc[last]]
+        w[last] = self.end_w[arc[last]]
+
+        pos = np.empty((total, 3))
+        for code, axes in PLANE_AXES.items():
+            rows = self.plane[arc] == code
+            for axis, values in zip(axes, (u, v, w)):
+                pos[rows, axis] = values[rows]
+        return pos, counts
+
+
+def arc_points(settings, move, plane, x1, y1, z1, i, j, x2, y2, z2, r):
+    """Tessellate many arcs at once.
+
+    All arguments but ``settings`` are arrays with one entry per arc, in
+    plane order as in ArcTable.from_geometry(). Returns (pos, counts,
+    centers, valid): the (n, 3) XYZ points of all valid arcs end to end, the
+    point count and XYZ center of every arc, and a mask of the arcs not
+    rejected for an unknown plane or arc type or a zero R. Rejected arcs
+    have no points.
+    """
+    arcs, centers, valid = ArcTable.from_geometry(
+        settings.arc_type, move, plane, x1, y1, z1, i, j, x2, y2, z2, r
+    )
+    pos, arc_counts = arcs.tessellate(settings)
+    counts = np.zeros(len(move), np.int64)
+    counts[valid] = arc_counts
+    return pos, counts, centers, valid
+
+
+class Toolpath:
+    """Motion primitives of an expanded program.
+
+    ``vertices`` is a PointTable of the end points of rapid, linear and
+    cycle moves; ``arcs`` an ArcTable whose ``position`` column says which
+    vertex each arc comes before. ``settings`` sets the default resolution
+    of tessellate().
+    """
+
+    def __init__(self, vertices=None, arcs=None, settings=None):
+        """Wrap primitive tables."""
+        self.vertices = vertices if vertices is not None else PointTable()
+        self.arcs = arcs if arcs is not None else ArcTable()
+        self.settings = settings
+
+    def __len__(self):
+        """Return the number of primitives."""
+        return len(self.vertices) + len(self.arcs)
+
+    def tessellate(self, settings=None):
+        """Return the toolpath as a PointTable.
+
+        ``settings`` overrides the arc resolution the path was expanded with.
+        """
+        vertices = self.vertices
+        arcs = self.arcs
+        if not len(arcs):
+            return vertices
+        pos, counts = arcs.tessellate(settings or self.settings)
+        before = np.zeros(len(arcs) + 1, np.int64)
+        np.cumsum(counts, out=before[1:])
+        listed = np.arange(len(vertices))
+        listed += before[np.searchsorted(arcs.position, listed, "right")]
+        inserted = np.repeat(arcs.position, counts) + np.arange(len(pos))
+        n = len(vertices) + len(pos)
+        points = PointTable(
+            np.empty((n, 3)),
+            np.empty(n),
+            np.empty(n, np.int32),
+            np.empty(n, np.int8),
+        )
+        points.pos[listed] = vertices.pos
+        points.feed[listed] = vertices.feed
+        points.block[listed] = vertices.block
+        points.move[listed] = vertices.move
+        points.pos[inserted] = pos
+        points.feed[inserted] = np.repeat(arcs.feed, counts)
+        points.block[inserted] = np.repeat(arcs.block, counts)
+        points.move[inserted] = np.repeat(arcs.move, counts)
+        return points
+
+    def last_point(self):
+        """Return the XYZ end of the path, or None if it is empty."""
+        arcs = self.arcs
+        if len(arcs) and arcs.position[-1] == len(self.vertices):
+            return arcs.end_points()[-1]
+        if len(self.vertices):
+            return self.vertices.pos[-1]
+        return None
+
+    def select(self, start, stop):
+        """Return the primitives of blocks [start, stop)."""
+        lo, hi = np.searchsorted(self.vertices.block, (start, stop))
+        first, last = np.searchsorted(self.arcs.block, (start, stop))
+        arcs = self.arcs.take(slice(first, last))
+        arcs.position = arcs.position - lo
+        return Toolpath(self.vertices.take(slice(lo, hi)), arcs, self.settings)
+
+    def shifted(self, blocks):
+        """Return a copy whose block indices are moved by ``blocks``."""
+        vertices = self.vertices
+        arcs = self.arcs.take(slice(None))
+        arcs.block = arcs.block + blocks
+        return Toolpath(
+            PointTable(
+                vertices.pos, vertices.feed, vertices.block + blocks, vertices.move
+            ),
+            arcs,
+            self.settings,
+        )
+
+    @classmethod
+    def concat(cls, paths, settings=None):
+        """Join toolpaths end to end."""
+        offset = 0
+        arcs = []
+        for path in paths:
+            part = path.arcs.take(slice(None))
+            part.position = part.position + offset
+            arcs.append(part)
+            offset += len(path.vertices)
+        return cls(
+            PointTable.concat([path.vertices for path in paths]),
+            ArcTable.concat(arcs),
+            settings,
+        )
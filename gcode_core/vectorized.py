@@ -0,0 +1,362 @@
+"""Whole-buffer NumPy scanning and modal resolution of G-code lines.
+
+scan_buffer() finds the comments and words of every line in one pass of
+array operations over the joined text instead of one regex pass per line.
+Its rows are the same as parser.scan_line() would return for each line.
+resolve() then turns them into block rows the way
+parser.interpret_scanned() does, with forward fills for sticky words and
+running sums for incremental coordinates.
+"""
+
+import re
+
+import numpy as np
+
+from .modal import ModalState
+from .program import BLOCK_COLUMNS, BlockTable, int_word
+from .tokenizer import (
+    ADDRESS_ORDER,
+    BLOCK_DELETE_LEVELS,
+    CODE_LETTERS,
+    MODAL,
+    MODAL_GROUPS,
+    MOTION_GROUPS,
+    ONCE,
+    P_CYCLE_CODES,
+    Q_CYCLE_CODES,
+)
+
+# G28 axis code indexed by 4 * X + 2 * Y + Z after the G28 word
+HOME_CODES = np.array([0, 3, 2, 6, 1, 5, 4, 7], np.int8)
+
+# longest digit string whose integer value and power of ten stay exact
+EXACT_DIGITS = 15
+
+# \d also matches non-ASCII decimal digits, which the byte scan cannot see
+UNICODE_DIGIT_RE = re.compile(r"(?![0-9])\d")
+
+# G/M values at or above this are never known codes
+CODE_LIMIT = 1 << 31
+
+ZERO, NINE = ord("0"), ord("9")
+
+
+class ScanTable:
+    """scan_line() results of consecutive lines stored as NumPy columns.
+
+    ``values[name]`` holds a code or word per line and ``present[name]``
+    marks the lines that have it; ``comment`` is a list with None for lines
+    without comments and ``block_delete`` the "/n" level of each line.
+    """
+
+    def __init__(self, n):
+        """Start with n lines holding no words."""
+        self.comment = [None] * n
+        self.known = np.zeros(n, np.bool_)
+        self.block_delete = np.zeros(n, np.int8)
+        self.values = {}
+        self.present = {}
+
+    def __len__(self):
+        """Return the number of lines."""
+        return len(self.known)
+
+
+def scan_buffer(lines):
+    """Scan uppercased ``lines`` as one buffer; returns a ScanTable.
+
+    Returns None for text with non-ASCII digits, which only the per-line
+    regex recognises.
+    """
+    text = "".join(lines)
+    if not text.isascii() and UNICODE_DIGIT_RE.search(text):
+        return None
+    n = len(lines)
+    table = ScanTable(n)
+    # one byte per character, so byte offsets are string offsets
+    size = len(text)
+    buf = np.zeros(size + 2, np.uint8)
+    buf[:size] = np.frombuffer(text.encode("ascii", "replace"), np.uint8)
+    starts = np.zeros(n + 1, np.int64)
+    np.cumsum(np.fromiter(map(len, lines), np.int64, n), out=starts[1:])
+
+    def line_of(offsets):
+        return np.searchsorted(starts, offsets, "right") - 1
+
+    # "/" or "/n" at the start of a line
+    length = np.diff(starts)
+    head = starts[:-1]
+    level = buf[head + 1].astype(np.int8) - ZERO
+    level = np.where((length > 1) & np.isin(level, BLOCK_DELETE_LEVELS), level, 1)
+    table.block_delete = np.where(
+        (length > 0) & (buf[head] == ord("/")), level, 0
+    ).astype(np.int8)
+
+    # comments: the first ")" after a "(" on the same line closes it, and
+    # an opening inside an earlier comment shares that comment's ")"
+    opens = np.flatnonzero(buf == ord("("))
+    closes = np.flatnonzero(buf == ord(")"))
+    k = np.searchsorted(closes, opens)
+    opens = opens[k < len(closes)]
+    ends = closes[k[k < len(closes)]]
+    same = line_of(opens) == line_of(ends)
+    opens, ends = opens[same], ends[same]
+    first = np.ones(len(ends), np.bool_)
+    first[1:] = ends[1:] != ends[:-1]
+    opens, ends = opens[first], ends[first]
+    inside = np.cumsum(
+        np.bincount(opens, minlength=size + 3)[: size + 2]
+        - np.bincount(ends + 1, minlength=size + 3)[: size + 2]
+    )
+    comments = {}
+    for line, o, e in zip(line_of(opens).tolist(), opens.tolist(), ends.tolist()):
+        comments.setdefault(line, []).append(text[o + 1 : e])
+    for line, parts in comments.items():
+        table.comment[line] = "".join(parts)
+    known = np.zeros(n, np.bool_)
+    known[list(comments)] = True
+
+    # words: a letter outside comments followed by [-+]?(\d+\.?\d*|\.\d+)
+    letters = np.flatnonzero((buf >= ord("A")) & (buf <= ord("Z")) & (inside == 0))
+    # offset of the first non-digit at or after every offset
+    digits_end = np.where((buf >= ZERO) & (buf <= NINE), size + 1, np.arange(size + 2))
+    digits_end = np.minimum.accumulate(digits_end[::-1])[::-1]
+    sign = buf[letters + 1]
+    negative = sign == ord("-")
+    start = letters + 1 + (negative | (sign == ord("+")))
+    point = digits_end[start]
+    has_point = buf[point] == ord(".")
+    end = np.where(has_point, digits_end[point + 1], point)
+    int_len = point - start
+    frac_len = np.where(has_point, end - point - 1, 0)
+    valid = (int_len > 0) | (frac_len > 0)
+    letters, negative, start, point = (
+        letters[valid],
+        negative[valid],
+        start[valid],
+        point[valid],
+    )
+    end, int_len, frac_len = end[valid], int_len[valid], frac_len[valid]
+
+    # integer mantissa digit by digit, longest numbers last so each step
+    # works on a slice; exact while it has <= 15 digits
+    count = int_len + frac_len
+    order = np.argsort(count, kind="stable")
+    count_sorted = count[order]
+    exact = np.searchsorted(count_sorted, EXACT_DIGITS, "right")
+    mantissa = np.zeros(exact, np.int64)
+    for d in range(int(count_sorted[exact - 1]) if exact else 0):
+        lo = np.searchsorted(count_sorted, d, "right")
+        words = order[lo:exact]
+        offset = start[words] + d + (d >= int_len[words])
+        mantissa[lo:] = mantissa[lo:] * 10 + (buf[offset] - ZERO)
+    value = np.empty(len(letters))
+    value[order[:exact]] = mantissa / 10.0 ** frac_len[order[:exact]]
+    for j in order[exact:].tolist():
+        value[j] = float(text[start[j] : end[j]])
+    value[negative] = -value[negative]
+
+    line = line_of(letters)
+    # word indices grouped by letter, in text order within each letter
+    by_letter = np.argsort(buf[letters], kind="stable")
+    bounds = np.searchsorted(buf[letters][by_letter], np.arange(ord("A"), ord("Z") + 2))
+
+    def words_of(address):
+        """Return the indices of the words of one letter in text order."""
+        k = ord(address) - ord("A")
+        return by_letter[bounds[k] : bounds[k + 1]]
+
+    def last_per_line(index):
+        """Keep the last of ``index``'s words on each line."""
+        keep = np.ones(len(index), np.bool_)
+        keep[:-1] = line[index[1:]] != line[index[:-1]]
+        return index[keep]
+
+    def store(name, index, values):
+        table.values[name] = np.zeros(n, values.dtype)
+        table.values[name][line[index]] = values
+        table.present[name] = np.zeros(n, np.bool_)
+        table.present[name][line[index]] = True
+        known[line[index]] = True
+
+    # integral G/M values as ints, -1 for everything else
+    code = np.full(len(letters), -1, np.int64)
+    for address in CODE_LETTERS:
+        index = words_of(address)
+        number = value[index]
+        integral = (number == np.floor(number)) & (np.abs(number) < CODE_LIMIT)
+        code[index[integral]] = number[integral]
+    for name, (address, codes, _) in MODAL_GROUPS.items():
+        index = words_of(address)
+        index = last_per_line(index[np.isin(code[index], codes)])
+        store(name, index, code[index])
+    for address in ADDRESS_ORDER:
+        index = last_per_line(words_of(address))
+        store(address, index, value[index])
+    table.known = known
+
+    # G28 only takes the axis words written after it on the line
+    index = words_of("G")
+    index = last_per_line(index[code[index] == 28])
+    home = np.zeros(n, np.int8)
+    has_home = np.zeros(n, np.bool_)
+    has_home[line[index]] = True
+    home_at = np.full(n, size, np.int64)
+    home_at[line[index]] = letters[index]
+    axes = np.zeros(n, np.int64)
+    for address, weight in (("X", 4), ("Y", 2), ("Z", 1)):
+        # the last word of the axis, like scan_line's column lookup
+        index = last_per_line(words_of(address))
+        after = np.zeros(n, np.bool_)
+        after[line[index]] = letters[index] > home_at[line[index]]
+        axes += weight * after
+    home[has_home] = HOME_CODES[axes[has_home]]
+    table.values["home"] = home
+    table.present["home"] = has_home
+    return table
+
+
+def fill(update, values, initial):
+    """Carry ``values`` forward from the lines where ``update`` is set.
+
+    Lines before the first update get ``initial``.
+    """
+    last = np.maximum.accumulate(np.where(update, np.arange(len(update)), -1))
+    return np.where(last >= 0, values[np.maximum(last, 0)], initial)
+
+
+def accumulate(initial, reset, reset_value, add, step):
+    """Return a running value that is set to ``reset_value`` where ``reset``
+    and advanced by ``step`` where ``add``.
+
+    Additions run in line order from the last reset, so the sums round
+    exactly like a block-by-block loop.
+    """
+    out = fill(reset, reset_value, initial).astype(np.float64)
+    adds = np.flatnonzero(add)
+    if not len(adds):
+        return out
+    resets = np.flatnonzero(reset)
+    # one np.add.accumulate per run of additions between two resets
+    segment = np.searchsorted(resets, adds)
+    firsts = adds[np.flatnonzero(np.diff(segment, prepend=-1))]
+    ends = np.append(resets, len(out))[np.unique(segment)]
+    for lo, hi in zip(firsts.tolist(), ends.tolist()):
+        # adding -0.0 leaves every value, including -0.0, unchanged
+        steps = np.where(add[lo:hi], step[lo:hi], -0.0)
+        steps[0] += out[lo - 1] if lo else initial
+        out[lo:hi] = np.add.accumulate(steps)
+    return out
+
+
+def resolve(table, state, settings):
+    """Resolve the modal state over a ScanTable; returns its BlockTable.
+
+    ``state`` is the modal state before the first line and is updated in
+    place to the state after the last one, like interpret_scanned().
+    """
+    n = len(table)
+    values, present = table.values, table.present
+    blocks = BlockTable(n)
+
+    def word(letter):
+        return values[letter], present[letter]
+
+    def optional(name, value, mask):
+        setattr(blocks, name, np.where(mask, value, 0).astype(BLOCK_COLUMNS[name]))
+        blocks.present[name] = mask
+
+    cycle = fill(present["cycle"], values["cycle"], state.cycle)
+    drilling = cycle != 80
+    # a cycle word cancels the motion mode, a motion word outside cycles sets it
+    set_move = present["move"] & ~drilling
+    move = fill(
+        set_move | present["cycle"],
+        np.where(set_move, values["move"], 0),
+        state.move,
+    )
+    for name, (_, _, kind) in MODAL_GROUPS.items():
+        if name in MOTION_GROUPS:
+            continue
+        if kind == MODAL:
+            column = fill(present[name], values[name], getattr(state, name))
+            setattr(blocks, name, column.astype(BLOCK_COLUMNS[name]))
+        elif kind == ONCE:
+            optional(name, values[name], present[name])
+        else:
+            setattr(blocks, name, present[name])
+    absolute = blocks.pos_mode == 90
+    home = np.where(present["home"], values["home"], 0)
+
+    # G91 adds to the position unless G28 sends the axis to machine home
+    axes = (
+        ("x", "X", settings.x_pos_mach, (1, 4, 5, 7)),
+        ("y", "Y", settings.y_pos_mach, (2, 4, 6, 7)),
+    )
+    for name, letter, machine, homes in axes:
+        value, has = word(letter)
+        to_home = has & ~absolute & np.isin(home, homes)
+        position = accumulate(
+            getattr(state, name),
+            (has & absolute) | to_home,
+            np.where(to_home, machine, value),
+            has & ~absolute & (home == 0),
+            value,
+        )
+        setattr(blocks, name, position)
+
+    # inside a cycle Z is the cycle depth and the position stays put
+    value, has = word("Z")
+    to_home = has & ~absolute & np.isin(home, (3, 5, 6, 7))
+    blocks.z = accumulate(
+        state.z,
+        (has & absolute & ~drilling) | to_home,
+        np.where(to_home, settings.z_pos_mach, value),
+        has & ~absolute & ~drilling & ~to_home,
+        value,
+    )
+    blocks.cycle_z = accumulate(
+        state.cycle_z,
+        ~drilling | (has & absolute),
+        np.where(drilling, value, 0.0),
+        has & ~absolute & drilling,
+        value,
+    )
+
+    # R, P and Q stay set inside the cycles that use them
+    sticky = (
+        ("r", "R", ~drilling, state.r),
+        ("p", "P", ~np.isin(cycle, P_CYCLE_CODES), state.p),
+        ("q", "Q", ~np.isin(cycle, Q_CYCLE_CODES), state.q),
+    )
+    for name, letter, clear, initial in sticky:
+        value, has = word(letter)
+        update = has | clear
+        optional(
+            name,
+            fill(update, value, 0 if initial is None else initial),
+            fill(update, has, initial is not None),
+        )
+
+    blocks.move = move.astype(BLOCK_COLUMNS["move"])
+    blocks.cycle = cycle.astype(BLOCK_COLUMNS["cycle"])
+    for name, letter in (("i", "I"), ("j", "J"), ("k", "K")):
+        optional(name, *word(letter))
+    for name, letter, initial in (
+        ("tool", "T", state.tool),
+        ("speed", "S", state.speed),
+        ("cor_d", "D", state.cor_d),
+    ):
+        value, has = word(letter)
+        column = fill(has, int_word(name, value), initial)
+        setattr(blocks, name, column.astype(BLOCK_COLUMNS[name]))
+    blocks.feed = fill(present["F"], values["F"], state.feed)
+    optional("cor_h", int_word("cor_h", values["H"]), present["H"])
+    optional("home", home, home != 0)
+    blocks.unknown = ~table.known
+    blocks.block_delete = table.block_delete
+    blocks.comment = table.comment
+
+    if n:
+        vars(state).update(vars(ModalState.after_block(blocks, n - 1)))
+    return blocks
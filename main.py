@@ -4,12 +4,16 @@
 
 # region IMPORTS
 
+import os
 import re
 import sys
 import time
-from math import atan2, cos, floor, pi, sin, sqrt
+from dataclasses import replace
+from math import sqrt
 
+import numpy as np
 from PyQt5.QtWidgets import (
+    QAction,
     QApplication,
     QFileDialog,
     QMenu,
@@ -18,6 +22,7 @@ from PyQt5.QtWidgets import (
     QMessageBox,
     QLabel,
     QProgressBar,
+    QToolButton,
 )
 from PyQt5.QtGui import QColor, QFont, QIcon, QQuaternion, QVector3D
 from PyQt5.QtCore import (
@@ -25,10 +30,15 @@ from PyQt5.QtCore import (
     QBasicTimer,
     QFile,
     QFileInfo,
+    QObject,
     QSettings,
     QSize,
+    QStandardPaths,
     QTextStream,
+    QThread,
     QUrl,
+    pyqtSignal,
+    pyqtSlot,
 )
 from PyQt5.Qsci import QsciLexerCustom, QsciScintilla
 from pyqtgraph.opengl import GLGridItem, GLLinePlotItem, GLScatterPlotItem
@@ -37,9 +47,42 @@ from main_ui import Ui_MainWindow
 from find_replace import Ui_Find
 from export import Ui_ExportOptDlg
 from block_num import Ui_BlockNumberDlg
-from export_logic import export_pgm
+from gcode_core import (
+    ARC_CW,
+    COLOR_DEPTH,
+    COLOR_FEED,
+    COLOR_MOVE,
+    COLOR_SINGLE,
+    COLOR_TOOL,
+    LINEAR,
+    RAPID,
+    DirtyLines,
+    ExportOptions,
+    ParseCache,
+    PointTable,
+    Program,
+    Settings,
+    StreamParser,
+    ToolpathStats,
+    expand,
+    export_pgm,
+    has_motion,
+    parse_text,
+    point_colors,
+    reexpand,
+    reparse,
+    toolpath_limits,
+    toolpath_summary,
+)
 import files_res
 
+# toolpath points kept for plotting a streamed file
+PREVIEW_POINTS = 1000000
+# largest decimation error of a drawn level of detail, in screen pixels
+LOD_PIXELS = 2
+# how close the pointer has to come to a segment to pick it, in screen pixels
+PICK_PIXELS = 4
+
 # endregion
 
 
@@ -252,15 +295,83 @@ class Find(QDialog):
 # endregion
 
 
+# region Document
+
+
+class EditorDocument:
+    """Line-level access to the editor text with incrementally kept metrics.
+
+    Reads go through the Scintilla line and range APIs, so only the asked
+    for text is copied. The character and newline counts follow every
+    insertion and deletion instead of being recounted from the full text.
+    """
+
+    def __init__(self, editor):
+        """Wrap ``editor`` and count its current text once."""
+        self.editor = editor
+        self.reset()
+
+    def reset(self):
+        """Recount the metrics from the full text."""
+        text = self.editor.text()
+        self.chars = len(text)
+        self.newlines = text.count("\n")
+
+    def modified(self, modificationType, text):
+        """Update the metrics for an inserted or deleted piece of UTF-8 text."""
+        if not text:
+            return
+        sign = 0
+        if modificationType & QsciScintilla.SC_MOD_INSERTTEXT:
+            sign = 1
+        elif modificationType & QsciScintilla.SC_MOD_DELETETEXT:
+            sign = -1
+        self.chars += sign * len(text.decode("utf-8", "replace"))
+        self.newlines += sign * text.count(b"\n")
+
+    @property
+    def length(self):
+        """Length of the text with CR LF line ends."""
+        return self.chars + self.newlines
+
+    def lineCount(self):
+        """Return the number of editor lines."""
+        return self.editor.lines()
+
+    def lineFromPosition(self, position):
+        """Return the line holding a byte position."""
+        return self.editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, position)
+
+    def lineStart(self, line):
+        """Return the byte position a line starts at."""
+        return self.editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line)
+
+    def line(self, line):
+        """Return the text of one line including its line end."""
+        return self.editor.text(line)
+
+    def lines(self, first, stop):
+        """Return the texts of lines ``first`` up to ``stop``."""
+        return [self.editor.text(n) for n in range(first, stop)]
+
+    def textRange(self, start, end):
+        """Return the text between two byte positions."""
+        return self.editor.text(start, end)
+
+
+# endregion
+
+
 # region GcodeLexer
 
 
 class GcodeLexer(QsciLexerCustom):
     """Custom QScintilla lexer for highlighting G-code."""
 
-    def __init__(self, parent=None):
+    def __init__(self, document, parent=None):
         """Initialize lexer styles and colors."""
         super().__init__(parent)
+        self.document = document
 
         self.stylesLexer = {
             0: "Default",
@@ -303,7 +414,7 @@ class GcodeLexer(QsciLexerCustom):
         if end > editor.length():
             end = editor.length()
         if end > start:
-            source = str(editor.text())[start:end]
+            source = self.document.textRange(start, end)
         if not source:
             return
 
@@ -322,28 +433,7 @@ class GcodeLexer(QsciLexerCustom):
             elif previous_style == self.Circular:
                 prev_move = 2
             else:
-                source1 = str(editor.text())[0 : start - 1]
-                lst1 = source1.splitlines(True)
-                i = 0
-                while i < len(lst1):
-                    line = lst1[i]
-                    blockskip = "".join(re.findall(r"^\/.*", line))
-                    if blockskip:
-                        line = line.replace(blockskip, "")
-                    comment = "".join(re.findall(r"\(.*?\)", line))
-                    if comment:
-                        line = line.replace(comment, "")
-                    circular = re.findall(r"[G]0?[2-3][\D]", line)
-                    linear = re.findall(r"[G]0?[1][\D]", line)
-                    rapid = re.findall(r"[G]0?[0][\D]", line)
-                    if rapid:
-                        prev_move = 0
-                    elif linear:
-                        prev_move = 1
-                    elif circular:
-                        prev_move = 2
-
-                    i += 1
+                prev_move = self.previousMove(start - 1)
 
         i = 0
         while i < len(lst):
@@ -388,6 +478,247 @@ class GcodeLexer(QsciLexerCustom):
 
             i += 1
 
+    def previousMove(self, stop):
+        """Return the move type in effect before byte position ``stop``.
+
+        Lines are read backwards from ``stop`` until one sets a move.
+        """
+        n = self.document.lineFromPosition(stop)
+        line = self.document.textRange(self.document.lineStart(n), stop)
+        while True:
+            blockskip = "".join(re.findall(r"^\/.*", line))
+            if blockskip:
+                line = line.replace(blockskip, "")
+            comment = "".join(re.findall(r"\(.*?\)", line))
+            if comment:
+                line = line.replace(comment, "")
+            if re.findall(r"[G]0?[0][\D]", line):
+                return 0
+            if re.findall(r"[G]0?[1][\D]", line):
+                return 1
+            if re.findall(r"[G]0?[2-3][\D]", line):
+                return 2
+            if n == 0:
+                return 0
+            n -= 1
+            line = self.document.line(n)
+
+
+# endregion
+
+
+# region Worker
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its worker has been cancelled."""
+
+
+class Worker(QObject):
+    """Run a job function on a QThread and report throttled progress."""
+
+    progress = pyqtSignal(int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, job, onDone):
+        """Wrap ``job``, a callable taking a progress callback."""
+        super().__init__()
+        self.job = job
+        self.onDone = onDone
+        self.cancelled = False
+        self.percent = -1
+
+    def report(self, percent):
+        """Progress callback for gcode_core; aborts the job once cancelled."""
+        if self.cancelled:
+            raise JobCancelled()
+        if percent != self.percent:
+            self.percent = percent
+            self.progress.emit(percent)
+
+    @pyqtSlot()
+    def run(self):
+        """Run the job and emit its result or error message."""
+        try:
+            result = self.job(self.report)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.done.emit(result)
+        finally:
+            self.finished.emit()
+
+
+# endregion
+
+
+def streamPreview(fileName, settings, progress=None):
+    """Stream a file, returning at most PREVIEW_POINTS points and full stats."""
+    stats = ToolpathStats()
+    parts = []
+    kept = seen = 0
+    stride = 1
+    with StreamParser(fileName, settings) as stream:
+        for batch in stream.batches(progress):
+            stats.add(batch.path, batch.points)
+            part = batch.points.take(slice((-seen) % stride, None, stride))
+            parts.append(part)
+            seen += len(batch.points)
+            kept += len(part)
+            if kept > PREVIEW_POINTS:
+                # keep every other point from now on
+                stride *= 2
+                parts = [PointTable.concat(parts).take(slice(None, None, 2))]
+                kept = len(parts[0])
+    points = PointTable.concat(parts) if parts else None
+    return points, stats
+
+
+# endregion
+
+
+# region Picking
+
+
+def rotationMatrix(view):
+    """Return the 3x3 world to camera rotation of a GLViewWidget."""
+    opts = view.opts
+    if opts["rotationMethod"] == "quaternion":
+        q = opts["rotation"]
+        w, x, y, z = q.scalar(), q.x(), q.y(), q.z()
+        return np.array(
+            [
+                [1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+                [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+                [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+            ]
+        )
+    a = np.radians(opts["elevation"] - 90)
+    b = -np.radians(opts["azimuth"] + 90)
+    rx = np.array([[1, 0, 0], [0, np.cos(a), -np.sin(a)], [0, np.sin(a), np.cos(a)]])
+    rz = np.array([[np.cos(b), -np.sin(b), 0], [np.sin(b), np.cos(b), 0], [0, 0, 1]])
+    return rx @ rz
+
+
+def viewRay(view, x, y):
+    """Return the origin and direction of the ray under widget point x, y."""
+    rotation = rotationMatrix(view)
+    center = view.opts["center"]
+    center = np.array([center.x(), center.y(), center.z()])
+    origin = center + rotation.T @ np.array([0.0, 0.0, view.opts["distance"]])
+    half = np.tan(np.radians(view.opts["fov"]) / 2)
+    width, height = view.width(), view.height()
+    ray = np.array(
+        [
+            (2 * x / width - 1) * half,
+            (1 - 2 * y / height) * half * height / width,
+            -1.0,
+        ]
+    )
+    return origin, rotation.T @ ray
+
+
+# endregion
+
+
+# region ToolpathItem
+
+
+class ToolpathItem(GLLinePlotItem):
+    """Line strip holding a whole toolpath, drawn up to a vertex count.
+
+    The vertices are uploaded once when the path is set; changing the count
+    only changes how many of them the next paint draws. In "lines" mode the
+    item holds the point pairs of a subset of the segments.
+
+    Decimated copies of the path can be added as child items; each paint
+    draws the coarsest one whose error stays below LOD_PIXELS instead.
+    """
+
+    def __init__(self, **kwds):
+        """Start without a path."""
+        super().__init__(**kwds)
+        self.vertices = None
+        self.index = None
+        self.uploaded = False
+        self.count = 0
+        self.levels = []
+        self.lod = None
+
+    def setPath(self, pos, index=None):
+        """Replace the vertices, picked from ``pos`` by ``index`` if given,
+        and draw none of them yet."""
+        self.index = index
+        if index is not None:
+            pos = pos[index]
+        self.vertices = (
+            np.ascontiguousarray(pos, dtype=np.float32) if len(pos) else None
+        )
+        self.uploaded = False
+        self.count = 0
+        self.setLevels(pos, None)
+        self.update()
+
+    def setLevels(self, pos, lod):
+        """Replace the decimated copies by the levels of a LodPyramid of the
+        strip ``pos``, or remove them if ``lod`` is None."""
+        for item in self.levels:
+            item.setParentItem(None)
+        self.levels = []
+        self.lod = lod
+        for index in lod.levels if lod is not None else ():
+            item = ToolpathItem(width=self.width, antialias=self.antialias)
+            item.setPath(pos, index)
+            item.setPointColors(self.color)
+            item.setVisible(False)
+            # drawn after this item, which picks the level in its paint
+            item.setDepthValue(1)
+            item.setParentItem(self)
+            self.levels.append(item)
+
+    def setPointColors(self, colors):
+        """Color the vertices from per-point ``colors``, or one QColor."""
+        for item in self.levels:
+            item.setPointColors(colors)
+        if isinstance(colors, np.ndarray) and self.index is not None:
+            colors = colors[self.index]
+        self.setData(color=colors)
+
+    def setCount(self, count):
+        """Draw the first ``count`` vertices."""
+        self.count = count
+        for item in self.levels:
+            item.setCount(int(np.searchsorted(item.index, count)))
+        self.update()
+
+    def showLevel(self):
+        """Show the coarsest level fine enough for the view and return it."""
+        view = self.view()
+        level = 0
+        if self.levels and view is not None:
+            pixel = view.pixelSize(view.opts["center"])
+            level = self.lod.level_for(pixel * LOD_PIXELS)
+        for n, item in enumerate(self.levels, 1):
+            if item.visible() != (n == level):
+                item.setVisible(n == level)
+        return level
+
+    def paint(self):
+        """Upload the vertices if they changed and draw the current prefix."""
+        if self.showLevel() or self.vertices is None:
+            return
+        if not self.uploaded and hasattr(self, "m_vbo_position"):
+            self.upload_vbo(self.m_vbo_position, self.vertices)
+            self.uploaded = True
+        # a view into the uploaded buffer, so only the draw count changes;
+        # pyqtgraph before 0.14 has no VBO and draws the view from memory
+        self.pos = self.vertices[: self.count]
+        super().paint()
+
 
 # endregion
 
@@ -408,6 +739,35 @@ class MainWindow(QMainWindow):
         icon.addFile(":/resource/icons/logo.png", QSize(), QIcon.Normal, QIcon.Off)
         self.setWindowIcon(icon)
 
+        # last expanded program with its settings, reused by incremental reparse
+        self.parsed = None
+        self.parsedSettings = None
+        self.dirty = DirtyLines()
+        self.document = EditorDocument(self.ui.editor)
+        # file streamed into the plot instead of the editor, with its stats
+        self.previewFile = ""
+        self.previewStats = None
+        # running background job and the threads not yet finished
+        self.worker = None
+        self.threads = {}
+        # job indexing the shown toolpath for drawing and picking, beside
+        # the parse jobs, and the segment tree it built for picking
+        self.indexWorker = None
+        self.segmentTree = None
+        # persistent plot items, the toolpath is uploaded once per program
+        self.pathItem = ToolpathItem(width=0.3, antialias=True)
+        self.marker = GLScatterPlotItem(pos=np.zeros((1, 3)), size=0.4, pxMode=False)
+        self.marker.setGLOptions("translucent")
+        # tool and move type layers, built the first time one is hidden
+        self.layerItems = []
+        self.hiddenTools = set()
+        self.hiddenMoves = set()
+        self.toolLayerActions = []
+        # segment end points hidden with their layer, None if none are
+        self.hiddenPoints = None
+        # the info pane shows the hovered toolpath position
+        self.hovering = False
+
         self.loadSettings()
         self.connectActions()
         self.createLabelStatBar()
@@ -443,7 +803,42 @@ class MainWindow(QMainWindow):
         self.yPosMach = self.settings.value("PLOT/MACHINE_YPOS", 0, type=float)
         self.zPosMach = self.settings.value("PLOT/MACHINE_ZPOS", 0, type=float)
         self.latheMode = self.settings.value("PLOT/LATHE_MODE", False, type=bool)
+        self.blockDelete = self.settings.value("PLOT/BLOCK_DELETE", True, type=bool)
+        # "/n" levels skipped while block delete is on, "/" is level 1
+        self.blockDeleteLevels = self.settings.value(
+            "PLOT/BLOCK_DELETE_LEVELS", "123456789", type=str
+        )
+        # 0 - fixed 314 points per full circle
+        self.arcTolerance = self.settings.value("PLOT/ARC_TOLERANCE", 0.005, type=float)
+        self.arcMinSegments = self.settings.value("PLOT/ARC_MIN_SEGMENTS", 2, type=int)
+        self.arcMaxSegments = self.settings.value(
+            "PLOT/ARC_MAX_SEGMENTS", 10000, type=int
+        )
+        self.streamFileMb = self.settings.value("PLOT/STREAM_FILE_MB", 64, type=int)
+        # 0 - do not cache parsed programs on disk
+        self.cacheMb = self.settings.value("PLOT/CACHE_MB", 256, type=int)
+        self.parseCache = None
+        if self.cacheMb > 0:
+            cacheDir = QStandardPaths.writableLocation(
+                QStandardPaths.GenericCacheLocation
+            )
+            self.parseCache = ParseCache(
+                os.path.join(cacheDir, "easy-gcode-plot", "parse"),
+                self.cacheMb * 1024 * 1024,
+            )
+        self.checkpointInterval = self.settings.value(
+            "PLOT/CHECKPOINT_INTERVAL", 1000, type=int
+        )
+        self.vectorizedScan = self.settings.value(
+            "PLOT/VECTORIZED_SCAN", True, type=bool
+        )
         self.ui.actionLatheMode.setChecked(self.latheMode)
+        self.ui.actionBlockDelete.setChecked(self.blockDelete)
+        # 0 - line color, 1 - move type, 2 - feed, 3 - tool, 4 - Z depth
+        self.colorMode = self.settings.value("PLOT/COLOR_MODE", COLOR_SINGLE, type=int)
+        if self.colorMode not in self.colorActions():
+            self.colorMode = COLOR_SINGLE
+        self.colorActions()[self.colorMode].setChecked(True)
         self.plotLineColor = self.settings.value("PLOT/LINE_COLOR", "#0000ff")
         self.plotBackground = self.settings.value("PLOT/BACKGROUND", "#ffffff")
         self.plotGrid = self.settings.value("PLOT/GRID", False, type=bool)
@@ -499,7 +894,7 @@ class MainWindow(QMainWindow):
         self.ui.editor.setMarginsForegroundColor(QColor(self.marginColor))
         self.ui.editor.setMarginsFont(QFont(self.marginFontFamily, self.marginSizeTxt))
 
-        self.lexer = GcodeLexer()
+        self.lexer = GcodeLexer(self.document)
         self.ui.editor.setFont(
             QFont(
                 self.fontFamily,
@@ -559,6 +954,16 @@ class MainWindow(QMainWindow):
         self.settings.setValue("MACHINE_YPOS", self.yPosMach)
         self.settings.setValue("MACHINE_ZPOS", self.zPosMach)
         self.settings.setValue("LATHE_MODE", self.latheMode)
+        self.settings.setValue("BLOCK_DELETE", self.blockDelete)
+        self.settings.setValue("BLOCK_DELETE_LEVELS", self.blockDeleteLevels)
+        self.settings.setValue("ARC_TOLERANCE", self.arcTolerance)
+        self.settings.setValue("ARC_MIN_SEGMENTS", self.arcMinSegments)
+        self.settings.setValue("ARC_MAX_SEGMENTS", self.arcMaxSegments)
+        self.settings.setValue("STREAM_FILE_MB", self.streamFileMb)
+        self.settings.setValue("CACHE_MB", self.cacheMb)
+        self.settings.setValue("CHECKPOINT_INTERVAL", self.checkpointInterval)
+        self.settings.setValue("VECTORIZED_SCAN", self.vectorizedScan)
+        self.settings.setValue("COLOR_MODE", self.colorMode)
         self.settings.setValue("LINE_COLOR", self.plotLineColor)
         self.settings.setValue("BACKGROUND", self.plotBackground)
         self.settings.setValue("GRID", self.plotGrid)
@@ -607,19 +1012,63 @@ class MainWindow(QMainWindow):
             self.settings.setValue("START_POS_Y", self.pos().y())
         self.settings.endGroup()
 
+    def interpSettings(self):
+        """Collect the settings that affect parsing and toolpath expansion."""
+        return Settings(
+            arc_type=self.arc_type,
+            lathe_mode=self.latheMode,
+            x_pos_mach=self.xPosMach,
+            y_pos_mach=self.yPosMach,
+            z_pos_mach=self.zPosMach,
+            rapid_feed=self.rapidFeed,
+            arc_tolerance=self.arcTolerance,
+            arc_min_segments=self.arcMinSegments,
+            arc_max_segments=self.arcMaxSegments,
+            block_delete=(
+                tuple(int(c) for c in self.blockDeleteLevels if c.isdigit())
+                if self.blockDelete
+                else ()
+            ),
+            checkpoint_interval=self.checkpointInterval,
+        )
+
+    def exportOptions(self):
+        """Collect the export dialog preferences."""
+        return ExportOptions(
+            lang=self.lang,
+            forceAdr=self.forceAdr,
+            incrMode=self.incrMode,
+            startPgmExp=self.startPgmExp,
+            endPgmExp=self.endPgmExp,
+            safLine=self.safLine,
+            seqNum=self.seqNum,
+            seqNumStart=self.seqNumStart,
+            seqNumIncr=self.seqNumIncr,
+            seqNumSpacing=self.seqNumSpacing,
+            delim=self.delim,
+            leadingZero=self.leadingZero,
+            co=self.co,
+            ci=self.ci,
+            er=self.er,
+        )
+
     def updateStatusBar(self):
         """Update status bar with text length and cursor position."""
-        text = self.ui.editor.text()
         line, index = self.ui.editor.getCursorPosition()
-        self.chrCountLabel.setText("Length: {}".format(len(text.replace("\n", "\r\n"))))
+        self.chrCountLabel.setText("Length: {}".format(self.document.length))
         self.cursorPosLabel.setText(
-            "Ln: {}/{}, Col:{}".format(line + 1, self.ui.editor.lines(), index + 1)
+            "Ln: {}/{}, Col:{}".format(line + 1, self.document.lineCount(), index + 1)
         )
 
     def closeEvent(self, event):
         """Prompt to save and persist settings before closing the window."""
         if self.maybeSave():
             self.saveSettings()
+            self.cancelJob()
+            if self.indexWorker is not None:
+                self.indexWorker.cancelled = True
+            for thread in list(self.threads):
+                thread.wait()
             event.accept()
         else:
             event.ignore()
@@ -661,11 +1110,17 @@ class MainWindow(QMainWindow):
         self.ui.actionFront.triggered.connect(self.viewFront)
         self.ui.actionLeft.triggered.connect(self.viewLeft)
         self.ui.actionGrid.toggled.connect(self.gridChecked)
+        self.ui.actionGroupColorMode.triggered.connect(self.changeColorMode)
+        self.ui.actionLayerRapid.toggled.connect(self.showMoveLayers)
+        self.ui.actionLayerLinear.toggled.connect(self.showMoveLayers)
+        self.ui.actionLayerArc.toggled.connect(self.showMoveLayers)
+        self.ui.menuLayers.aboutToShow.connect(self.updateLayerMenu)
 
         self.ui.actionRelative_to_start.toggled.connect(self.changeArcType)
         self.ui.actionAbsolute.toggled.connect(self.changeArcType)
         self.ui.actionRadius_value.toggled.connect(self.changeArcType)
         self.ui.actionLatheMode.toggled.connect(self.changeLathe)
+        self.ui.actionBlockDelete.toggled.connect(self.changeBlockDelete)
 
         self.ui.actionStep_Backward.triggered.connect(self.backward)
         self.ui.actionPlay.toggled.connect(self.play)
@@ -673,12 +1128,15 @@ class MainWindow(QMainWindow):
         self.ui.actionStep_Forward.triggered.connect(self.forward)
 
         self.ui.editor.modificationChanged.connect(self.documentWasModified)
+        self.ui.editor.SCN_MODIFIED.connect(self.textModified)
         self.ui.editor.cursorPositionChanged.connect(self.updateStatusBar)
         self.ui.editor.setContextMenuPolicy(Qt.CustomContextMenu)
         self.ui.editor.customContextMenuRequested.connect(self.editorContextMenu)
 
         self.ui.graphicsView.setContextMenuPolicy(Qt.CustomContextMenu)
         self.ui.graphicsView.customContextMenuRequested.connect(self.plotContextMenu)
+        self.ui.graphicsView.clicked.connect(self.plotClicked)
+        self.ui.graphicsView.hovered.connect(self.plotHovered)
 
         self.ui.editor.cursorPositionChanged.connect(self.plotCurLine)
         self.ui.horizontalSlider.sliderMoved.connect(self.sliderDrag)
@@ -731,6 +1189,14 @@ class MainWindow(QMainWindow):
         self.ui.statusbar.addPermanentWidget(self.cursorPosLabel)
         self.ui.statusbar.addPermanentWidget(self.progressBar)
 
+        self.actionCancel = QAction("Cancel", self)
+        self.actionCancel.setToolTip("Cancel parsing")
+        self.actionCancel.setEnabled(False)
+        self.actionCancel.triggered.connect(self.cancelJob)
+        cancelButton = QToolButton()
+        cancelButton.setDefaultAction(self.actionCancel)
+        self.ui.statusbar.addPermanentWidget(cancelButton)
+
         self.updateStatusBar()
 
     def dragEnterEvent(self, event):
@@ -802,8 +1268,9 @@ class MainWindow(QMainWindow):
         if self.ui.actionPlay.isChecked():
             self.timer.stop()
             self.ui.actionPlay.setChecked(False)
-        if len(self.lst_block) > 1:
-            num = int(self.lst_block[self.ui.horizontalSlider.value() - 1])
+        if len(self.program.points) > 1:
+            value = self.ui.horizontalSlider.value()
+            num = self.program.point_index.block_of(value - 1)
             self.step = num
             self.ui.editor.setCursorPosition(num, 0)
 
@@ -814,8 +1281,26 @@ class MainWindow(QMainWindow):
             self.plotGrid = True
         else:
             self.plotGrid = False
+        self.loadPlot()
         self.valueHandler(val)
 
+    def colorActions(self):
+        """Return the color mode actions keyed by mode."""
+        return {
+            COLOR_SINGLE: self.ui.actionColorSingle,
+            COLOR_MOVE: self.ui.actionColorMove,
+            COLOR_FEED: self.ui.actionColorFeed,
+            COLOR_TOOL: self.ui.actionColorTool,
+            COLOR_DEPTH: self.ui.actionColorDepth,
+        }
+
+    def changeColorMode(self, action):
+        """Recolor the toolpath for the chosen color mode."""
+        for mode, modeAction in self.colorActions().items():
+            if modeAction is action:
+                self.colorMode = mode
+        self.showColors()
+
     def plotContextMenu(self, point):
         """Show context menu for plot view controls."""
         menu = QMenu()
@@ -828,6 +1313,8 @@ class MainWindow(QMainWindow):
         menu.addAction(self.ui.actionLeft)
         menu.addSeparator()
         menu.addAction(self.ui.actionGrid)
+        menu.addMenu(self.ui.menuColor_By)
+        menu.addMenu(self.ui.menuLayers)
         menu.exec(self.ui.graphicsView.mapToGlobal(point))
 
     def editorContextMenu(self, point):
@@ -848,6 +1335,9 @@ class MainWindow(QMainWindow):
             self.curFile = ""
             self.ui.editor.clear()
             self.setCurrentFile("")
+            self.cancelJob()
+            self.parsed = None
+            self.closePreview()
             self.clearPlot()
 
     def openFile(self):
@@ -881,6 +1371,15 @@ class MainWindow(QMainWindow):
         self.ui.actionRedo.setEnabled(self.ui.editor.isRedoAvailable())
         self.clearPlot()
 
+    def textModified(self, position, modificationType, text, length, linesAdded, *args):
+        """Record the lines touched by an insertion or deletion."""
+        if modificationType & (
+            QsciScintilla.SC_MOD_INSERTTEXT | QsciScintilla.SC_MOD_DELETETEXT
+        ):
+            self.document.modified(modificationType, text)
+            line = self.document.lineFromPosition(position)
+            self.dirty.mark(line, linesAdded)
+
     def maybeSave(self):
         """Ask the user to save if the document has unsaved changes."""
         if self.ui.editor.isModified():
@@ -901,6 +1400,12 @@ class MainWindow(QMainWindow):
 
     def loadFile(self, fileName):
         """Load file contents into the editor and reset cursor."""
+        if QFileInfo(fileName).size() > self.streamFileMb * 1024 * 1024:
+            self.loadPreview(fileName)
+            return
+
+        self.cancelJob()
+        self.closePreview()
         file = QFile(fileName)
         if not file.open(QFile.ReadOnly | QFile.Text):
             QMessageBox.warning(
@@ -911,11 +1416,45 @@ class MainWindow(QMainWindow):
             return
 
         inf = QTextStream(file)
+        self.parsed = None
         self.ui.editor.setText(inf.readAll())
         self.ui.editor.setCursorPosition(0, 0)
         self.setCurrentFile(fileName)
         self.changeLang(self.ui.langCombo.currentIndex())
 
+    def loadPreview(self, fileName, after=None):
+        """Stream a file too large for the editor into a thinned plot and stats."""
+        self.cancelJob()
+        self.ui.editor.clear()
+        self.ui.editor.setReadOnly(True)
+        self.setCurrentFile("")
+        self.setWindowTitle(
+            "%s (preview) - Easy G-code Plot" % self.strippedName(fileName)
+        )
+        self.clearPlot()
+        self.previewFile = fileName
+        self.previewStats = None
+        settings = self.interpSettings()
+        self.startJob(
+            lambda progress: streamPreview(fileName, settings, progress),
+            lambda result: self.showPreview(result, after),
+        )
+
+    def showPreview(self, result, after=None):
+        """Plot the thinned points of a streamed file and keep its stats."""
+        points, self.previewStats = result
+        if points is not None:
+            self.program.points = points
+            self.enablePlayback()
+        if after:
+            after()
+
+    def closePreview(self):
+        """Leave streamed preview mode and make the editor writable again."""
+        self.previewFile = ""
+        self.previewStats = None
+        self.ui.editor.setReadOnly(False)
+
     def saveFile(self, fileName):
         """Write editor contents to disk."""
         file = QFile(fileName)
@@ -968,12 +1507,7 @@ class MainWindow(QMainWindow):
             self.ui.actionTop.setEnabled(False)
             self.ui.actionFront.setEnabled(False)
             self.ui.actionLeft.setEnabled(False)
-            self.updateData()
-            self.ui.graphicsView.opts["fov"] = 0.01
-            self.ui.graphicsView.opts["rotationMethod"] = "quaternion"
-            self.ui.graphicsView.setCameraPosition(
-                distance=self.dist * 6000, rotation=QQuaternion(0.5, 0.5, 0.5, 0.5)
-            )
+            self.updateData(self.viewLathe)
         else:
             self.latheMode = False
             self.ui.action3D.setEnabled(True)
@@ -981,45 +1515,52 @@ class MainWindow(QMainWindow):
             self.ui.actionFront.setEnabled(True)
             self.ui.actionLeft.setEnabled(True)
             self.ui.graphicsView.opts["rotationMethod"] = "euler"
-            self.updateData()
-            self.view3d()
+            self.updateData(self.view3d)
+
+    def changeBlockDelete(self, checked):
+        """Toggle skipping of "/" block delete lines and re-expand the plot."""
+        self.blockDelete = checked
+        self.updateData()
+
+    def viewLathe(self):
+        """Set the fixed XZ camera used in lathe mode."""
+        self.ui.graphicsView.opts["fov"] = 0.01
+        self.ui.graphicsView.opts["rotationMethod"] = "quaternion"
+        self.ui.graphicsView.setCameraPosition(
+            distance=self.dist * 6000, rotation=QQuaternion(0.5, 0.5, 0.5, 0.5)
+        )
 
     def export(self):
         """Export current program to a chosen file path."""
         path, _ = QFileDialog.getSaveFileName()
         if path:
             val = self.ui.horizontalSlider.value()
-            self.updateData()
-            self.valueHandler(val)
-            txt = ""
-            start = time.time()
-            try:
-                txt = self.exportPgm()
-            except Exception as e:
-                # logging.exception(str(e))
-                QMessageBox.warning(self, "Easy G-code Plot", str(e))
+            self.updateData(lambda: self.exportTo(path, val))
 
-            else:
-                end = time.time()
-                self.progressBar.setValue(0)
-                print(f"Export Execution time: {(end-start)*1000:.3f} ms")
-                self.ui.statusbar.showMessage(
-                    f"Export Execution time: {(end-start)*1000:.3f} ms", 10000
-                )
-                with open(path, "w", encoding="utf-8") as f:
-                    f.write(txt)
+    def exportTo(self, path, val):
+        """Export the refreshed program to ``path`` in the background."""
+        self.valueHandler(val)
+        program = self.program
+        settings = self.interpSettings()
+        options = self.exportOptions()
+        self.startJob(
+            lambda progress: export_pgm(program, settings, options, progress),
+            lambda txt: self.writeExport(path, txt),
+        )
+
+    def writeExport(self, path, txt):
+        """Write exported program text to ``path``."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(txt)
 
     def exportPgm(self):
         """Generate the exportable program text based on parsed toolpath data."""
-        return export_pgm(self)
-
-    def floatToStr(self, val):
-        """Format numeric values to compact strings for G-code output."""
-        if val is None:
-            return ""
-        if val == 0:
-            return "0"
-        return "{:.3f}".format(val).rstrip("0").rstrip(".")
+        return export_pgm(
+            self.program,
+            self.interpSettings(),
+            self.exportOptions(),
+            self.progressBar.setValue,
+        )
 
     def runFindDlg(self):
         """Show the find/replace dialog, seeding it with the current selection."""
@@ -1080,54 +1621,7 @@ class MainWindow(QMainWindow):
     def clearPlot(self):
         """Reset all plotting data structures and UI controls."""
 
-        # clear lst for self.addmotion
-        self.x_axis = []
-        self.y_axis = []
-        self.z_axis = []
-        self.i_axis = []
-        self.j_axis = []
-        self.k_axis = []
-        self.lst_points = []
-        self.lst_block = []
-        self.lst_feed = []
-
-        # clear lst for self.convert
-        self.lstMove = []
-        self.lstCoord_X = []
-        self.lstCoord_Y = []
-        self.lstCoord_Z = []
-        self.lstX_incr = []
-        self.lstY_incr = []
-        self.lstZ_incr = []
-        self.lstCoord_I = []
-        self.lstCoord_J = []
-        self.lstCoord_K = []
-        self.lstCoord_R = []
-        self.lstCenter_X = []
-        self.lstCenter_Y = []
-        self.lstCycleDrill = []
-        self.lstCycleZ = []
-        self.lstCycleP = []
-        self.lstCycleQ = []
-        self.lstRadius = []
-        self.lstTool = []
-        self.lstSpeed = []
-        self.lstFeed = []
-        self.lstComment = []
-        self.lstPosMode = []
-        self.lstArcPlane = []
-        self.lstWcs = []
-        self.lstHomePos = []
-        self.lstCorLen = []
-        self.lstCorRad = []
-        self.lstCorH = []
-        self.lstCorD = []
-        self.lstPgmStop = []
-        self.lstSpeedCode = []
-        self.lstToolChange = []
-        self.lstCoolant = []
-        self.lstUnknownWords = []
-        self.lstProgram = []
+        self.program = Program()
 
         # reset timer
         self.timer.stop()
@@ -1150,71 +1644,201 @@ class MainWindow(QMainWindow):
         self.ui.actionPlay.setChecked(False)
         self.ui.actionPlay.setEnabled(False)
         self.ui.actionStop.setEnabled(False)
+        self.pathItem.setPath(self.program.points.pos)
+        self.marker.setVisible(False)
+        self.layerItems = []
         self.loadPlot()
 
     def valueHandler(self, value):
         """Update plot and info panes to reflect the current slider value."""
-        self.loadPlot()
         try:
-            if self.x_axis == [] or self.y_axis == [] or self.z_axis == []:
-                return
-
-            if value == 1:
-                self.loadPlot()
-                self.ui.editor.setCursorPosition(0, 0)
+            points = self.program.points
+            if len(points) == 0 or value == 1:
+                self.drawTo(0)
+                self.marker.setVisible(False)
+                if len(points):
+                    self.ui.editor.setCursorPosition(0, 0)
                 return
 
-            self.ui.lineEditX.setText(str(round(self.x_axis[value - 1], 3)))
-            self.ui.lineEditY.setText(str(round(self.y_axis[value - 1], 3)))
-            self.ui.lineEditZ.setText(str(round(self.z_axis[value - 1], 3)))
-            if self.i_axis[value - 1] == None:
-                self.ui.lineEdit_I.setText("")
-            else:
-                self.ui.lineEdit_I.setText(str(round(self.i_axis[value - 1], 3)))
-            if self.j_axis[value - 1] == None:
-                self.ui.lineEdit_J.setText("")
-            else:
-                self.ui.lineEdit_J.setText(str(round(self.j_axis[value - 1], 3)))
-            if self.k_axis[value - 1] == None:
-                self.ui.lineEdit_K.setText("")
-            else:
-                self.ui.lineEdit_K.setText(str(round(self.k_axis[value - 1], 3)))
-            if self.lst_feed[value - 1] == self.rapidFeed:
-                self.ui.lineEditFeed.setText("Rapid")
-            else:
-                self.ui.lineEditFeed.setText(str(self.lst_feed[value - 1]))
-
-            point = GLScatterPlotItem(
-                pos=(
-                    self.lst_points[value - 1][0],
-                    self.lst_points[value - 1][1],
-                    self.lst_points[value - 1][2],
-                ),
-                color=QColor(self.plotLineColor),
-                size=0.4,
-                pxMode=False,
-            )
-            point.setGLOptions("translucent")
-            self.ui.graphicsView.addItem(point)
-            drawing = GLLinePlotItem(
-                pos=self.lst_points[:value],
-                color=QColor(self.plotLineColor),
-                width=0.3,
-                antialias=True,
+            self.showPointInfo(value - 1)
+            self.marker.setData(
+                pos=points.pos[value - 1 : value], color=QColor(self.plotLineColor)
             )
-            # line = [(self.lst_points[value-1][0], self.lst_points[value-1][1],
-            #             self.lst_points[value-1][2]), (self.lst_points[value-1][0],
-            #             self.lst_points[value-1][1], self.lst_points[value-1][2] + 10)]
-            # tool = GLLinePlotItem(pos = line, color=QColor(self.plotLineColor), width = 1, antialias = True)
-            # self.ui.graphicsView.addItem(tool)
-            self.ui.graphicsView.addItem(drawing)
+            self.marker.setVisible(True)
+            self.drawTo(value)
 
         except Exception as e:
             # logging.exception(str(e))
             QMessageBox.warning(self, "Easy G-code Plot", str(e))
 
+    def showPointInfo(self, index, pos=None):
+        """Fill the info pane from point ``index``, at ``pos`` if given."""
+        points = self.program.points
+        blocks = self.program.blocks
+        if pos is None:
+            pos = points.pos[index]
+        x, y, z = pos.tolist()
+        self.ui.lineEditX.setText(str(round(x, 3)))
+        self.ui.lineEditY.setText(str(round(y, 3)))
+        self.ui.lineEditZ.setText(str(round(z, 3)))
+        num = points.block[index]
+        if points.move[index] > LINEAR and num < len(blocks):
+            self.ui.lineEdit_I.setText(str(round(float(blocks.cx[num]), 3)))
+            self.ui.lineEdit_J.setText(str(round(float(blocks.cy[num]), 3)))
+            self.ui.lineEdit_K.setText(str(round(float(blocks.cz[num]), 3)))
+        else:
+            self.ui.lineEdit_I.setText("")
+            self.ui.lineEdit_J.setText("")
+            self.ui.lineEdit_K.setText("")
+        feed = float(points.feed[index])
+        if points.move[index] == RAPID:
+            self.ui.lineEditFeed.setText("Rapid")
+        else:
+            self.ui.lineEditFeed.setText(str(feed))
+
+    def pickSegment(self, x, y):
+        """Return (segment, position) of the drawn segment under widget
+        point x, y, or None. Segment i ends at point i."""
+        points = self.program.points
+        count = self.pathItem.count
+        if count < 2 or self.segmentTree is None:
+            return None
+        view = self.ui.graphicsView
+        origin, direction = viewRay(view, x, y)
+        radius = view.pixelSize(view.opts["center"]) * PICK_PIXELS
+        hidden = self.hiddenPoints
+
+        def accept(segments):
+            drawn = segments < count
+            if hidden is not None:
+                drawn &= ~hidden[segments]
+            return drawn
+
+        hit = self.segmentTree.ray(origin, direction, radius, accept)
+        if hit is None:
+            return None
+        segment, _, s = hit
+        start, end = points.pos[segment - 1], points.pos[segment]
+        return segment, start + (end - start) * s
+
+    def plotClicked(self, x, y):
+        """Move the editor to the line of the clicked toolpath segment."""
+        hit = self.pickSegment(x, y)
+        if hit is not None:
+            num = self.program.point_index.block_of(hit[0])
+            self.step = num
+            self.ui.editor.setCursorPosition(num, 0)
+            self.ui.editor.ensureLineVisible(num)
+
+    def plotHovered(self, x, y):
+        """Show the hovered toolpath position, or the slider's point again."""
+        hit = self.pickSegment(x, y)
+        if hit is not None:
+            self.showPointInfo(*hit)
+            self.hovering = True
+        elif self.hovering:
+            self.hovering = False
+            value = self.ui.horizontalSlider.value()
+            if value > 1 and value <= len(self.program.points):
+                self.showPointInfo(value - 1)
+
+    def drawTo(self, count):
+        """Draw the toolpath up to point ``count`` in every shown item."""
+        self.pathItem.setCount(count)
+        for layer, item in enumerate(self.layerItems):
+            if item.visible():
+                item.setCount(2 * self.program.layers.drawn(layer, count))
+
+    def showPath(self):
+        """Upload the program's toolpath into the persistent line item."""
+        for item in self.layerItems:
+            self.ui.graphicsView.removeItem(item)
+        self.layerItems = []
+        self.pathItem.setPath(self.program.points.pos)
+        self.segmentTree = None
+        self.showLayers()
+        self.indexPlot()
+
+    def buildLayers(self):
+        """Upload one "lines" item per tool and move type layer."""
+        for ends in self.program.layers.ends:
+            pairs = np.empty(2 * len(ends), np.int64)
+            pairs[0::2] = ends - 1
+            pairs[1::2] = ends
+            item = ToolpathItem(mode="lines", width=0.3, antialias=True)
+            item.setPath(self.program.points.pos, pairs)
+            self.layerItems.append(item)
+            self.ui.graphicsView.addItem(item)
+
+    def showLayers(self):
+        """Show the whole toolpath, or only the layers that are not hidden."""
+        hiding = bool(self.hiddenTools or self.hiddenMoves)
+        if hiding and not self.layerItems and len(self.program.points) > 1:
+            self.buildLayers()
+        self.hiddenPoints = None
+        if hiding and len(self.program.points):
+            # end points of the hidden segments, which cannot be picked
+            self.hiddenPoints = np.zeros(len(self.program.points), np.bool_)
+            layers = self.program.layers
+            for (tool, move), ends in zip(layers.keys, layers.ends):
+                if tool in self.hiddenTools or move in self.hiddenMoves:
+                    self.hiddenPoints[ends] = True
+        for (tool, move), item in zip(self.program.layers.keys, self.layerItems):
+            item.setVisible(
+                hiding and tool not in self.hiddenTools and move not in self.hiddenMoves
+            )
+        self.pathItem.setVisible(not hiding)
+        self.showColors()
+        self.valueHandler(self.ui.horizontalSlider.value())
+
+    def showColors(self):
+        """Color the toolpath by the color mode; only colors are uploaded."""
+        colors = point_colors(self.program, self.colorMode)
+        if colors is None:
+            colors = QColor(self.plotLineColor)
+        self.pathItem.setPointColors(colors)
+        for item in self.layerItems:
+            item.setPointColors(colors)
+
+    def updateLayerMenu(self):
+        """List a show/hide action for every tool of the program."""
+        for action in self.toolLayerActions:
+            self.ui.menuLayers.removeAction(action)
+        self.toolLayerActions = []
+        if not len(self.program.points):
+            return
+        for tool in self.program.layers.tools():
+            action = self.ui.menuLayers.addAction("T{}".format(tool))
+            action.setCheckable(True)
+            action.setChecked(tool not in self.hiddenTools)
+            action.toggled.connect(
+                lambda checked, tool=tool: self.showToolLayer(tool, checked)
+            )
+            self.toolLayerActions.append(action)
+
+    def showToolLayer(self, tool, checked):
+        """Show or hide the segments cut with ``tool``."""
+        if checked:
+            self.hiddenTools.discard(tool)
+        else:
+            self.hiddenTools.add(tool)
+        self.showLayers()
+
+    def showMoveLayers(self):
+        """Show or hide rapids, linear moves and arcs from the layer actions."""
+        self.hiddenMoves = {
+            move
+            for move, action in (
+                (RAPID, self.ui.actionLayerRapid),
+                (LINEAR, self.ui.actionLayerLinear),
+                (ARC_CW, self.ui.actionLayerArc),
+            )
+            if not action.isChecked()
+        }
+        self.showLayers()
+
     def loadPlot(self):
-        """Redraw axes, background, and optional grid before plotting points."""
+        """Rebuild axes, background and optional grid around the toolpath items."""
         self.ui.graphicsView.clear()
         self.ui.graphicsView.setBackgroundColor(self.plotBackground)
         line1 = [(0, 0, 0), (5, 0, 0)]
@@ -1245,6 +1869,10 @@ class MainWindow(QMainWindow):
         self.ui.graphicsView.addItem(axisX)
         self.ui.graphicsView.addItem(axisY)
         self.ui.graphicsView.addItem(axisZ)
+        self.ui.graphicsView.addItem(self.marker)
+        self.ui.graphicsView.addItem(self.pathItem)
+        for item in self.layerItems:
+            self.ui.graphicsView.addItem(item)
 
     def plotCurLine(self):
         """Sync slider position with the current editor cursor line."""
@@ -1252,29 +1880,220 @@ class MainWindow(QMainWindow):
         if num == 0:
             self.ui.horizontalSlider.setValue(1)
         else:
-            idx = self.list_rindex(self.lst_block, num)
+            idx = self.program.point_index.last_point(num)
             if idx:
                 self.ui.horizontalSlider.setValue(idx + 1)
 
-    def list_rindex(self, li, x):
-        """Return the last index of x in list li."""
-        for i in reversed(range(len(li))):
-            if li[i] == x:
-                return i
-
-    def updateData(self):
-        """Parse code, rebuild motion arrays, and refresh controls."""
-        res = self.checkCode()
-        if res:
-            self.addMotion()
-            self.calcDist()
-            self.ui.actionStep_Backward.setEnabled(True)
-            self.ui.actionStep_Forward.setEnabled(True)
-            self.ui.actionPlay.setEnabled(True)
-            self.ui.actionStop.setEnabled(True)
-            self.ui.horizontalSlider.setMaximum(len(self.lst_block))
-            self.ui.horizontalSlider.setMinimum(1)
-            self.ui.horizontalSlider.setPageStep(int(len(self.lst_block) / 10))
+    def updateData(self, after=None):
+        """Parse code in the background, then refresh plot controls.
+
+        ``after`` is called once the new program is shown.
+        """
+        # a cancelled reparse took the edited range with it
+        self.cancelJob()
+        if self.previewFile:
+            self.loadPreview(self.previewFile, after)
+            return
+        self.clearPlot()
+        self.startJob(self.parseJob(), lambda result: self.showProgram(result, after))
+
+    def parseJob(self):
+        """Snapshot the editor and return a job that parses and expands it.
+
+        Only the edited lines are reparsed when the last expanded program
+        was built with the same settings.
+        """
+        settings = self.interpSettings()
+        parsed = self.parsed if self.parsedSettings == settings else None
+        vectorized = self.vectorizedScan
+        if (
+            parsed is None
+            and self.parsed is not None
+            and not self.dirty
+            and replace(self.parsedSettings, block_delete=settings.block_delete)
+            == settings
+        ):
+            # only block delete changed: expand the parsed blocks again
+            source = self.parsed
+
+            def job(progress):
+                program = reexpand(source, settings, progress)
+                program.points = program.path.tessellate()
+                return program, settings, True
+
+            return job
+
+        if parsed is not None:
+            if not self.dirty:
+                return lambda progress: (parsed, settings, True)
+            first = self.dirty.first
+            old_last = self.dirty.old_last
+            lines = self.dirtyText()
+            self.dirty.clear()
+
+            def job(progress):
+                program = reparse(parsed, settings, first, old_last, lines)
+                return program, settings, True
+
+            return job
+
+        text = self.ui.editor.text()
+        self.dirty.clear()
+        cache = self.parseCache
+
+        def job(progress):
+            program = None
+            if cache is not None:
+                program = cache.load(text, settings)
+            if program is None:
+                program = parse_text(text, settings, progress, vectorized)
+                if not has_motion(program):
+                    return program, settings, False
+                expand(program, settings, progress)
+                if cache is not None:
+                    try:
+                        cache.store(text, settings, program)
+                    except OSError as e:
+                        print(f"Parse cache not written: {e}")
+            # tessellate the arcs here rather than on the GUI thread
+            program.points = program.path.tessellate()
+            return program, settings, True
+
+        return job
+
+    def showProgram(self, result, after=None):
+        """Swap in a parsed program and enable playback if it moves."""
+        program, settings, expanded = result
+        self.program = program
+        if expanded:
+            self.parsed = program
+            self.parsedSettings = settings
+        if has_motion(program):
+            self.enablePlayback()
+        if after:
+            after()
+
+    def startJob(self, job, onDone):
+        """Run ``job`` on a background thread, replacing any running job.
+
+        ``onDone`` receives the result on the GUI thread; results of
+        cancelled or replaced jobs are dropped.
+        """
+        self.cancelJob()
+        thread = QThread(self)
+        worker = Worker(job, onDone)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self.jobProgress)
+        worker.done.connect(self.jobDone)
+        worker.failed.connect(self.jobFailed)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(self.threadFinished)
+        self.threads[thread] = worker
+        self.worker = worker
+        self.jobStart = time.time()
+        self.actionCancel.setEnabled(True)
+        thread.start()
+
+    def indexPlot(self):
+        """Build the level-of-detail pyramid and the segment tree of the shown
+        toolpath on a background thread; until it is done the full path is
+        drawn and clicks pick nothing."""
+        if self.indexWorker is not None:
+            self.indexWorker.cancelled = True
+        program = self.program
+
+        def job(progress):
+            progress(0)
+            lod = program.lod
+            progress(50)
+            return program, lod, program.segment_tree
+
+        thread = QThread(self)
+        worker = Worker(job, None)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.done.connect(self.plotIndexed)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(self.threadFinished)
+        self.threads[thread] = worker
+        self.indexWorker = worker
+        thread.start()
+
+    def plotIndexed(self, result):
+        """Switch the toolpath to the decimated levels of a finished index job
+        and pick segments with its tree."""
+        if self.sender() is not self.indexWorker:
+            return
+        self.indexWorker = None
+        program, lod, tree = result
+        if program is not self.program:
+            return
+        self.pathItem.setLevels(program.points.pos, lod)
+        self.segmentTree = tree
+        self.pathItem.setCount(self.pathItem.count)
+
+    def cancelJob(self):
+        """Cancel the running background job, if any."""
+        if self.worker is None:
+            return
+        self.worker.cancelled = True
+        self.endJob()
+        # the job may have taken the edited line range with it
+        self.parsed = None
+
+    def endJob(self):
+        """Forget the running job and reset its progress display."""
+        self.worker = None
+        self.actionCancel.setEnabled(False)
+        self.progressBar.setValue(0)
+
+    def jobProgress(self, percent):
+        """Show progress of the running job."""
+        if self.sender() is self.worker:
+            self.progressBar.setValue(percent)
+
+    def jobDone(self, result):
+        """Hand a finished job's result to its callback."""
+        worker = self.sender()
+        if worker is not self.worker:
+            return
+        self.endJob()
+        end = time.time()
+        print(f"Job Execution time: {(end-self.jobStart)*1000:.3f} ms")
+        self.ui.statusbar.showMessage(
+            f"Job Execution time: {(end-self.jobStart)*1000:.3f} ms", 10000
+        )
+        worker.onDone(result)
+
+    def jobFailed(self, message):
+        """Report a failed job."""
+        if self.sender() is not self.worker:
+            return
+        self.endJob()
+        self.parsed = None
+        # logging.exception(message)
+        QMessageBox.warning(self, "Easy G-code Plot", message)
+
+    def threadFinished(self):
+        """Release a finished job thread."""
+        thread = self.sender()
+        worker = self.threads.pop(thread, None)
+        if worker is not None:
+            worker.deleteLater()
+        thread.deleteLater()
+
+    def enablePlayback(self):
+        """Fit the view to the toolpath and enable the playback controls."""
+        self.calcDist()
+        self.ui.actionStep_Backward.setEnabled(True)
+        self.ui.actionStep_Forward.setEnabled(True)
+        self.ui.actionPlay.setEnabled(True)
+        self.ui.actionStop.setEnabled(True)
+        self.ui.horizontalSlider.setMaximum(len(self.program.points))
+        self.ui.horizontalSlider.setMinimum(1)
+        self.ui.horizontalSlider.setPageStep(int(len(self.program.points) / 10))
+        self.showPath()
 
     def setView(self, fov, elevation, azimuth, use_calc_dist=True, dist_scale=6000):
         """Set camera view with optional distance recalculation."""
@@ -1304,870 +2123,27 @@ class MainWindow(QMainWindow):
         """Switch camera to a left orthographic view."""
         self.setView(0.01, 0, 180)
 
-    def checkCode(self):
-        """Run G-code conversion and verify that motion exists."""
-        start = time.time()
-        self.convert()
-        end = time.time()
-        print(f"Сonvert Execution time: {(end-start)*1000:.3f} ms")
-        lst_convert = list(zip(self.lstCoord_X, self.lstCoord_Y, self.lstCoord_Z))
-        length = 0
-        for i in range(len(lst_convert)):
-            if i == 0:
-                continue
-            length = length + sqrt(
-                (lst_convert[i][0] - lst_convert[i - 1][0]) ** 2
-                + (lst_convert[i][1] - lst_convert[i - 1][1]) ** 2
-                + (lst_convert[i][2] - lst_convert[i - 1][2]) ** 2
-            )
-            if length > 0:
-                return True
-
-        return False
-
-    def convert(self):
-        """Parse raw editor G-code into structured motion lists."""
-        self.clearPlot()
-        text = self.ui.editor.text().upper()
-        lines = text.splitlines(True)
-
-        prevMove = 0
-        prevTool = 0
-        prevSpeed = 0
-        prevFeed = 0
-        prevCorRad = 40
-        prevCorD = 0
-        prevPosMode = 90
-        if self.latheMode:
-            prevArcPlane = 18
-        else:
-            prevArcPlane = 17
-        prev_g81 = 80
-        Z_cycle = 0
-        prevQ = 0
-        prevP = 0
-        CoordX_abs = self.xPosMach
-        CoordY_abs = self.yPosMach
-        CoordZ_abs = self.zPosMach
-        prevCoordI = None
-        prevCoordJ = None
-        prevCoordK = None
-        prevCoordR = None
-        homePos = 0
-
-        for i, line in enumerate(lines):
-
-            self.progressBar.setValue(int((i * 100) / len(lines)))
-
-            comment = "".join(re.findall(r"\(.*?\)", line))
-            if comment:
-                self.lstComment.append(comment.replace("(", "").replace(")", ""))
-                line = line.replace(comment, "")
-            else:
-                self.lstComment.append(None)
-
-            move = "".join(re.findall(r"G0?[0-3](?=\D)", line))
-            coordX = "".join(re.findall(r"X[-+]?[0-9]*\.?[0-9]+", line))
-            coordY = "".join(re.findall(r"Y[-+]?[0-9]*\.?[0-9]+", line))
-            coordZ = "".join(re.findall(r"Z[-+]?[0-9]*\.?[0-9]+", line))
-            coordI = "".join(re.findall(r"I[-+]?[0-9]*\.?[0-9]+", line))
-            coordJ = "".join(re.findall(r"J[-+]?[0-9]*\.?[0-9]+", line))
-            coordK = "".join(re.findall(r"K[-+]?[0-9]*\.?[0-9]+", line))
-            coordR = "".join(re.findall(r"R[-+]?[0-9]*\.?[0-9]+", line))
-            tool = "".join(re.findall(r"T[0-9]{1,4}", line))
-            speed = "".join(re.findall(r"S[0-9]{1,5}", line))
-            feed = "".join(re.findall(r"F[0-9]*\.?[0-9]+", line))
-            posMode = "".join(re.findall(r"G9[0,1](?=\D)", line))
-            arcPlane = "".join(re.findall(r"G1[7-9](?=\D)", line))
-            wcs = "".join(re.findall(r"G5[4-9](?=\D)", line))
-            g81 = "".join(re.findall(r"G8[0-4](?=\D)", line))
-            P_cycle = "".join(re.findall(r"P[-+]?[0-9]*\.?[0-9]+", line))
-            Q_cycle = "".join(re.findall(r"Q[-+]?[0-9]*\.?[0-9]+", line))
-            corLen = "".join(re.findall(r"G43(?=\D)", line))
-            corRad = "".join(re.findall(r"G4[0-2](?=\D)", line))
-            corH = "".join(re.findall(r"H[0-9]{1,4}", line))
-            corD = "".join(re.findall(r"D[0-9]{1,4}", line))
-            toolchange = "".join(re.findall(r"M0?6(?=\D)", line))
-            stopPgrm = "".join(re.findall(r"M0?[0,1](?=\D)", line))
-            spindelCode = "".join(re.findall(r"M0?[3-5](?=\D)", line))
-            coolant = "".join(re.findall(r"M0?[7-9](?=\D)", line))
-            homePosLine = "".join(re.findall(r"G28.*", line))
-
-            if homePosLine:
-                xHomeCoord = "".join(
-                    re.findall(r"[X][-+]?[0-9]*\.?[0-9]+", homePosLine)
-                )
-                yHomeCoord = "".join(
-                    re.findall(r"[Y][-+]?[0-9]*\.?[0-9]+", homePosLine)
-                )
-                zHomeCoord = "".join(
-                    re.findall(r"[Z][-+]?[0-9]*\.?[0-9]+", homePosLine)
-                )
-
-                if xHomeCoord:
-                    # G28X0 - 1
-                    homePos = 1
-                    if yHomeCoord:
-                        # G28X0Y0 - 4
-                        homePos = 4
-                        if zHomeCoord:
-                            # G28X0Y0Z0 - 7
-                            homePos = 7
-                    elif zHomeCoord:
-                        # G28X0Z0 - 5
-                        homePos = 5
-                elif yHomeCoord:
-                    # G28Y0 - 2
-                    homePos = 2
-                    if zHomeCoord:
-                        # G28Y0Z0 - 6
-                        homePos = 6
-                elif zHomeCoord:
-                    # G28Z0 - 3
-                    homePos = 3
-                else:
-                    homePos = 0
-                if homePos != 0:
-                    self.lstHomePos.append(homePos)
-                else:
-                    self.lstHomePos.append(None)
-            else:
-                homePos = 0
-                self.lstHomePos.append(None)
-
-            line1 = (
-                move
-                + arcPlane
-                + posMode
-                + coordX
-                + coordY
-                + coordZ
-                + coordI
-                + coordJ
-                + coordK
-                + coordR
-                + tool
-                + speed
-                + feed
-                + comment
-                + stopPgrm
-                + spindelCode
-                + toolchange
-                + coolant
-                + wcs
-                + corLen
-                + corRad
-                + corH
-                + corD
-                + g81
-                + Q_cycle
-                + P_cycle
-            )
-
-            if line1 == "":
-                self.lstUnknownWords.append(line)
-            else:
-                self.lstUnknownWords.append(None)
-
-            if toolchange:
-                self.lstToolChange.append(int(toolchange.replace("M", "")))
-            else:
-                self.lstToolChange.append(None)
-
-            if g81:
-                prev_g81 = int(g81.replace("G", ""))
-                prevMove = 0
-            self.lstCycleDrill.append(prev_g81)
-
-            if move and prev_g81 == 80:
-                prevMove = int(move.replace("G", ""))
-            self.lstMove.append(prevMove)
-
-            if posMode:
-                prevPosMode = int(posMode.replace("G", ""))
-            self.lstPosMode.append(prevPosMode)
-
-            if arcPlane:
-                prevArcPlane = int(arcPlane.replace("G", ""))
-            self.lstArcPlane.append(prevArcPlane)
-
-            if coordX:
-                if prevPosMode == 90:
-                    CoordX_abs = float(coordX.replace("X", ""))
-                else:
-                    if homePos == 0:
-                        CoordX_abs = CoordX_abs + float(coordX.replace("X", ""))
-                    elif homePos == 1 or homePos == 4 or homePos == 5 or homePos == 7:
-                        CoordX_abs = self.xPosMach
-                self.lstCoord_X.append(CoordX_abs)
-            else:
-                self.lstCoord_X.append(CoordX_abs)
-
-            if coordY:
-                if prevPosMode == 90:
-                    CoordY_abs = float(coordY.replace("Y", ""))
-                else:
-                    if homePos == 0:
-                        CoordY_abs = CoordY_abs + float(coordY.replace("Y", ""))
-                    elif homePos == 2 or homePos == 4 or homePos > 5:
-                        CoordY_abs = self.yPosMach
-                self.lstCoord_Y.append(CoordY_abs)
-            else:
-                self.lstCoord_Y.append(CoordY_abs)
-
-            if coordZ:
-                if prevPosMode == 90:
-                    if prev_g81 == 80:
-                        CoordZ_abs = float(coordZ.replace("Z", ""))
-                        Z_cycle = 0
-                    else:
-                        Z_cycle = float(coordZ.replace("Z", ""))
-                else:
-                    if prev_g81 == 80:
-                        CoordZ_abs = CoordZ_abs + float(coordZ.replace("Z", ""))
-                        Z_cycle = 0
-                    else:
-                        Z_cycle = Z_cycle + float(coordZ.replace("Z", ""))
-
-                    if homePos == 3 or homePos > 4:
-                        CoordZ_abs = self.zPosMach
-
-                self.lstCoord_Z.append(CoordZ_abs)
-                self.lstCycleZ.append(Z_cycle)
-            else:
-                if prev_g81 == 80:
-                    Z_cycle = 0
-                self.lstCoord_Z.append(CoordZ_abs)
-                self.lstCycleZ.append(Z_cycle)
-
-            if coordI:
-                prevCoordI = float(coordI.replace("I", ""))
-            else:
-                prevCoordI = None
-            self.lstCoord_I.append(prevCoordI)
-
-            if coordJ:
-                prevCoordJ = float(coordJ.replace("J", ""))
-            else:
-                prevCoordJ = None
-            self.lstCoord_J.append(prevCoordJ)
-
-            if coordK:
-                prevCoordK = float(coordK.replace("K", ""))
-            else:
-                prevCoordK = None
-            self.lstCoord_K.append(prevCoordK)
-
-            if coordR:
-                prevCoordR = float(coordR.replace("R", ""))
-            else:
-                if prev_g81 == 80:
-                    prevCoordR = None
-            self.lstCoord_R.append(prevCoordR)
-
-            if P_cycle:
-                prevP = float(P_cycle.replace("P", ""))
-            else:
-                if prev_g81 < 82 or prev_g81 > 83:
-                    prevP = None
-            self.lstCycleP.append(prevP)
-
-            if Q_cycle:
-                prevQ = float(Q_cycle.replace("Q", ""))
-            else:
-                if prev_g81 != 83:
-                    prevQ = None
-            self.lstCycleQ.append(prevQ)
-
-            if tool:
-                prevTool = int(tool.replace("T", ""))
-            self.lstTool.append(prevTool)
-
-            if speed:
-                prevSpeed = int(speed.replace("S", ""))
-            self.lstSpeed.append(prevSpeed)
-
-            if feed:
-                prevFeed = float(feed.replace("F", ""))
-            self.lstFeed.append(prevFeed)
-
-            if wcs:
-                self.lstWcs.append(int(wcs.replace("G", "")))
-            else:
-                self.lstWcs.append(None)
-
-            if corLen:
-                self.lstCorLen.append(int(corLen.replace("G", "")))
-            else:
-                self.lstCorLen.append(None)
-
-            if corH:
-                self.lstCorH.append(int(corH.replace("H", "")))
-            else:
-                self.lstCorH.append(None)
-
-            if corRad:
-                prevCorRad = int(corRad.replace("G", ""))
-            self.lstCorRad.append(prevCorRad)
-
-            if corD:
-                prevCorD = int(corD.replace("D", ""))
-            self.lstCorD.append(prevCorD)
-
-            if stopPgrm:
-                self.lstPgmStop.append(int(stopPgrm.replace("M", "")))
-            else:
-                self.lstPgmStop.append(None)
-
-            if spindelCode:
-                self.lstSpeedCode.append(int(spindelCode.replace("M", "")))
-            else:
-                self.lstSpeedCode.append(None)
-
-            if coolant:
-                self.lstCoolant.append(int(coolant.replace("M", "")))
-            else:
-                self.lstCoolant.append(None)
-
-        self.progressBar.setValue(0)
-
-    def circular(self, move, plane, x1, y1, z1, i, j, x2, y2, z2, r, f, num):
-        """Generate interpolated circular/helix points for plotting."""
-        lst = []
-        xc = x1
-        yc = y1
-        radius = 0
-        if self.arc_type == 1:
-            xc = x1 + i
-            yc = y1 + j
-            radius = sqrt((x1 - xc) ** 2 + (y1 - yc) ** 2)
-        elif self.arc_type == 2:
-            xc = i
-            yc = j
-            radius = sqrt((x1 - xc) ** 2 + (y1 - yc) ** 2)
-        elif self.arc_type == 3:
-            if r == 0:
-                return []
-            d = sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
-            h = sqrt(r**2 - (d / 2) ** 2)
-            radius = abs(r)
-            if r > 0:
-                if move == 2:
-                    xc = x1 + (x2 - x1) / 2 + h * (y2 - y1) / d
-                    yc = y1 + (y2 - y1) / 2 - h * (x2 - x1) / d
-                else:
-                    xc = x1 + (x2 - x1) / 2 - h * (y2 - y1) / d
-                    yc = y1 + (y2 - y1) / 2 + h * (x2 - x1) / d
-            elif r < 0:
-                if move == 2:
-                    xc = x1 + (x2 - x1) / 2 - h * (y2 - y1) / d
-                    yc = y1 + (y2 - y1) / 2 + h * (x2 - x1) / d
-                else:
-                    xc = x1 + (x2 - x1) / 2 + h * (y2 - y1) / d
-                    yc = y1 + (y2 - y1) / 2 - h * (x2 - x1) / d
-        else:
-            return []
-
-        k = (z2 or 0) - (z1 or 0)
-        zc = z1
-
-        v0 = (xc - x1, yc - y1)
-        v1 = (xc - x2, yc - y2)
-        v2 = (0 - radius, 0)
-
-        startAngle = atan2(v0[1], v0[0]) - atan2(v2[1], v2[0])
-        angle = atan2(v1[1], v1[0]) - atan2(v0[1], v0[0])
-
-        if startAngle < 0:
-            startAngle = startAngle + 2 * pi
-
-        if move == 2:
-            angle = atan2(v0[1], v0[0]) - atan2(v1[1], v1[0])
-        else:
-            angle = atan2(v1[1], v1[0]) - atan2(v0[1], v0[0])
-
-        if angle <= 0:
-            angle = angle + 2 * pi
-
-        # tolerance = 2 * pi/points
-        points = (angle * 314) / (2 * pi)
-        step = k / points
-        points = int(points)
-
-        if move == 2:
-            angle = -1 * abs(angle)
-
-        for point in range(1, points):
-            delta = point * angle / points
-            x = xc + radius * cos(startAngle + delta)
-            y = yc + radius * sin(startAngle + delta)
-            z = z1 + step * point
-            if plane == 17:
-                lst.append([x, y, z, xc, yc, zc, xc, yc, f, num])
-            elif plane == 18:
-                lst.append([x, z, y, xc, zc, yc, xc, yc, f, num])
-            elif plane == 19:
-                lst.append([z, x, y, zc, xc, yc, xc, yc, f, num])
-
-        if plane == 17:
-            lst.append([x2, y2, z2, xc, yc, zc, xc, yc, f, num])
-        elif plane == 18:
-            lst.append([x2, z2, y2, xc, zc, yc, xc, yc, f, num])
-        elif plane == 19:
-            lst.append([z2, x2, y2, zc, xc, yc, xc, yc, f, num])
-
-        return lst
-
-    def calcTime(self):
-        """Calculate path lengths and estimated time from toolpath data."""
-        self.lst_toolpath = []
-        self.lst_toolpathTime = []
-        lst = list(zip(self.x_axis, self.y_axis, self.z_axis, self.lst_feed))
-
-        for i in range(len(lst)):
-            if i == 0:
-                continue
-
-            segment_time = 0
-            length = 0
-            f = lst[i][3]
-            length = sqrt(
-                (lst[i][0] - lst[i - 1][0]) ** 2
-                + (lst[i][1] - lst[i - 1][1]) ** 2
-                + (lst[i][2] - lst[i - 1][2]) ** 2
-            )
-            if f > 0:
-                segment_time = length / f
-
-            self.lst_toolpath.append(length)
-            self.lst_toolpathTime.append(segment_time)
-
-        if len(lst) != 0:
-            return True
-        else:
-            return False
-
-    def addValues(self, x, y, z, i, j, k, xc, yc, f, num):
-        """Add a single motion point and accompanying metadata."""
-        self.x_axis.append(x)
-        self.y_axis.append(y)
-        self.z_axis.append(z)
-        self.i_axis.append(i)
-        self.j_axis.append(j)
-        self.k_axis.append(k)
-        self.lstCenter_X.append(xc)
-        self.lstCenter_Y.append(yc)
-        self.lst_feed.append(f)
-        self.lst_block.append(num)
-
-    def cycleDrill(self, cycle, posMode, x, y, z, r, z_cycle, q, feed, i):
-        """Expand drilling cycles into discrete motion points."""
-        if cycle > 80:
-            if posMode == 90:
-                z_ref = r
-                z_end = z_cycle
-            else:
-                z_ref = z + r
-                z_end = z + z_cycle
-
-            if cycle == 83 and q != 0:
-                z_cycle = z_ref
-                ost = abs(z_end - z_ref) % q
-
-                if ost > 0:
-                    numbers = int(abs(z_end - z_ref) // q)
-                else:
-                    numbers = int(abs(z_end - z_ref) / q) - 1
-
-                self.addValues(x, y, z, None, None, None, None, None, self.rapidFeed, i)
-
-                for num in range(numbers):
-                    z_cycle = z_cycle - q
-
-                    self.addValues(
-                        x, y, z_ref, None, None, None, None, None, self.rapidFeed, i
-                    )
-
-                    if num == 0:
-                        self.addValues(
-                            x, y, z_cycle, None, None, None, None, None, feed, i
-                        )
-                        self.addValues(
-                            x, y, z_ref, None, None, None, None, None, self.rapidFeed, i
-                        )
-                    else:
-                        self.addValues(
-                            x,
-                            y,
-                            z_cycle + q,
-                            None,
-                            None,
-                            None,
-                            None,
-                            None,
-                            self.rapidFeed,
-                            i,
-                        )
-                        self.addValues(
-                            x, y, z_cycle, None, None, None, None, None, feed, i
-                        )
-                        self.addValues(
-                            x, y, z_ref, None, None, None, None, None, self.rapidFeed, i
-                        )
-
-                self.addValues(
-                    x, y, z_cycle, None, None, None, None, None, self.rapidFeed, i
-                )
-                self.addValues(x, y, z_end, None, None, None, None, None, feed, i)
-
-            else:
-                self.addValues(x, y, z, None, None, None, None, None, self.rapidFeed, i)
-                self.addValues(
-                    x, y, z_ref, None, None, None, None, None, self.rapidFeed, i
-                )
-                self.addValues(x, y, z_end, None, None, None, None, None, feed, i)
-
-    def addMotion(self):
-        """Populate plotting arrays based on parsed moves and feed values."""
-        text = self.ui.editor.text().upper()
-        lst_pgm = text.splitlines(True)
-        try:
-            start = time.time()
-
-            for i in range(len(self.lstMove)):
-
-                self.progressBar.setValue(int((i * 100) / len(self.lstMove)))
-
-                m30 = "".join(re.findall(r"M30", lst_pgm[i]))
-                m2 = "".join(re.findall(r"M[0]?2(?=\D)", lst_pgm[i]))
-                blockskip = "".join(re.findall(r"^\/.*", lst_pgm[i]))
-
-                if m30 or m2:
-                    break
-
-                if blockskip:
-                    continue
-
-                if self.latheMode:
-                    scale = 0.5
-                    feed = self.lstFeed[i] * self.lstSpeed[i]
-                else:
-                    scale = 1
-                    feed = self.lstFeed[i]
-
-                if i > 0:
-                    prev_x = self.lstCoord_X[i - 1] * scale
-                    prev_y = self.lstCoord_Y[i - 1]
-                    prev_z = self.lstCoord_Z[i - 1]
-                else:
-                    prev_x = 0
-                    prev_y = 0
-                    prev_z = 0
-
-                x = self.lstCoord_X[i] * scale
-                y = self.lstCoord_Y[i]
-                z = self.lstCoord_Z[i]
-
-                if self.lstCoord_I[i] != None:
-                    cx = self.lstCoord_I[i]
-                else:
-                    cx = 0
-
-                if self.lstCoord_J[i] != None:
-                    cy = self.lstCoord_J[i]
-                else:
-                    cy = 0
-
-                if self.lstCoord_K[i] != None:
-                    cz = self.lstCoord_K[i]
-                else:
-                    cz = 0
-
-                if self.lstCoord_R[i] != None:
-                    adr_R = self.lstCoord_R[i]
-                else:
-                    adr_R = 0
-
-                if self.lstCycleQ[i] != None:
-                    q = self.lstCycleQ[i]
-                else:
-                    q = 0
-
-                self.lstX_incr.append(x - prev_x)
-                self.lstY_incr.append(y - prev_y)
-                self.lstZ_incr.append(z - prev_z)
-
-                if self.lstMove[i] == 0:
-                    if self.lstCycleDrill[i] > 80:
-                        self.cycleDrill(
-                            self.lstCycleDrill[i],
-                            self.lstPosMode[i],
-                            x,
-                            y,
-                            z,
-                            adr_R,
-                            self.lstCycleZ[i],
-                            q,
-                            feed,
-                            i,
-                        )
-
-                    self.addValues(
-                        x, y, z, None, None, None, None, None, self.rapidFeed, i
-                    )
-
-                elif self.lstMove[i] == 1:
-                    self.addValues(x, y, z, None, None, None, None, None, feed, i)
-
-                elif self.lstMove[i] > 1:
-
-                    lst = []
-                    if self.lstMove[i] == 2:
-                        if self.lstArcPlane[i] == 17:
-                            lst = self.circular(
-                                2,
-                                17,
-                                prev_x,
-                                prev_y,
-                                prev_z,
-                                cx,
-                                cy,
-                                x,
-                                y,
-                                z,
-                                adr_R,
-                                feed,
-                                i,
-                            )
-                        elif self.lstArcPlane[i] == 18:
-                            lst = self.circular(
-                                3,
-                                18,
-                                prev_x,
-                                prev_z,
-                                prev_y,
-                                cx,
-                                cz,
-                                x,
-                                z,
-                                y,
-                                adr_R,
-                                feed,
-                                i,
-                            )
-                        elif self.lstArcPlane[i] == 19:
-                            lst = self.circular(
-                                2,
-                                19,
-                                prev_y,
-                                prev_z,
-                                prev_x,
-                                cy,
-                                cz,
-                                y,
-                                z,
-                                x,
-                                adr_R,
-                                feed,
-                                i,
-                            )
-                    elif self.lstMove[i] == 3:
-                        if self.lstArcPlane[i] == 17:
-                            lst = self.circular(
-                                3,
-                                17,
-                                prev_x,
-                                prev_y,
-                                prev_z,
-                                cx,
-                                cy,
-                                x,
-                                y,
-                                z,
-                                adr_R,
-                                feed,
-                                i,
-                            )
-                        elif self.lstArcPlane[i] == 18:
-                            lst = self.circular(
-                                2,
-                                18,
-                                prev_x,
-                                prev_z,
-                                prev_y,
-                                cx,
-                                cz,
-                                x,
-                                z,
-                                y,
-                                adr_R,
-                                feed,
-                                i,
-                            )
-                        elif self.lstArcPlane[i] == 19:
-                            lst = self.circular(
-                                3,
-                                19,
-                                prev_y,
-                                prev_z,
-                                prev_x,
-                                cy,
-                                cz,
-                                y,
-                                z,
-                                x,
-                                adr_R,
-                                feed,
-                                i,
-                            )
-                    if not lst:
-                        continue
-
-                    l = list(zip(*lst))
-                    self.x_axis.extend(l[0])
-                    self.y_axis.extend(l[1])
-                    self.z_axis.extend(l[2])
-                    self.i_axis.extend(l[3])
-                    self.j_axis.extend(l[4])
-                    self.k_axis.extend(l[5])
-                    self.lstCenter_X.extend(l[6])
-                    self.lstCenter_Y.extend(l[7])
-                    self.lst_feed.extend(l[8])
-                    self.lst_block.extend(l[9])
-
-        except Exception as e:
-            # logging.exception(str(e))
-            QMessageBox.warning(self, "Easy G-code Plot", str(e))
-
-        else:
-            end = time.time()
-            self.progressBar.setValue(0)
-            print(f"Сycle Execution time: {(end-start)*1000:.3f} ms")
-            self.ui.statusbar.showMessage(
-                f"Сycle Execution time: {(end-start)*1000:.3f} ms", 10000
-            )
-
-            self.lst_points = list(zip(self.x_axis, self.y_axis, self.z_axis))
-
-    def lstExport(self):
-        """Build filtered program data list used for exporting and stats."""
-
-        lst = list(
-            zip(
-                self.lstMove,
-                self.lstArcPlane,
-                self.lstPosMode,
-                self.lstCoord_X,
-                self.lstCoord_Y,
-                self.lstCoord_Z,
-                self.lstX_incr,
-                self.lstY_incr,
-                self.lstZ_incr,
-                self.lstCenter_X,
-                self.lstCenter_Y,
-                self.lstFeed,
-                self.lstWcs,
-                self.lstHomePos,
-                self.lstTool,
-                self.lstToolChange,
-                self.lstSpeed,
-                self.lstSpeedCode,
-                self.lstCoolant,
-                self.lstPgmStop,
-                self.lstCorLen,
-                self.lstCorH,
-                self.lstCorRad,
-                self.lstCorD,
-                self.lstComment,
-                self.lstCycleDrill,
-                self.lstCycleZ,
-                self.lstCoord_R,
-                self.lstCycleP,
-                self.lstCycleQ,
-            )
-        )
-
-        for i in range(len(lst)):
-            if self.lstUnknownWords[i] == None:
-                length = sqrt((lst[i][6]) ** 2 + (lst[i][7]) ** 2 + (lst[i][8]) ** 2)
-                lst1 = []
-                if lst[i][0] > 1 or length > 0 or lst[i][25] > 80 or lst[i][12] != None:
-                    for j in range(len(lst[i])):
-                        lst1.append(lst[i][j])
-                else:
-                    for j in range(len(lst[i])):
-                        if j < 11:
-                            lst1.append(None)
-                        else:
-                            lst1.append(lst[i][j])
-                self.lstProgram.append(lst1)
-
-        self.calcTime()
+    def dirtyText(self):
+        """Return the uppercased editor lines of the edited range."""
+        count = self.document.lineCount()
+        stop = min(self.dirty.last, count)
+        lines = [line.upper() for line in self.document.lines(self.dirty.first, stop)]
+        # an empty last editor line is not a block
+        if lines and stop == count and not lines[-1]:
+            lines.pop()
+        return lines
 
     def toolPath(self):
         """Return formatted toolpath length and estimated machining time."""
-        if not self.calcTime():
-            res = ""
-            return res
-        time_min = round(sum(self.lst_toolpathTime), 2)
-        time_hours = time_min / 60
-        time_sec = time_min * 60
-        hours_part = floor(time_hours)
-        minutes_part = floor(time_min % 60)
-        seconds_part = floor(time_sec % 60)
-        res = (
-            self.co
-            + "Toolpath Length: {:.3f}".format((sum(self.lst_toolpath)))
-            + self.ci
-            + "\n"
-            + self.co
-            + "Machining Time: {h:02}:{m:02}:{s:02}".format(
-                h=hours_part, m=minutes_part, s=seconds_part
-            )
-            + self.ci
-            + "\n"
-        )
-        return res
+        if self.previewStats is not None:
+            return self.previewStats.summary(self.co, self.ci)
+        return toolpath_summary(self.program, self.co, self.ci)
 
     def toolPathLimits(self):
         """Return formatted min/max extents of the generated toolpath."""
-        if not self.calcTime():
-            res = ""
-            return res
-
-        if self.latheMode:
-            xmin = (
-                self.co
-                + "X MIN: {}".format(round(min(self.x_axis) * 2, 3))
-                + self.ci
-                + "\n"
-            )
-            xmax = (
-                self.co
-                + "X MAX: {}".format(round(max(self.x_axis) * 2, 3))
-                + self.ci
-                + "\n"
-            )
-        else:
-            xmin = (
-                self.co
-                + "X MIN: {}".format(round(min(self.x_axis), 3))
-                + self.ci
-                + "\n"
-            )
-            xmax = (
-                self.co
-                + "X MAX: {}".format(round(max(self.x_axis), 3))
-                + self.ci
-                + "\n"
-            )
-
-        ymin = self.co + "Y MIN: {}".format(round(min(self.y_axis), 3)) + self.ci + "\n"
-        zmin = self.co + "Z MIN: {}".format(round(min(self.z_axis), 3)) + self.ci + "\n"
-        ymax = self.co + "Y MAX: {}".format(round(max(self.y_axis), 3)) + self.ci + "\n"
-        zmax = self.co + "Z MAX: {}".format(round(max(self.z_axis), 3)) + self.ci
-        res = xmin + ymin + zmin + xmax + ymax + zmax
-        return res
+        if self.previewStats is not None:
+            return self.previewStats.limits(self.latheMode, self.co, self.ci)
+        return toolpath_limits(self.program, self.latheMode, self.co, self.ci)
 
     def statistics(self):
         """Display path length, machining time, and limits in a message box."""
@@ -2181,7 +2157,7 @@ class MainWindow(QMainWindow):
 
     def _process_selected_lines(self, handler):
         """Apply a line transformer to selected text or the whole document."""
-        if not self.ui.editor.text():
+        if not self.document.chars:
             return
         text = self.ui.editor.selectedText()
         if not text:
@@ -2271,15 +2247,11 @@ class MainWindow(QMainWindow):
     def calcDist(self):
         """Calculate scene center and distance scaling based on toolpath extents."""
         try:
-            if self.lst_points == []:
+            if len(self.program.points) == 0:
                 return
 
-            ax1_min = min(self.x_axis)
-            ax1_max = max(self.x_axis)
-            ax2_min = min(self.y_axis)
-            ax2_max = max(self.y_axis)
-            ax3_min = min(self.z_axis)
-            ax3_max = max(self.z_axis)
+            ax1_min, ax2_min, ax3_min = self.program.points.pos.min(axis=0).tolist()
+            ax1_max, ax2_max, ax3_max = self.program.points.pos.max(axis=0).tolist()
 
             x = ax1_min + (ax1_max - ax1_min) / 2
             y = ax2_min + (ax2_max - ax2_min) / 2
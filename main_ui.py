@@ -9,8 +9,25 @@ class Editor(QsciScintilla):
         self.setAcceptDrops(False)
 
 class PlotView(GLViewWidget):
+    # widget coordinates of a left click and of the pointer hovering
+    clicked = QtCore.pyqtSignal(float, float)
+    hovered = QtCore.pyqtSignal(float, float)
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.setMouseTracking(True)
+        self.pressPos = None
+
+    def mousePressEvent(self, ev):
+        super().mousePressEvent(ev)
+        self.pressPos = ev.position() if hasattr(ev, 'position') else ev.localPos()
+
+    def mouseReleaseEvent(self, ev):
+        lpos = ev.position() if hasattr(ev, 'position') else ev.localPos()
+        if ev.button() == QtCore.Qt.MouseButton.LeftButton and self.pressPos is not None:
+            if (lpos - self.pressPos).manhattanLength() < 4:
+                self.clicked.emit(lpos.x(), lpos.y())
+        self.pressPos = None
 
     def mouseMoveEvent(self, ev):
         lpos = ev.position() if hasattr(ev, 'position') else ev.localPos()
@@ -18,7 +35,9 @@ class PlotView(GLViewWidget):
             self.mousePos = lpos
         diff = lpos - self.mousePos
         self.mousePos = lpos
-        if ev.buttons() == QtCore.Qt.MouseButton.LeftButton:
+        if ev.buttons() == QtCore.Qt.MouseButton.NoButton:
+            self.hovered.emit(lpos.x(), lpos.y())
+        elif ev.buttons() == QtCore.Qt.MouseButton.LeftButton:
             if (ev.modifiers() & QtCore.Qt.KeyboardModifier.ControlModifier):
                 self.pan(diff.x(), diff.y(), 0, relative='view')
             else:
@@ -137,6 +156,10 @@ class Ui_MainWindow(object):
         self.menuArc_Type.setObjectName("menuArc_Type")
         self.menu_View = QtWidgets.QMenu(self.menubar)
         self.menu_View.setObjectName("menu_View")
+        self.menuColor_By = QtWidgets.QMenu(self.menu_View)
+        self.menuColor_By.setObjectName("menuColor_By")
+        self.menuLayers = QtWidgets.QMenu(self.menu_View)
+        self.menuLayers.setObjectName("menuLayers")
         self.menuCNC_Functions = QtWidgets.QMenu(self.menubar)
         self.menuCNC_Functions.setObjectName("menuCNC_Functions")
         self.menuBlockNumbers = QtWidgets.QMenu(self.menuCNC_Functions)
@@ -310,6 +333,45 @@ class Ui_MainWindow(object):
         icon27.addPixmap(QtGui.QPixmap(":/resource/icons/lathe.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
         self.actionLatheMode.setIcon(icon27)
         self.actionLatheMode.setObjectName("actionLatheMode")
+        self.actionBlockDelete = QtWidgets.QAction(MainWindow)
+        self.actionBlockDelete.setCheckable(True)
+        self.actionBlockDelete.setObjectName("actionBlockDelete")
+        self.actionColorSingle = QtWidgets.QAction(MainWindow)
+        self.actionColorSingle.setCheckable(True)
+        self.actionColorSingle.setObjectName("actionColorSingle")
+        self.actionColorMove = QtWidgets.QAction(MainWindow)
+        self.actionColorMove.setCheckable(True)
+        self.actionColorMove.setObjectName("actionColorMove")
+        self.actionColorFeed = QtWidgets.QAction(MainWindow)
+        self.actionColorFeed.setCheckable(True)
+        self.actionColorFeed.setObjectName("actionColorFeed")
+        self.actionColorTool = QtWidgets.QAction(MainWindow)
+        self.actionColorTool.setCheckable(True)
+        self.actionColorTool.setObjectName("actionColorTool")
+        self.actionColorDepth = QtWidgets.QAction(MainWindow)
+        self.actionColorDepth.setCheckable(True)
+        self.actionColorDepth.setObjectName("actionColorDepth")
+
+        self.actionLayerRapid = QtWidgets.QAction(MainWindow)
+        self.actionLayerRapid.setCheckable(True)
+        self.actionLayerRapid.setChecked(True)
+        self.actionLayerRapid.setObjectName("actionLayerRapid")
+        self.actionLayerLinear = QtWidgets.QAction(MainWindow)
+        self.actionLayerLinear.setCheckable(True)
+        self.actionLayerLinear.setChecked(True)
+        self.actionLayerLinear.setObjectName("actionLayerLinear")
+        self.actionLayerArc = QtWidgets.QAction(MainWindow)
+        self.actionLayerArc.setCheckable(True)
+        self.actionLayerArc.setChecked(True)
+        self.actionLayerArc.setObjectName("actionLayerArc")
+
+        self.actionGroupColorMode = QtWidgets.QActionGroup(MainWindow)
+        self.actionGroupColorMode.addAction(self.actionColorSingle)
+        self.actionGroupColorMode.addAction(self.actionColorMove)
+        self.actionGroupColorMode.addAction(self.actionColorFeed)
+        self.actionGroupColorMode.addAction(self.actionColorTool)
+        self.actionGroupColorMode.addAction(self.actionColorDepth)
+
         self.actionGrid = QtWidgets.QAction(MainWindow)
         self.actionGrid.setCheckable(True)
         icon28 = QtGui.QIcon()
@@ -361,6 +423,7 @@ class Ui_MainWindow(object):
 
         self.menuSettings.addAction(self.menuArc_Type.menuAction())
         self.menuSettings.addAction(self.actionLatheMode)
+        self.menuSettings.addAction(self.actionBlockDelete)
         self.menu_View.addAction(self.actionRefresh)
         self.menu_View.addSeparator()
         self.menu_View.addAction(self.actionZoom_In)
@@ -371,6 +434,17 @@ class Ui_MainWindow(object):
         self.menu_View.addAction(self.actionFront)
         self.menu_View.addAction(self.actionLeft)
         self.menu_View.addAction(self.actionGrid)
+        self.menuColor_By.addAction(self.actionColorSingle)
+        self.menuColor_By.addAction(self.actionColorMove)
+        self.menuColor_By.addAction(self.actionColorFeed)
+        self.menuColor_By.addAction(self.actionColorTool)
+        self.menuColor_By.addAction(self.actionColorDepth)
+        self.menu_View.addAction(self.menuColor_By.menuAction())
+        self.menuLayers.addAction(self.actionLayerRapid)
+        self.menuLayers.addAction(self.actionLayerLinear)
+        self.menuLayers.addAction(self.actionLayerArc)
+        self.menuLayers.addSeparator()
+        self.menu_View.addAction(self.menuLayers.menuAction())
         self.menuBlockNumbers.addSeparator()
         self.menuBlockNumbers.addAction(self.actionRenumber)
         self.menuBlockNumbers.addAction(self.actionNumbRemove)
@@ -437,6 +511,8 @@ class Ui_MainWindow(object):
         self.menu_Help.setTitle(_translate("MainWindow", "&Help"))
         self.menuSettings.setTitle(_translate("MainWindow", "Settings"))
         self.menuArc_Type.setTitle(_translate("MainWindow", "Arc Type"))
+        self.menuColor_By.setTitle(_translate("MainWindow", "Color By"))
+        self.menuLayers.setTitle(_translate("MainWindow", "Layers"))
         self.menu_View.setTitle(_translate("MainWindow", "&View"))
         self.menuCNC_Functions.setTitle(_translate("MainWindow", "CNC Functions"))
         self.menuBlockNumbers.setTitle(_translate("MainWindow", "Block Numbers"))
@@ -495,6 +571,16 @@ class Ui_MainWindow(object):
         self.actionStep_Forward.setText(_translate("MainWindow", "Step Forward"))
         self.actionLatheMode.setText(_translate("MainWindow", "Lathe Mode"))
         self.actionLatheMode.setToolTip(_translate("MainWindow", "Lathe Mode"))
+        self.actionBlockDelete.setText(_translate("MainWindow", "Block Delete"))
+        self.actionBlockDelete.setToolTip(_translate("MainWindow", "Skip blocks starting with \"/\""))
+        self.actionColorSingle.setText(_translate("MainWindow", "Single Color"))
+        self.actionColorMove.setText(_translate("MainWindow", "Move Type"))
+        self.actionColorFeed.setText(_translate("MainWindow", "Feed Rate"))
+        self.actionColorTool.setText(_translate("MainWindow", "Tool"))
+        self.actionColorDepth.setText(_translate("MainWindow", "Z Depth"))
+        self.actionLayerRapid.setText(_translate("MainWindow", "Rapid Moves"))
+        self.actionLayerLinear.setText(_translate("MainWindow", "Linear Moves"))
+        self.actionLayerArc.setText(_translate("MainWindow", "Arcs"))
         self.actionGrid.setText(_translate("MainWindow", "Grid"))
         self.actionGrid.setToolTip(_translate("MainWindow", "Grid"))
         self.actionStatistics.setText(_translate("MainWindow", "Statistics"))